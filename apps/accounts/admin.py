@@ -1,26 +1,86 @@
-from django.contrib import admin
+import csv
+import io
+import itertools
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, AIInteraction, Payment, Subscription
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.template.response import TemplateResponse
+from apps.ai_tutor.search import get_backend
+from apps.core.scale_admin import ScaleModeAdminMixin, recent_values_filter
+from .backends import invalidate_cached_user
+from .forms import GrantCreditsForm, RosterUploadForm
+from .models import (
+    User, AIInteraction, CurriculumExplanation, Payment, Subscription, bump_dashboard_version,
+)
+from .roster import REPORT_FIELDS, RosterImporter, read_roster
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(ScaleModeAdminMixin, BaseUserAdmin):
     list_display = ('username', 'email', 'credits', 'is_active', 'created_at')
     list_filter = ('is_active', 'is_staff', 'created_at')
-    search_fields = ('username', 'email')
-    ordering = ('-created_at',)
+    search_fields = ('^username', '=email')  # prefix and exact matches can use the unique indexes
+    search_help_text = 'Username prefix or exact email'
+    actions = ['grant_credits']
+    
+    raw_id_fields = ('sponsor_subscription',)
     
     fieldsets = BaseUserAdmin.fieldsets + (
-        ('Credits', {'fields': ('credits',)}),
+        ('Credits', {'fields': ('credits', 'sponsor_subscription')}),
     )
+    
+    @admin.action(description='Grant credits to the selected users')
+    def grant_credits(self, request, queryset):
+        form = GrantCreditsForm(request.POST if 'apply' in request.POST else None)
+        if form.is_valid():
+            amount = form.cleaned_data['credits']
+            with transaction.atomic():
+                granted = queryset.update(credits=F('credits') + amount)
+            # update() sends no post_save, so drop cached balances the way the signal would
+            user_ids = queryset.values_list('pk', flat=True).iterator(chunk_size=2000)
+            while chunk := list(itertools.islice(user_ids, 2000)):
+                invalidate_cached_user(*chunk)
+                bump_dashboard_version(*chunk)
+            self.message_user(request, f'Granted {amount} credits to {granted} users.', messages.SUCCESS)
+            return None
+        
+        select_across = request.POST.get('select_across') == '1'
+        return TemplateResponse(request, 'admin/accounts/user/grant_credits.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Grant credits',
+            'opts': self.model._meta,
+            'form': form,
+            'select_across': select_across,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
 
 
 @admin.register(AIInteraction)
-class AIInteractionAdmin(admin.ModelAdmin):
+class AIInteractionAdmin(ScaleModeAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'prompt_preview', 'model_used', 'credits_used', 'created_at')
-    list_filter = ('model_used', 'credits_used', 'created_at')
-    search_fields = ('user__username', 'prompt')
+    list_filter = (recent_values_filter('model_used', 'model used'), recent_values_filter('credits_used', 'credits used'),
+                   'created_at')
+    list_select_related = ('user',)
+    search_fields = ('user__username',)
+    search_user_field = 'user'
+    search_help_text = 'Words in the prompt or response, or the exact email or username prefix of the user'
     readonly_fields = ('created_at',)
+    raw_id_fields = ('user', 'conversation')
+    changelist_defer = ('response',)  # never shown in the list, and by far the largest column
+    
+    def get_search_results(self, request, queryset, search_term):
+        # The owner's interactions plus full-text matches on the prompt or response
+        by_user, _ = super().get_search_results(request, queryset, search_term)
+        if not search_term.strip():
+            return by_user, False
+        matches = [pk for pk, _ in get_backend(queryset.db).search(search_term, limit=settings.SEARCH_MAX_RESULTS)]
+        return by_user | queryset.filter(pk__in=matches), False
     
     def prompt_preview(self, obj):
         return obj.prompt[:50] + "..." if len(obj.prompt) > 50 else obj.prompt
@@ -28,11 +88,21 @@ class AIInteractionAdmin(admin.ModelAdmin):
 
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(ScaleModeAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'amount', 'credits_purchased', 'status', 'created_at')
-    list_filter = ('status', 'currency', 'created_at')
-    search_fields = ('user__username', 'intasend_payment_id')
+    list_filter = ('status', recent_values_filter('currency', 'currency'), 'created_at')
+    list_select_related = ('user',)
+    search_fields = ('user__username',)
+    search_help_text = 'Exact IntaSend payment id, exact email or username prefix of the user'
+    search_user_field = 'user'
     readonly_fields = ('created_at', 'completed_at')
+    raw_id_fields = ('user',)
+    
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if term and queryset.filter(intasend_payment_id=term).exists():
+            return queryset.filter(intasend_payment_id=term), False
+        return super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(Subscription)
@@ -40,4 +110,51 @@ class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'plan_type', 'status', 'monthly_credits', 'price', 'expires_at')
     list_filter = ('plan_type', 'status', 'created_at')
     search_fields = ('user__username',)
+    actions = ['import_roster']
+    
+    @admin.action(description='Import a student roster into the selected institutional subscription')
+    def import_roster(self, request, queryset):
+        subscriptions = list(queryset.select_related('user')[:2])
+        if len(subscriptions) != 1 or subscriptions[0].plan_type != 'institutional':
+            self.message_user(request, 'Select exactly one institutional subscription.', messages.ERROR)
+            return None
+        subscription = subscriptions[0]
+        max_rows = settings.ROSTER_ADMIN_MAX_ROWS
+        
+        form = RosterUploadForm(request.POST, request.FILES) if 'apply' in request.POST else RosterUploadForm()
+        if form.is_valid():
+            lines = io.TextIOWrapper(form.cleaned_data['roster'], encoding='utf-8-sig', newline='')
+            try:
+                rows = list(itertools.islice(read_roster(lines), max_rows + 1))
+            except (ValueError, UnicodeDecodeError, csv.Error) as exc:
+                form.add_error('roster', str(exc))
+            else:
+                if len(rows) > max_rows:
+                    form.add_error('roster', f'More than {max_rows} rows; use the import_roster command.')
+                else:
+                    response = HttpResponse(content_type='text/csv')
+                    response['Content-Disposition'] = f'attachment; filename="roster-import-{subscription.pk}.csv"'
+                    writer = csv.DictWriter(response, REPORT_FIELDS)
+                    writer.writeheader()
+                    for row in RosterImporter(subscription).run(rows):
+                        writer.writerow(row.report())
+                    return response
+        
+        return TemplateResponse(request, 'admin/accounts/subscription/import_roster.html', {
+            **self.admin_site.each_context(request),
+            'title': 'Import roster',
+            'opts': self.model._meta,
+            'subscription': subscription,
+            'form': form,
+            'max_rows': max_rows,
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+
 
+@admin.register(CurriculumExplanation)
+class CurriculumExplanationAdmin(admin.ModelAdmin):
+    list_display = ('topic', 'level', 'model_used', 'generated_at')
+    list_filter = ('level', 'model_used')
+    search_fields = ('topic_key',)
+    readonly_fields = ('topic_key', 'model_used', 'generated_at')
@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class AccountsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.accounts'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate, pre_migrate
+
+        from . import signals
+
+        pre_migrate.connect(signals.suspend_search_index, sender=self, dispatch_uid='accounts.suspend_search_index')
+        post_migrate.connect(signals.repair_search_index, sender=self, dispatch_uid='accounts.repair_search_index')
@@ -0,0 +1,57 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import transaction
+
+USER_CACHE_KEY = 'auth:user:{}'
+USER_GENERATION_KEY = 'auth:user:{}:gen'
+
+
+def invalidate_cached_user(*user_ids, using=None):
+    """Bump each user's generation so any cached copy stops matching.
+
+    The bump is repeated when the current transaction commits: until then
+    other requests still read the old row, and may cache it under the new
+    generation.
+    """
+    _bump_generations(user_ids)
+    transaction.on_commit(partial(_bump_generations, user_ids), using=using)
+
+
+def _bump_generations(user_ids):
+    for user_id in user_ids:
+        key = USER_GENERATION_KEY.format(user_id)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+        cache.delete(USER_CACHE_KEY.format(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose per-request user lookup is served from the cache.
+
+    The loaded user is stored together with the user's generation number.
+    Every write to the user (credits, flags, groups, permissions) bumps the
+    generation when it is made and again when it commits, so a copy cached
+    by a request that raced with the write is dropped as soon as the write
+    is visible.
+    """
+
+    def get_user(self, user_id):
+        user_key = USER_CACHE_KEY.format(user_id)
+        generation_key = USER_GENERATION_KEY.format(user_id)
+        cached = cache.get_many([user_key, generation_key])
+        generation = cached.get(generation_key, 0)
+
+        entry = cached.get(user_key)
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+
+        user = super().get_user(user_id)
+        if user is not None:
+            cache.set(user_key, (generation, user), settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
@@ -30,3 +30,14 @@ class UserRegistrationForm(UserCreationForm):
             user.save()
         return user
 
+
+
+class RosterUploadForm(forms.Form):
+    roster = forms.FileField(
+        help_text='CSV with an "email" column and optional "username" and "password" columns. '
+                  'Rows without a password get a generated one, listed in the downloaded report.'
+    )
+
+
+class GrantCreditsForm(forms.Form):
+    credits = forms.IntegerField(min_value=1, max_value=100000, help_text="Added to each selected user's balance.")
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from apps.ai_tutor.search import get_backend
+    get_backend(schema_editor.connection.alias).rebuild()
+
+
+def remove_search_index(apps, schema_editor):
+    from apps.ai_tutor.search import get_backend
+    get_backend(schema_editor.connection.alias).uninstall()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_user_sponsor_subscription'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, remove_search_index),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.7 on 2026-10-19 19:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_aiinteraction_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField(db_index=True)),
+                ('interaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='question_bands', to='accounts.aiinteraction')),
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.7 on 2026-10-19 19:17
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_questionband'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurriculumExplanation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=200)),
+                ('topic_key', models.CharField(max_length=200)),
+                ('level', models.CharField(max_length=20)),
+                ('explanation', models.TextField()),
+                ('model_used', models.CharField(max_length=100)),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='curriculumexplanation',
+            constraint=models.UniqueConstraint(fields=('topic_key', 'level'), name='unique_curriculum_topic_level'),
+        ),
+    ]
@@ -1,37 +1,106 @@
+import time
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.utils import timezone
 
+PLAN_CACHE_KEY = 'user:{}:plan'
+PLAN_CACHE_TIMEOUT = 300
+DASHBOARD_VERSION_KEY = 'user:{}:dashboard'
+
+
+def dashboard_version(user_id):
+    """Version of the user's cached dashboard fragments"""
+    return cache.get_or_set(DASHBOARD_VERSION_KEY.format(user_id), time.time_ns, None)
+
+
+def bump_dashboard_version(*user_ids, using=None):
+    """Make the users' dashboard fragments render fresh on the next load.
+
+    The bump waits for the current transaction to commit; a render before
+    then sees the old rows and would cache them under the new version.
+    """
+    transaction.on_commit(partial(_set_dashboard_version, user_ids), using=using)
+
+
+def _set_dashboard_version(user_ids):
+    version = time.time_ns()
+    cache.set_many({DASHBOARD_VERSION_KEY.format(user_id): version for user_id in user_ids}, None)
+
 
 class User(AbstractUser):
     """Extended user model with credits system"""
     email = models.EmailField(unique=True)
     credits = models.PositiveIntegerField(default=10)  # Free starter credits
     created_at = models.DateTimeField(default=timezone.now)
+    # Seat on an institution's subscription, for students onboarded from a roster
+    sponsor_subscription = models.ForeignKey(
+        'Subscription', null=True, blank=True, on_delete=models.SET_NULL, related_name='members'
+    )
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
     
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Roster imports look up clashing accounts case-insensitively
+            models.Index(Lower('email'), name='accounts_user_email_lower'),
+            models.Index(Lower('username'), name='accounts_user_username_lower'),
+        ]
+    
     def deduct_credits(self, amount=1):
         """Deduct credits if sufficient balance"""
         if self.credits >= amount:
             self.credits -= amount
-            self.save()
+            self.save(update_fields=['credits'])
             return True
         return False
     
     def add_credits(self, amount):
         """Add credits to user account"""
         self.credits += amount
-        self.save()
+        self.save(update_fields=['credits'])
+    
+    def get_plan(self):
+        """Return the best active plan of the user's own or sponsoring subscription, or 'free'"""
+        cache_key = PLAN_CACHE_KEY.format(self.pk)
+        plan = cache.get(cache_key)
+        if plan is None:
+            plans = Subscription.objects.filter(
+                models.Q(user=self) | models.Q(pk=self.sponsor_subscription_id),
+                status='active', expires_at__gt=timezone.now(),
+            ).values_list('plan_type', flat=True)
+            plan = max(plans, key=settings.AI_PRIORITY_WEIGHTS.get, default='free')
+            cache.set(cache_key, plan, PLAN_CACHE_TIMEOUT)
+        return plan
     
     def __str__(self):
         return f"{self.username} ({self.credits} credits)"
 
 
+class Conversation(models.Model):
+    """A multi-turn tutoring session; turns older than the recent window live on in ``summary``"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
+    title = models.CharField(max_length=200)
+    summary = models.TextField(blank=True)
+    summarized_through = models.BigIntegerField(default=0)  # id of the newest turn folded into the summary
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.user.username}: {self.title}"
+
+
 class AIInteraction(models.Model):
     """Store AI tutor interactions"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ai_interactions')
+    # Nullable, so SQLite adds the column in place and keeps the full-text search triggers
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.SET_NULL, null=True, blank=True, related_name='turns'
+    )
     prompt = models.TextField()
     response = models.TextField()
     model_used = models.CharField(max_length=100)
@@ -45,6 +114,33 @@ class AIInteraction(models.Model):
         return f"{self.user.username}: {self.prompt[:50]}..."
 
 
+class QuestionBand(models.Model):
+    """One LSH band of a tutor question's MinHash signature, for finding near-duplicate questions"""
+    interaction = models.ForeignKey(AIInteraction, on_delete=models.CASCADE, related_name='question_bands')
+    key = models.BigIntegerField(db_index=True)
+    
+    def __str__(self):
+        return f"{self.interaction_id}: {self.key}"
+
+
+class CurriculumExplanation(models.Model):
+    """Pre-generated explanation of a catalog topic at one level, served before asking the model"""
+    topic = models.CharField(max_length=200)
+    topic_key = models.CharField(max_length=200)  # lower-cased and single-spaced, for lookups
+    level = models.CharField(max_length=20)
+    explanation = models.TextField()
+    model_used = models.CharField(max_length=100)
+    generated_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['topic_key', 'level'], name='unique_curriculum_topic_level'),
+        ]
+    
+    def __str__(self):
+        return f"{self.topic} ({self.level})"
+
+
 class Payment(models.Model):
     """Track payments and credit purchases"""
     STATUS_CHOICES = [
@@ -94,4 +190,3 @@ class Subscription(models.Model):
     
     def __str__(self):
         return f"{self.user.username}: {self.plan_type} - {self.status}"
-
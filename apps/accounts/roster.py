@@ -0,0 +1,158 @@
+import csv
+import itertools
+import multiprocessing
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Lower
+
+from .models import User
+
+REPORT_FIELDS = ('line', 'email', 'username', 'status', 'password', 'error')
+
+
+@dataclass
+class RosterRow:
+    line: int
+    email: str
+    username: str
+    password: str = ''
+    generated_password: bool = False
+    status: str = 'pending'
+    error: str = ''
+
+    def fail(self, error):
+        self.status, self.error = 'error', error
+
+    def report(self):
+        """One line of the import report; generated passwords are included so they can be handed out"""
+        return {
+            'line': self.line, 'email': self.email, 'username': self.username, 'status': self.status,
+            'password': self.password if self.generated_password and self.status == 'created' else '',
+            'error': self.error,
+        }
+
+
+def read_roster(lines):
+    """Parse a CSV roster with an ``email`` column and optional ``username`` and ``password`` columns"""
+    reader = csv.DictReader(lines)
+    fields = {name.strip().lower() for name in reader.fieldnames or ()}
+    if 'email' not in fields:
+        raise ValueError('The roster needs an "email" column')
+    for record in reader:
+        record = {(key or '').strip().lower(): (value or '').strip() for key, value in record.items()}
+        email = record.get('email', '').lower()
+        password = record.get('password', '')
+        yield RosterRow(
+            line=reader.line_num,
+            email=email,
+            username=record.get('username') or email,
+            password=password or secrets.token_urlsafe(9),
+            generated_password=not password,
+        )
+
+
+class RosterImporter:
+    """Create the members of an institutional subscription from a roster, a chunk at a time.
+
+    Each chunk costs one query for clashing emails and usernames and one
+    bulk insert; password hashing, the expensive part, runs in a process
+    pool and overlaps with the previous chunk's insert. Bad rows are
+    reported and skipped without failing the rest of their chunk.
+    """
+
+    def __init__(self, subscription, chunk_size=None, workers=None):
+        if subscription.plan_type != 'institutional':
+            raise ValueError('Rosters can only be imported into an institutional subscription')
+        self.subscription = subscription
+        self.chunk_size = chunk_size or settings.ROSTER_CHUNK_SIZE
+        self.workers = workers or settings.ROSTER_HASH_WORKERS
+        self.seen_emails = set()
+        self.seen_usernames = set()
+
+    def run(self, rows):
+        """Import ``rows`` and yield every row once its outcome is known"""
+        # Spawned rather than forked, as the caller may be a threaded web worker. make_password
+        # only needs settings, so the workers never load the app registry.
+        with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            pending = None
+            for chunk in _chunks(rows, self.chunk_size):
+                valid = self.validate(chunk)
+                hashes = pool.map(make_password, [row.password for row in valid],
+                                  chunksize=max(1, len(valid) // (self.workers * 4)))
+                if pending:
+                    yield from self.insert(*pending)
+                pending = (chunk, valid, hashes)
+            if pending:
+                yield from self.insert(*pending)
+
+    def validate(self, chunk):
+        """Mark rows that cannot be created and return the rest"""
+        for row in chunk:
+            try:
+                validate_email(row.email)
+            except ValidationError:
+                row.fail('invalid email')
+                continue
+            if len(row.username) > 150:
+                row.fail('username longer than 150 characters')
+            elif row.email in self.seen_emails:
+                row.fail('duplicate email in roster')
+            elif row.username in self.seen_usernames:
+                row.fail('duplicate username in roster')
+            self.seen_emails.add(row.email)
+            self.seen_usernames.add(row.username)
+
+        candidates = [row for row in chunk if row.status == 'pending']
+        # Compared lower-cased on both sides: Jane@School.org and jane@school.org are the same person
+        existing = User.objects.annotate(value=Lower('email')).filter(
+            value__in=[row.email for row in candidates]
+        ).values_list(Value('email', output_field=CharField()), 'value').union(
+            User.objects.annotate(value=Lower('username')).filter(
+                value__in=[row.username.lower() for row in candidates]
+            ).values_list(Value('username', output_field=CharField()), 'value'),
+            all=True,
+        )
+        taken = set(existing)
+        for row in candidates:
+            if ('email', row.email) in taken:
+                row.fail('a user with this email already exists')
+            elif ('username', row.username.lower()) in taken:
+                row.fail('a user with this username already exists')
+        return [row for row in candidates if row.status == 'pending']
+
+    def insert(self, chunk, valid, hashes):
+        users = [
+            User(email=row.email, username=row.username, password=password,
+                 sponsor_subscription=self.subscription)
+            for row, password in zip(valid, hashes)
+        ]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+        except IntegrityError:
+            # Someone registered one of these addresses since validation; find it row by row
+            for row, user in zip(valid, users):
+                try:
+                    with transaction.atomic():
+                        user.save(force_insert=True)
+                except IntegrityError:
+                    user.pk = None
+                    row.fail('a user with this email or username already exists')
+        for row in valid:
+            if row.status == 'pending':
+                row.status = 'created'
+        yield from chunk
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
@@ -0,0 +1,79 @@
+from django.core.cache import cache
+from django.db import router
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.ai_tutor.search import get_backend
+from apps.core.db.routers import pin_to_primary
+
+from .backends import invalidate_cached_user
+from .models import PLAN_CACHE_KEY, AIInteraction, Payment, Subscription, User, bump_dashboard_version
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def invalidate_plan_cache(sender, instance, **kwargs):
+    """Drop the cached plan so rate limits follow subscription changes immediately"""
+    cache.delete(PLAN_CACHE_KEY.format(instance.user_id))
+
+
+@receiver([post_save, pre_delete], sender=Subscription)
+def invalidate_member_plan_cache(sender, instance, **kwargs):
+    """Sponsored members share the subscription's plan; before a delete, while they are still linked"""
+    cache.delete_many([PLAN_CACHE_KEY.format(pk) for pk in instance.members.values_list('pk', flat=True)])
+
+
+@receiver(post_save, sender=User)
+def pin_user_after_write(sender, instance, **kwargs):
+    """Credit changes must be visible on the user's next page load"""
+    pin_to_primary(instance.pk)
+
+
+@receiver(post_save, sender=Payment)
+def pin_payer_after_write(sender, instance, **kwargs):
+    """Webhook payment updates arrive without the payer's session"""
+    pin_to_primary(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(sender, instance, using, update_fields=None, **kwargs):
+    """Credit checks must never see a stale balance, nor rate limits a stale sponsor's plan"""
+    invalidate_cached_user(instance.pk, using=using)
+    bump_dashboard_version(instance.pk, using=using)
+    if update_fields is None or 'sponsor_subscription' in update_fields:
+        cache.delete(PLAN_CACHE_KEY.format(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=AIInteraction)
+def invalidate_dashboard_cache(sender, instance, using, **kwargs):
+    """New interactions show up in the dashboard's recent list"""
+    bump_dashboard_version(instance.user_id, using=using)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_cache_on_access_change(sender, instance, action, reverse, pk_set, using, **kwargs):
+    """Group and permission changes take effect on the next request"""
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_cached_user(instance.pk, using=using)
+    elif action == 'pre_clear':
+        # pk_set is not provided for clear, so collect the members before they go
+        invalidate_cached_user(*instance.user_set.values_list('pk', flat=True), using=using)
+    elif action in ('post_add', 'post_remove'):
+        invalidate_cached_user(*pk_set, using=using)
+
+
+def suspend_search_index(sender, using, plan=None, **kwargs):
+    """Accounts migrations may rebuild the interactions table, which the search index's view and triggers block"""
+    if not router.allow_migrate_model(using, AIInteraction):
+        return
+    if any(migration.app_label == sender.label for migration, _ in plan or ()):
+        get_backend(using).suspend()
+
+
+def repair_search_index(sender, using, verbosity=1, **kwargs):
+    """Put back what ``suspend_search_index``, or a table rebuild, took down"""
+    if not router.allow_migrate_model(using, AIInteraction):
+        return
+    if get_backend(using).repair() and verbosity >= 2:
+        print(f'  Reinstalled the search index triggers on {using}')
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required
@@ -7,7 +8,7 @@ from django.views.decorators.http import require_http_methods
 from django.contrib.auth.forms import AuthenticationForm
 from django.db import transaction
 
-from .models import User, AIInteraction
+from .models import User, AIInteraction, dashboard_version
 from .forms import UserRegistrationForm
 
 
@@ -66,6 +67,7 @@ def login_view(request):
 @login_required
 def dashboard_view(request):
     """User dashboard"""
+    # Lazy: only evaluated when the cached fragment has to be re-rendered
     recent_interactions = AIInteraction.objects.filter(
         user=request.user
     ).order_by('-created_at')[:5]
@@ -73,6 +75,9 @@ def dashboard_view(request):
     context = {
         'user': request.user,
         'recent_interactions': recent_interactions,
+        'dashboard_version': dashboard_version(request.user.pk),
+        'fragment_timeout': settings.DASHBOARD_FRAGMENT_TIMEOUT,
+        'quiz_prefetch_enabled': settings.QUIZ_PREFETCH_ENABLE,
     }
     return render(request, 'dashboard.html', context)
 
@@ -0,0 +1,41 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+_lock = threading.Lock()
+_pool = None
+
+
+def _executor():
+    """This process's background threads and the semaphore bounding their backlog"""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = (
+                ThreadPoolExecutor(settings.AI_BACKGROUND_WORKERS, thread_name_prefix='ai-background'),
+                threading.BoundedSemaphore(settings.AI_BACKGROUND_MAX_PENDING),
+            )
+        return _pool
+
+
+def submit(task, *args):
+    """Run ``task(*args)`` after the response, off the request thread.
+
+    Returns False, without running it, when this process already has
+    ``AI_BACKGROUND_MAX_PENDING`` tasks queued or running.
+    """
+    pool, backlog = _executor()
+    if not backlog.acquire(blocking=False):
+        return False
+    pool.submit(_run, task, args, backlog)
+    return True
+
+
+def _run(task, args, backlog):
+    try:
+        task(*args)
+    finally:
+        backlog.release()
+        connections.close_all()  # this thread's connections only
@@ -0,0 +1,92 @@
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.accounts.models import Conversation
+from apps.core import metrics
+
+CHARS_PER_TOKEN = 4  # rough average for English text; no tokenizer is needed to stay within budget
+FOLD_MAX_TURNS = 12  # turns folded by one summary call, so a backlog is caught up over a few turns
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def clip(text, tokens):
+    """``text`` cut to about ``tokens`` tokens"""
+    limit = max(tokens, 0) * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:max(limit - 1, 0)].rstrip() + '…'
+
+
+def format_turn(prompt, response):
+    return f"Student: {prompt}\nTutor: {response}"
+
+
+def recent_turns(conversation):
+    """The newest turns not yet folded into the summary, oldest first"""
+    turns = (
+        conversation.turns.filter(pk__gt=conversation.summarized_through)
+        .order_by('-pk').values_list('prompt', 'response')[:settings.CONVERSATION_RECENT_TURNS]
+    )
+    return list(turns)[::-1]
+
+
+def build_context(summary, turns, budget=None):
+    """``(summary, recent exchanges)`` for the next prompt, within ``budget`` tokens together.
+
+    The summary keeps at most ``CONVERSATION_SUMMARY_TOKENS``; the newest
+    turns fill what is left, and a turn that does not fit is cut, along with
+    everything older. However long the conversation, the context is bounded.
+    """
+    budget = settings.CONVERSATION_CONTEXT_TOKENS if budget is None else budget
+    summary = clip(summary, min(settings.CONVERSATION_SUMMARY_TOKENS, budget))
+    remaining = budget - estimate_tokens(summary)
+    exchanges = []
+    for prompt, response in reversed(turns):
+        turn = format_turn(prompt, response)
+        if estimate_tokens(turn) > remaining:
+            if not exchanges:
+                exchanges.append(clip(turn, remaining))
+            break
+        exchanges.append(turn)
+        remaining -= estimate_tokens(turn)
+    exchanges.reverse()
+    return summary, '\n\n'.join(exchanges)
+
+
+def fold(conversation_id, summarize):
+    """Fold the oldest turns outside the recent window into the conversation's summary.
+
+    ``summarize(summary, exchanges)`` returns the updated summary. Half the
+    window stays verbatim, so a fold is needed only every few turns. The
+    summary is saved only if no other fold moved it on in the meantime.
+    """
+    lock_key = f'conversation_fold:{conversation_id}'
+    if not cache.add(lock_key, 1, settings.AI_UPSTREAM_SLOT_LEASE):
+        return
+    try:
+        conversation = Conversation.objects.get(pk=conversation_id)
+        window = settings.CONVERSATION_RECENT_TURNS
+        pending = list(
+            conversation.turns.filter(pk__gt=conversation.summarized_through)
+            .order_by('pk').values_list('pk', 'prompt', 'response')[:FOLD_MAX_TURNS + window]
+        )
+        if len(pending) <= window:
+            return
+        folding = pending[:min(len(pending) - window // 2, FOLD_MAX_TURNS)]
+        turn_tokens = settings.CONVERSATION_CONTEXT_TOKENS // len(folding)
+        exchanges = '\n\n'.join(clip(format_turn(prompt, response), turn_tokens) for _, prompt, response in folding)
+        try:
+            summary = summarize(conversation.summary, exchanges)
+        except Exception:
+            # Retried with the next turn; until then older turns fall out of the context
+            metrics.CONVERSATION_FOLDS.inc('failed')
+            return
+        Conversation.objects.filter(pk=conversation_id, summarized_through=conversation.summarized_through).update(
+            summary=clip(summary, settings.CONVERSATION_SUMMARY_TOKENS), summarized_through=folding[-1][0]
+        )
+        metrics.CONVERSATION_FOLDS.inc('folded')
+    finally:
+        cache.delete(lock_key)
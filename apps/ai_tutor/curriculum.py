@@ -0,0 +1,53 @@
+import csv
+from dataclasses import dataclass
+
+from apps.accounts.models import CurriculumExplanation
+
+LEVELS = ('beginner', 'intermediate', 'advanced')
+DEFAULT_CONTEXT = 'general education'
+
+
+def topic_key(topic):
+    return ' '.join(topic.lower().split())
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    topic: str
+    level: str
+
+    @property
+    def key(self):
+        return topic_key(self.topic), self.level
+
+
+def read_catalog(lines):
+    """Parse a CSV catalog with a ``topic`` column and an optional ``level`` column.
+
+    A row without a level stands for every level. Repeats are dropped.
+    """
+    reader = csv.DictReader(lines)
+    fields = {name.strip().lower() for name in reader.fieldnames or ()}
+    if 'topic' not in fields:
+        raise ValueError('The catalog needs a "topic" column')
+    entries, seen = [], set()
+    for record in reader:
+        record = {(key or '').strip().lower(): (value or '').strip() for key, value in record.items()}
+        topic, level = ' '.join(record.get('topic', '').split()), record.get('level', '').lower()
+        if not topic:
+            continue
+        if level and level not in LEVELS:
+            raise ValueError(f'Line {reader.line_num}: unknown level {level!r}; use one of {", ".join(LEVELS)}')
+        for entry_level in [level] if level else LEVELS:
+            entry = CatalogEntry(topic, entry_level)
+            if entry.key not in seen:
+                seen.add(entry.key)
+                entries.append(entry)
+    return entries
+
+
+def find_explanation(topic, level, context=DEFAULT_CONTEXT):
+    """The stored explanation for a catalog topic, or None when it must be generated live"""
+    if context != DEFAULT_CONTEXT:
+        return None
+    return CurriculumExplanation.objects.filter(topic_key=topic_key(topic), level=level.strip().lower()).first()
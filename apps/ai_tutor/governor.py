@@ -0,0 +1,256 @@
+import math
+import random
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.core import metrics, tracing
+from apps.core.cache import delete_if
+from apps.core.metrics import registry
+
+POLL_INTERVAL = 0.05
+WAIT_BUCKET = 1  # seconds per waiting-announcement bucket
+STATS_WINDOW = 5  # minutes of admissions, rejections and waits reported by queue_stats
+
+
+class UpstreamBusy(Exception):
+    """Raised when the inference backend has no capacity for this request"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = max(int(math.ceil(retry_after)), 1)
+
+
+class UpstreamGovernor:
+    """Fleet-wide limits on calls to the inference API.
+
+    State lives in the shared cache so every worker sees the same numbers:
+
+    - concurrency is a semaphore of ``AI_UPSTREAM_MAX_CONCURRENCY`` slots, each
+      claimed with an atomic ``cache.add`` and held as a lease so a crashed
+      worker cannot leak one;
+    - a per-minute counter enforces ``AI_UPSTREAM_REQUESTS_PER_MINUTE``;
+    - every 429/503 from upstream pushes out a shared backoff deadline that
+      doubles until a call succeeds, and the share of throttled calls in the
+      current minute shrinks the number of usable slots.
+
+    Callers wait at most ``AI_UPSTREAM_QUEUE_TIMEOUT`` seconds for capacity,
+    then get ``UpstreamBusy`` with a suggested retry delay.
+
+    While saturated, admission is ordered by priority class (the caller's
+    subscription plan, weighted by ``AI_PRIORITY_WEIGHTS``). Waiters announce
+    themselves in short-lived per-class buckets, and a waiter only competes
+    for a slot when no higher class is waiting. Priority grows by
+    ``AI_PRIORITY_AGING`` per second of waiting, so free-tier requests are
+    never starved. Buckets expire on their own, so a killed worker cannot
+    leave a phantom waiter behind.
+    """
+
+    key_prefix = 'governor'
+
+    def _key(self, *parts):
+        return ':'.join((self.key_prefix,) + tuple(str(part) for part in parts))
+
+    def _effective_slots(self, calls, throttled):
+        """Scale concurrency down in proportion to the observed throttle rate"""
+        max_slots = settings.AI_UPSTREAM_MAX_CONCURRENCY
+        if not calls:
+            return max_slots
+        return max(1, int(max_slots * (1 - throttled / calls)))
+
+    def _claim_slot(self, slots, token):
+        for index in random.sample(range(slots), slots):
+            key = self._key('slot', index)
+            if cache.add(key, token, settings.AI_UPSTREAM_SLOT_LEASE):
+                return key
+        return None
+
+    def _take_budget(self, minute):
+        key = self._key('rpm', minute)
+        cache.add(key, 0, 120)
+        try:
+            used = cache.incr(key)
+        except ValueError:
+            used = 1
+        return used <= settings.AI_UPSTREAM_REQUESTS_PER_MINUTE
+
+    def _weight(self, priority):
+        weights = settings.AI_PRIORITY_WEIGHTS
+        return weights.get(priority, min(weights.values()))
+
+    def _waiting_keys(self, priority, bucket):
+        return self._key('waiting', priority, bucket), self._key('waiting', priority, bucket - 1)
+
+    def acquire(self, timeout=None, priority='free'):
+        """Wait for an upstream slot and return ``(slot_key, token)``"""
+        if timeout is None:
+            timeout = settings.AI_UPSTREAM_QUEUE_TIMEOUT
+        weight = self._weight(priority)
+        higher = [name for name in settings.AI_PRIORITY_WEIGHTS if self._weight(name) > weight]
+        started = time.monotonic()
+        deadline = started + timeout
+        token = uuid.uuid4().hex
+        announced = []
+
+        try:
+            while True:
+                now = time.time()
+                minute = int(now // 60)
+                bucket = int(now // WAIT_BUCKET)
+                waiting_keys = {name: self._waiting_keys(name, bucket) for name in higher}
+                state = cache.get_many([
+                    self._key('backoff_until'),
+                    self._key('calls', minute),
+                    self._key('throttled', minute),
+                    *(key for keys in waiting_keys.values() for key in keys),
+                ])
+                remaining = deadline - time.monotonic()
+
+                wait = state.get(self._key('backoff_until'), 0) - now
+                if wait > 0:
+                    if wait > remaining:
+                        self._record_outcome(priority, 'rejected', time.monotonic() - started)
+                        raise UpstreamBusy('AI service is rate limited upstream', retry_after=wait)
+                    time.sleep(wait)
+                    continue
+
+                effective = weight + settings.AI_PRIORITY_AGING * (time.monotonic() - started)
+                outranked = any(
+                    self._weight(name) > effective and any(state.get(key, 0) > 0 for key in keys)
+                    for name, keys in waiting_keys.items()
+                )
+
+                if not outranked:
+                    slots = self._effective_slots(
+                        state.get(self._key('calls', minute), 0),
+                        state.get(self._key('throttled', minute), 0),
+                    )
+                    slot_key = self._claim_slot(slots, token)
+                    if slot_key is not None:
+                        if self._take_budget(minute):
+                            self._record_outcome(priority, 'admitted', time.monotonic() - started)
+                            return slot_key, token
+                        cache.delete(slot_key)
+                        wait = 60 - now % 60
+                        if wait > remaining:
+                            self._record_outcome(priority, 'rejected', time.monotonic() - started)
+                            raise UpstreamBusy('AI request budget exhausted for this minute', retry_after=wait)
+                        time.sleep(wait)
+                        continue
+
+                if remaining <= 0:
+                    self._record_outcome(priority, 'rejected', time.monotonic() - started)
+                    raise UpstreamBusy('AI service is at capacity', retry_after=1)
+                waiting_key = self._key('waiting', priority, bucket)
+                if waiting_key not in announced:
+                    self._count(waiting_key, WAIT_BUCKET * 3)
+                    announced.append(waiting_key)
+                time.sleep(min(POLL_INTERVAL * (1 + random.random()), remaining))
+        finally:
+            # Withdraw announcements that readers may still see
+            for waiting_key in announced[-2:]:
+                try:
+                    cache.decr(waiting_key)
+                except ValueError:
+                    pass
+
+    def release(self, slot_key, token):
+        """Free a slot unless its lease already expired and was reclaimed"""
+        delete_if(cache, slot_key, token)
+
+    @contextmanager
+    def slot(self, timeout=None, priority='free'):
+        with tracing.span('governor.acquire', priority=priority):
+            slot_key, token = self.acquire(timeout, priority)
+        try:
+            yield
+        finally:
+            self.release(slot_key, token)
+
+    def _count(self, key, timeout, delta=1):
+        cache.add(key, 0, timeout)
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass
+
+    def _record_outcome(self, priority, outcome, waited=0.0):
+        metrics.AI_QUEUE_WAIT.observe(waited, priority, outcome)
+        # Per-minute counts, kept just long enough for queue_stats' window
+        minute, timeout = int(time.time() // 60), (STATS_WINDOW + 1) * 60
+        self._count(self._key(outcome, priority, minute), timeout)
+        if outcome == 'admitted' and waited:
+            self._count(self._key('wait_ms', priority, minute), timeout, int(waited * 1000))
+
+    def queue_stats(self):
+        """Per-class queue depth, and admissions, rejections and mean wait over the last STATS_WINDOW minutes"""
+        now = time.time()
+        bucket, minute = int(now // WAIT_BUCKET), int(now // 60)
+        minutes = range(minute - STATS_WINDOW + 1, minute + 1)
+        keys = {}
+        for name in settings.AI_PRIORITY_WEIGHTS:
+            keys[name] = {
+                'waiting': self._waiting_keys(name, bucket),
+                **{kind: [self._key(kind, name, m) for m in minutes] for kind in ('admitted', 'rejected', 'wait_ms')},
+            }
+        values = cache.get_many([key for group in keys.values() for names in group.values() for key in names])
+
+        stats = {}
+        for name, group in keys.items():
+            admitted, rejected, wait_ms = (
+                sum(values.get(key, 0) for key in group[kind]) for kind in ('admitted', 'rejected', 'wait_ms')
+            )
+            stats[name] = {
+                'queue_depth': max(*(values.get(key, 0) for key in group['waiting']), 0),
+                'admitted': admitted,
+                'rejected': rejected,
+                'avg_wait_ms': round(wait_ms / admitted, 1) if admitted else 0.0,
+            }
+        return stats
+
+    def record_success(self):
+        self._count(self._key('calls', int(time.time() // 60)), 120)
+        cache.delete(self._key('backoff_level'))
+
+    def record_throttled(self, retry_after=None):
+        """Back off the whole fleet after a 429/503 from upstream"""
+        minute = int(time.time() // 60)
+        self._count(self._key('calls', minute), 120)
+        self._count(self._key('throttled', minute), 120)
+
+        level_key = self._key('backoff_level')
+        cache.add(level_key, 0, 600)
+        try:
+            level = cache.incr(level_key)
+        except ValueError:
+            level = 1
+        delay = min(2 ** (level - 1), settings.AI_UPSTREAM_BACKOFF_MAX)
+        try:
+            delay = max(delay, float(retry_after))
+        except (TypeError, ValueError):
+            pass
+        cache.set(self._key('backoff_until'), time.time() + delay, math.ceil(delay))
+        return delay
+
+
+governor = UpstreamGovernor()
+
+
+@registry.gauges(fleet=True)
+def _queue_gauges():
+    depth, admitted, rejected, wait = {}, {}, {}, {}
+    for name, stats in governor.queue_stats().items():
+        depth[(name,)] = stats['queue_depth']
+        admitted[(name,)] = stats['admitted']
+        rejected[(name,)] = stats['rejected']
+        wait[(name,)] = stats['avg_wait_ms']
+    window = f'in the last {STATS_WINDOW} minutes'
+    return {
+        'ai_queue_depth': ('Requests waiting for an upstream slot, by plan', ('plan',), depth),
+        'ai_queue_admitted': (f'Upstream admissions {window}, by plan', ('plan',), admitted),
+        'ai_queue_rejected': (f'Upstream admission timeouts {window}, by plan', ('plan',), rejected),
+        'ai_queue_avg_wait_ms': (f'Mean wait of admitted requests {window}, by plan', ('plan',), wait),
+    }
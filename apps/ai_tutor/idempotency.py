@@ -0,0 +1,76 @@
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+from apps.core.cache import delete_if
+
+POLL_INTERVAL = 0.1
+
+
+def _replay(stored):
+    response = HttpResponse(stored['content'], status=stored['status'], content_type=stored['content_type'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view_func):
+    """Honour an ``Idempotency-Key`` header on a POST endpoint.
+
+    The first request with a given key runs the view while holding a lock in
+    the shared cache. A duplicate that arrives while it is running waits for
+    the stored result; one that arrives afterwards gets the stored response
+    replayed, so the model is not called and credits are not charged twice.
+    Server errors are not stored, so a retry after a 5xx runs again. Reusing
+    a key with a different body is rejected with 422.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key:
+            return view_func(request, *args, **kwargs)
+        if len(idempotency_key) > 255:
+            return JsonResponse({'error': 'Idempotency-Key is too long'}, status=400)
+
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        key_hash = hashlib.sha256(idempotency_key.encode('utf-8')).hexdigest()
+        base_key = f'idempotency:{request.user.pk}:{request.resolver_match.view_name}:{key_hash}'
+        lock_key, result_key = f'{base_key}:lock', f'{base_key}:result'
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+        token = uuid.uuid4().hex
+
+        while True:
+            stored = cache.get(result_key)
+            if stored is not None:
+                if stored['fingerprint'] != fingerprint:
+                    return JsonResponse(
+                        {'error': 'Idempotency-Key was already used with a different request'}, status=422
+                    )
+                return _replay(stored)
+
+            if cache.add(lock_key, token, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                try:
+                    response = view_func(request, *args, **kwargs)
+                    if response.status_code < 500:
+                        cache.set(result_key, {
+                            'fingerprint': fingerprint,
+                            'status': response.status_code,
+                            'content': response.content,
+                            'content_type': response['Content-Type'],
+                        }, settings.IDEMPOTENCY_TTL)
+                    return response
+                finally:
+                    # An expired lease may belong to a retry by now
+                    delete_if(cache, lock_key, token)
+
+            if time.monotonic() >= deadline:
+                return JsonResponse(
+                    {'error': 'A request with this Idempotency-Key is still in progress'}, status=409
+                )
+            time.sleep(POLL_INTERVAL)
+
+    return wrapper
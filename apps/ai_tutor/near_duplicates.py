@@ -0,0 +1,145 @@
+import hashlib
+import random
+import re
+from collections import Counter, defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Count
+
+from apps.accounts.models import AIInteraction, QuestionBand
+
+# 16 bands of 4 hashes: questions at 0.8 similarity share a band 99.9% of the
+# time, at 0.5 about 64%, and at 0.3 only 12%. Candidates are then checked exactly.
+BANDS = 16
+ROWS = 4
+PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)  # fixed, so stored band keys stay valid across restarts
+PERMUTATIONS = [(_rng.randrange(1, PRIME), _rng.randrange(PRIME)) for _ in range(BANDS * ROWS)]
+MAX_CANDIDATES = 20  # most band collisions first; the rest are unlikely to pass the threshold
+
+# Words that change how a question is asked but not what it asks. "What" asks the
+# same as "explain", but "why do plants..." and "how do plants..." are different questions.
+STOPWORDS = frozenset('''
+    a about am an and are as at be by can could do does explain for from get give help hey hi i in is it
+    it's like me mean meaning means my of on or pls please plz quick s should simple simply so some tell that
+    the their there they this to understand was we what what's whats with would you your
+'''.split())
+
+
+def tutor_questions():
+    """Interactions whose prompt is a free-form tutor question, not an explain or quiz request.
+
+    Conversation turns are left out: their answers depend on the turns before them.
+    """
+    return (AIInteraction.objects.filter(credits_used=1, conversation__isnull=True)
+            .exclude(prompt__startswith='Explain: ').exclude(prompt__startswith='Quiz: '))
+
+
+def question_terms(question):
+    """The words that carry a question's meaning, with plurals folded, and each pair of neighbouring words.
+
+    The pairs keep word order, so "10 divided by 2" and "2 divided by 10"
+    share their words but not their pairs and fall well short of a match.
+    """
+    words = []
+    # Operators are kept as words, so "2+2" and "2*2" stay different questions
+    for word in re.findall(r"[\w']+|[-+*/=^<>%]", question.lower()):
+        if word in STOPWORDS:
+            continue
+        words.append(_singular(word.removesuffix("'s")))
+    return frozenset(words + [f'{first} {second}' for first, second in zip(words, words[1:])])
+
+
+def _singular(word):
+    if len(word) <= 3 or not word.endswith('s') or word.endswith('ss'):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'sses', 'xes', 'ches', 'shes')):
+        return word[:-2]
+    return word[:-1]
+
+
+def similarity(terms, other):
+    """Jaccard similarity of two term sets, word pairs included"""
+    if not terms or not other:
+        return 0.0
+    return len(terms & other) / len(terms | other)
+
+
+@lru_cache(maxsize=1024)
+def band_keys(terms):
+    """LSH band keys of the MinHash signature of ``terms``, as signed 64-bit ints"""
+    if not terms:
+        return ()
+    hashes = [int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), 'big') for term in terms]
+    signature = [min((a * value + b) % PRIME for value in hashes) for a, b in PERMUTATIONS]
+    keys = []
+    for band in range(BANDS):
+        data = f"{band}:{','.join(map(str, signature[band * ROWS:(band + 1) * ROWS]))}".encode()
+        keys.append(int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big', signed=True))
+    return tuple(keys)
+
+
+def best_match(terms, candidates, threshold):
+    """The ``(id, similarity)`` of the most similar candidate at or above ``threshold``, or None"""
+    best = None
+    for pk, other in candidates:
+        score = similarity(terms, other)
+        if score >= threshold and (best is None or score > best[1]):
+            best = (pk, score)
+    return best
+
+
+def find_similar(question, threshold=None):
+    """A past tutor interaction asking the same thing as ``question``, as ``(interaction, similarity)``"""
+    threshold = settings.NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+    terms = question_terms(question)
+    keys = band_keys(terms)
+    if not keys:
+        return None
+    # Evaluated here: MySQL does not allow LIMIT in an IN subquery
+    candidates = list(
+        QuestionBand.objects.filter(key__in=keys).values('interaction_id')
+        .annotate(collisions=Count('id')).order_by('-collisions', '-interaction_id')
+        .values_list('interaction_id', flat=True)[:MAX_CANDIDATES]
+    )
+    prompts = AIInteraction.objects.filter(pk__in=candidates).values_list('pk', 'prompt')
+    match = best_match(terms, ((pk, question_terms(prompt)) for pk, prompt in prompts), threshold)
+    if match is None:
+        return None
+    return AIInteraction.objects.get(pk=match[0]), match[1]
+
+
+def index_interaction(interaction):
+    """Make a freshly answered tutor question available for reuse"""
+    QuestionBand.objects.bulk_create([
+        QuestionBand(interaction=interaction, key=key) for key in band_keys(question_terms(interaction.prompt))
+    ])
+
+
+class MemoryIndex:
+    """In-memory twin of the stored index, for replaying history offline.
+
+    Like the live path, a question that finds a match is answered from it
+    and not indexed, so only the first of each group of repeats is kept.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.buckets = defaultdict(list)
+        self.terms = {}
+
+    def __len__(self):
+        return len(self.terms)
+
+    def find(self, terms, keys):
+        collisions = Counter(pk for key in keys for pk in self.buckets.get(key, ()))
+        candidates = ((pk, self.terms[pk]) for pk, _ in collisions.most_common(MAX_CANDIDATES))
+        return best_match(terms, candidates, self.threshold)
+
+    def add(self, pk, terms, keys):
+        self.terms[pk] = terms
+        for key in keys:
+            self.buckets[key].append(pk)
@@ -0,0 +1,79 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.core import metrics
+from . import background
+from .curriculum import topic_key
+
+POLL_INTERVAL = 0.1
+PENDING = 'pending'
+
+
+def quiz_options(data):
+    """``(difficulty, num_questions)`` of a quiz request, with generate_quiz's defaults"""
+    return str(data.get('difficulty', 'medium')), min(int(data.get('num_questions', 5)), 10)
+
+
+def prefetch_key(user_id, topic, difficulty, num_questions):
+    digest = hashlib.sha256(f'{topic_key(topic)}|{difficulty}|{num_questions}'.encode()).hexdigest()
+    return f'quiz_prefetch:{user_id}:{digest}'
+
+
+def schedule(key, generate):
+    """Run ``generate()`` in the background and keep its result under ``key`` for QUIZ_PREFETCH_TTL.
+
+    Nothing is started when the same quiz is already prefetched or on its
+    way, or when this process's background threads are backed up.
+    """
+    # The marker outlives the queue wait and the upstream timeout, so a killed thread cannot leave it behind
+    if not cache.add(key, PENDING, settings.AI_UPSTREAM_SLOT_LEASE):
+        return False
+    if not background.submit(_run, key, generate):
+        cache.delete(key)
+        metrics.QUIZ_PREFETCHES.inc('skipped')
+        return False
+    metrics.QUIZ_PREFETCHES.inc('scheduled')
+    return True
+
+
+def _run(key, generate):
+    try:
+        quiz = generate()
+    except Exception:
+        # Busy upstream or a failed call; the quiz will be generated when asked for
+        cache.delete(key)
+        metrics.QUIZ_PREFETCHES.inc('failed')
+        return
+    cache.set(key, {'quiz': quiz, 'model': settings.HUGGINGFACE_MODEL}, settings.QUIZ_PREFETCH_TTL)
+    metrics.QUIZ_PREFETCHES.inc('stored')
+
+
+def claim(key):
+    """Take the prefetched quiz under ``key``, waiting up to QUIZ_PREFETCH_WAIT for one in flight.
+
+    Returns ``{'quiz': ..., 'model': ...}`` or None. A prefetch is handed to
+    one request only.
+    """
+    deadline = time.monotonic() + settings.QUIZ_PREFETCH_WAIT
+    while True:
+        prefetched = cache.get(key)
+        if prefetched is None:
+            break
+        if prefetched != PENDING:
+            if cache.delete(key):
+                metrics.QUIZ_PREFETCHES.inc('used')
+                return prefetched
+            break
+        if time.monotonic() >= deadline:
+            break
+        time.sleep(POLL_INTERVAL)
+    metrics.QUIZ_PREFETCHES.inc('missed')
+    return None
+
+
+def restore(key, prefetched):
+    """Put back a claimed quiz whose request failed, so the next one can use it"""
+    cache.add(key, prefetched, settings.QUIZ_PREFETCH_TTL)
@@ -0,0 +1,210 @@
+import re
+
+from django.conf import settings
+from django.db import connections, router
+
+from apps.accounts.models import AIInteraction
+
+TABLE = AIInteraction._meta.db_table
+MAX_TERMS = 8
+
+
+def parse_terms(query):
+    """Lower-cased words of ``query``; punctuation and search operators are dropped"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+class SearchBackend:
+    """Full-text search over the prompts and responses of AI interactions.
+
+    ``install`` creates whatever keeps the index current as rows are written,
+    ``rebuild`` re-indexes every row, and ``search`` returns ``(id, score)``
+    pairs, best first.
+    """
+    name = None
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def install(self):
+        pass
+
+    def suspend(self):
+        """Take down what would stop a schema change to the interactions table, keeping the index data"""
+
+    def repair(self):
+        """Reinstall whatever ``suspend`` or a schema change took down, if the index is in use; True if anything was"""
+        return False
+
+    def uninstall(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, query, user_id=None, limit=20):
+        raise NotImplementedError
+
+    def execute(self, sql, params=()):
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall() if cursor.description else []
+
+
+class BasicSearchBackend(SearchBackend):
+    """Unindexed fallback: every word must appear in the prompt, newest first"""
+    name = 'basic'
+
+    def search(self, query, user_id=None, limit=20):
+        interactions = AIInteraction.objects.using(self.connection.alias)
+        if user_id is not None:
+            interactions = interactions.filter(user_id=user_id)
+        for term in parse_terms(query):
+            interactions = interactions.filter(prompt__icontains=term)
+        return [(pk, None) for pk in interactions.order_by('-pk').values_list('pk', flat=True)[:limit]]
+
+
+class MySQLSearchBackend(SearchBackend):
+    """InnoDB FULLTEXT index on (prompt, response), kept current by MySQL on every write"""
+    name = 'mysql'
+    INDEX = f'{TABLE}_fulltext'
+    MIN_TOKEN_SIZE = 3  # innodb_ft_min_token_size; shorter words are not in the index
+
+    def installed(self):
+        return bool(self.execute(
+            'SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() '
+            'AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1', [TABLE, self.INDEX],
+        ))
+
+    def install(self):
+        if not self.installed():
+            self.execute(f'ALTER TABLE `{TABLE}` ADD FULLTEXT INDEX `{self.INDEX}` (`prompt`, `response`)')
+
+    def uninstall(self):
+        if self.installed():
+            self.execute(f'ALTER TABLE `{TABLE}` DROP INDEX `{self.INDEX}`')
+
+    def rebuild(self):
+        self.uninstall()
+        self.install()
+
+    def search(self, query, user_id=None, limit=20):
+        terms = [term for term in parse_terms(query) if len(term) >= self.MIN_TOKEN_SIZE]
+        if not terms:
+            return []
+        # Every word required; the last may be a prefix, for search-as-you-type
+        against = ' '.join(f'+{term}' for term in terms) + '*'
+        sql = (f'SELECT `id`, MATCH(`prompt`, `response`) AGAINST (%s IN BOOLEAN MODE) AS score FROM `{TABLE}` '
+               f'WHERE MATCH(`prompt`, `response`) AGAINST (%s IN BOOLEAN MODE)')
+        params = [against, against]
+        if user_id is not None:
+            sql += ' AND `user_id` = %s'
+            params.append(user_id)
+        return self.execute(sql + ' ORDER BY score DESC LIMIT %s', [*params, limit])
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """FTS5 index over (prompt, response), kept current by triggers on the interactions table.
+
+    The index reads its rows through a view that adds an ``owner`` token
+    (``u<user id>``), so a per-user search intersects two posting lists
+    instead of checking every match against the interactions table. Only
+    the newest ``SEARCH_RANK_CANDIDATES`` matches are ranked, which bounds
+    the cost of very common words.
+    """
+    name = 'sqlite'
+    FTS_TABLE = f'{TABLE}_fts'
+    VIEW = f'{TABLE}_search'
+    PROMPT_WEIGHT = 2.0  # a match in the question counts double a match in the answer
+    TRIGGERS = ('_insert', '_delete', '_update')
+
+    def install(self):
+        fts, view = self.FTS_TABLE, self.VIEW
+        self.execute(
+            f'CREATE VIEW IF NOT EXISTS "{view}" AS '
+            f"SELECT id, prompt, response, 'u' || user_id AS owner FROM \"{TABLE}\""
+        )
+        self.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS "{fts}" USING fts5(prompt, response, owner, '
+            f"content='{view}', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2')"
+        )
+        insert = (f'INSERT INTO "{fts}"(rowid, prompt, response, owner) '
+                  f"VALUES (new.id, new.prompt, new.response, 'u' || new.user_id);")
+        delete = (f'INSERT INTO "{fts}"("{fts}", rowid, prompt, response, owner) '
+                  f"VALUES ('delete', old.id, old.prompt, old.response, 'u' || old.user_id);")
+        self.execute(f'CREATE TRIGGER IF NOT EXISTS "{fts}_insert" AFTER INSERT ON "{TABLE}" BEGIN {insert} END')
+        self.execute(f'CREATE TRIGGER IF NOT EXISTS "{fts}_delete" AFTER DELETE ON "{TABLE}" BEGIN {delete} END')
+        self.execute(
+            f'CREATE TRIGGER IF NOT EXISTS "{fts}_update" AFTER UPDATE OF prompt, response, user_id ON "{TABLE}" '
+            f'BEGIN {delete} {insert} END'
+        )
+
+    def suspend(self):
+        # Django alters most columns on SQLite by copying the table, dropping it and renaming the copy;
+        # the rename fails while the view refers to the table, and the triggers go with the old one
+        for suffix in self.TRIGGERS:
+            self.execute(f'DROP TRIGGER IF EXISTS "{self.FTS_TABLE}{suffix}"')
+        self.execute(f'DROP VIEW IF EXISTS "{self.VIEW}"')
+
+    def repair(self):
+        names = {name for name, in self.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view', 'trigger')")}
+        parts = [self.VIEW] + [f'{self.FTS_TABLE}{suffix}' for suffix in self.TRIGGERS]
+        if self.FTS_TABLE not in names or all(part in names for part in parts):
+            return False
+        self.install()
+        return True
+
+    def uninstall(self):
+        for suffix in self.TRIGGERS:
+            self.execute(f'DROP TRIGGER IF EXISTS "{self.FTS_TABLE}{suffix}"')
+        self.execute(f'DROP TABLE IF EXISTS "{self.FTS_TABLE}"')
+        self.execute(f'DROP VIEW IF EXISTS "{self.VIEW}"')
+
+    def rebuild(self):
+        self.install()
+        self.execute(f'INSERT INTO "{self.FTS_TABLE}"("{self.FTS_TABLE}") VALUES (\'rebuild\')')
+
+    def search(self, query, user_id=None, limit=20):
+        terms = parse_terms(query)
+        if not terms:
+            return []
+        fts = self.FTS_TABLE
+        # Every word required in the prompt or response; the last may be a prefix
+        match = '{prompt response} : (' + ' '.join(f'"{term}"' for term in terms) + '*)'
+        if user_id is not None:
+            match = f'owner : "u{int(user_id)}" AND {match}'
+        oldest = self.execute(
+            f'SELECT rowid FROM "{fts}" WHERE "{fts}" MATCH %s ORDER BY rowid DESC LIMIT 1 OFFSET %s',
+            [match, settings.SEARCH_RANK_CANDIDATES - 1],
+        )
+        return self.execute(
+            f'SELECT rowid, -bm25("{fts}", {self.PROMPT_WEIGHT}, 1.0, 0.0) AS score FROM "{fts}" '
+            f'WHERE "{fts}" MATCH %s AND rowid >= %s ORDER BY score DESC LIMIT %s',
+            [match, oldest[0][0] if oldest else 0, limit],
+        )
+
+
+BACKENDS = {backend.name: backend for backend in (BasicSearchBackend, MySQLSearchBackend, SQLiteSearchBackend)}
+
+
+def get_backend(using=None):
+    """The search backend for a database: ``settings.SEARCH_BACKEND``, or by vendor when 'auto'"""
+    connection = connections[using or router.db_for_read(AIInteraction)]
+    name = settings.SEARCH_BACKEND
+    if name == 'auto':
+        name = connection.vendor if connection.vendor in BACKENDS else 'basic'
+    return BACKENDS[name](connection)
+
+
+def search_interactions(query, user_id=None, limit=20):
+    """Interactions matching ``query``, best first, each with a ``search_score``"""
+    backend = get_backend()
+    hits = backend.search(query, user_id, limit)
+    interactions = AIInteraction.objects.using(backend.connection.alias).in_bulk([pk for pk, _ in hits])
+    results = []
+    for pk, score in hits:
+        if pk in interactions:
+            interaction = interactions[pk]
+            interaction.search_score = score
+            results.append(interaction)
+    return results
@@ -0,0 +1,99 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.accounts.models import User
+
+from .governor import governor
+
+
+class TutorTestCase(TestCase):
+    """A logged-in user with credits, and a shared cache of its own"""
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        isolated = override_settings(
+            CACHES={'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(tmpdir.name, 'cache.sqlite3')}},
+            METRICS_DIR=os.path.join(tmpdir.name, 'metrics'),
+            RATELIMIT_ENABLE=False,
+        )
+        isolated.enable()
+        self.addCleanup(isolated.disable)
+
+        self.user = User.objects.create_user(
+            username='student', email='student@example.com', password='student-pw', credits=10
+        )
+        self.client.force_login(self.user)
+
+    def post_tutor(self, payload, **extra):
+        return self.client.post(reverse('ai_tutor:tutor'), json.dumps(payload), content_type='application/json', **extra)
+
+
+@override_settings(HUGGINGFACE_API_TOKEN='test-token', AI_UPSTREAM_MAX_CONCURRENCY=1, AI_UPSTREAM_QUEUE_TIMEOUT=0.2)
+class UpstreamGovernorTests(TutorTestCase):
+
+    def test_slot_exhaustion_returns_503_with_retry_after(self):
+        slot_key, token = governor.acquire(timeout=0)
+        self.addCleanup(governor.release, slot_key, token)
+
+        with mock.patch('apps.ai_tutor.views.requests.post') as post:
+            response = self.post_tutor({'question': 'Why is the sky blue?'})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        post.assert_not_called()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.credits, 10)
+
+    def test_released_slot_can_be_claimed_again(self):
+        slot_key, token = governor.acquire(timeout=0)
+        governor.release(slot_key, token)
+
+        self.assertEqual(governor.acquire(timeout=0)[0], slot_key)
+
+    def test_release_keeps_a_reclaimed_lease(self):
+        slot_key, token = governor.acquire(timeout=0)
+        # The lease expired and another worker claimed the slot
+        cache.set(slot_key, 'other-worker')
+        governor.release(slot_key, token)
+
+        self.assertEqual(cache.get(slot_key), 'other-worker')
+
+
+@mock.patch('apps.ai_tutor.views.query_huggingface', return_value='Light scatters off the air.')
+class IdempotencyTests(TutorTestCase):
+
+    def test_duplicate_key_replays_the_stored_response(self, query):
+        first = self.post_tutor({'question': 'Why is the sky blue?'}, HTTP_IDEMPOTENCY_KEY='retry-1')
+        second = self.post_tutor({'question': 'Why is the sky blue?'}, HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(query.call_count, 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.credits, 9)
+
+    def test_key_reused_with_a_different_body_is_rejected(self, query):
+        self.post_tutor({'question': 'Why is the sky blue?'}, HTTP_IDEMPOTENCY_KEY='retry-1')
+        response = self.post_tutor({'question': 'Why is grass green?'}, HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(query.call_count, 1)
+
+    def test_server_errors_are_not_replayed(self, query):
+        query.side_effect = [Exception('upstream down'), 'Light scatters off the air.']
+        failed = self.post_tutor({'question': 'Why is the sky blue?'}, HTTP_IDEMPOTENCY_KEY='retry-1')
+        retried = self.post_tutor({'question': 'Why is the sky blue?'}, HTTP_IDEMPOTENCY_KEY='retry-1')
+
+        self.assertEqual(failed.status_code, 500)
+        self.assertEqual(retried.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', retried)
@@ -7,5 +7,7 @@ urlpatterns = [
     path('tutor/', views.ai_tutor, name='tutor'),
     path('explain/', views.explain_concept, name='explain'),
     path('generate-quiz/', views.generate_quiz, name='generate_quiz'),
+    path('search/', views.search_history, name='search'),
+    path('queue-stats/', views.queue_stats, name='queue_stats'),
 ]
 
@@ -1,14 +1,28 @@
 import json
+import time
+from functools import partial
 import requests
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.db import transaction
-from django_ratelimit.decorators import ratelimit
 
-from apps.accounts.models import User, AIInteraction
+from apps.accounts.models import User, AIInteraction, Conversation
+from apps.core import metrics, tracing
+from . import background
+from .conversation import build_context, estimate_tokens, fold, recent_turns
+from .curriculum import DEFAULT_CONTEXT, find_explanation
+from .governor import UpstreamBusy, governor
+from .idempotency import idempotent
+from .near_duplicates import find_similar, index_interaction
+from . import prefetch
+from .search import get_backend, search_interactions
+
+
+NO_ANSWER = "I apologize, but I couldn't generate a proper response. Please try again."
 
 
 class PromptTemplates:
@@ -18,6 +32,27 @@ class PromptTemplates:
     Provide clear, accurate, and encouraging responses. Adapt your explanations to the user's level.
     Focus on understanding rather than memorization. Use examples and analogies when helpful."""
     
+    TUTOR_CONVERSATION = """{system}
+    
+    Summary of the conversation so far: {summary}
+    
+    Recent exchanges:
+    {exchanges}
+    
+    Student Question: {question}
+    
+    Please provide a helpful, educational response that promotes understanding and learning.
+    The question may refer back to the conversation above."""
+    
+    SUMMARIZE_CONVERSATION = """Update the summary of a tutoring conversation with the new exchanges below.
+    Keep the topics covered, what the student understood or found difficult, and any open questions.
+    Write at most {words} words and reply with the summary only.
+    
+    Current summary: {summary}
+    
+    New exchanges:
+    {exchanges}"""
+    
     EXPLAIN_CONCEPT = """Explain the concept of "{topic}" in a way that's appropriate for {level} level students. 
     Include:
     1. A clear definition
@@ -38,7 +73,7 @@ class PromptTemplates:
     Number of questions: {num_questions}"""
 
 
-def query_huggingface(prompt, model=None):
+def query_huggingface(prompt, model=None, priority='free', queue_timeout=None):
     """Query Hugging Face Inference API"""
     if not settings.HUGGINGFACE_API_TOKEN:
         raise ValueError("Hugging Face API token not configured")
@@ -60,10 +95,32 @@ def query_huggingface(prompt, model=None):
         }
     }
     
-    url = f"https://api-inference.huggingface.co/models/{model}"
+    url = f"{settings.HUGGINGFACE_API_URL}/{model}"
+    
+    with governor.slot(timeout=queue_timeout, priority=priority):
+        started = time.perf_counter()
+        traceparent = tracing.current_traceparent()
+        if traceparent:
+            headers["traceparent"] = traceparent
+        try:
+            with tracing.span('ai.upstream', tracing.CLIENT, model=model) as span:
+                response = requests.post(url, headers=headers, json=payload, timeout=30)
+                if span is not None:
+                    span.set('http.status_code', response.status_code)
+        except requests.exceptions.RequestException as e:
+            metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - started, model, 'error')
+            raise Exception("AI service temporarily unavailable")
+        
+        if response.status_code in (429, 503):
+            metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - started, model, 'throttled')
+            delay = governor.record_throttled(response.headers.get('Retry-After'))
+            raise UpstreamBusy("AI service is busy", retry_after=delay)
+        metrics.UPSTREAM_LATENCY.observe(
+            time.perf_counter() - started, model, 'ok' if response.ok else 'error'
+        )
+        governor.record_success()
     
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
         response.raise_for_status()
         
         result = response.json()
@@ -72,15 +129,58 @@ def query_huggingface(prompt, model=None):
         elif isinstance(result, dict):
             return result.get('generated_text', '').strip()
         else:
-            return "I apologize, but I couldn't generate a proper response. Please try again."
+            return NO_ANSWER
             
     except requests.exceptions.RequestException as e:
         raise Exception("AI service temporarily unavailable")
 
 
+def summarize_conversation(summary, exchanges):
+    """The rolling summary of a conversation updated with ``exchanges``"""
+    prompt = PromptTemplates.SUMMARIZE_CONVERSATION.format(
+        summary=summary or 'None yet',
+        exchanges=exchanges,
+        words=settings.CONVERSATION_SUMMARY_TOKENS * 3 // 4
+    )
+    updated = query_huggingface(prompt, priority='batch')
+    if updated == NO_ANSWER:
+        raise ValueError("No summary was generated")
+    return updated
+
+
+def prefetch_quiz(user_id, topic, difficulty, num_questions):
+    """Start generating the quiz that usually follows an explanation, unbilled and at the lowest priority"""
+    prompt = PromptTemplates.QUIZ_GENERATOR.format(
+        topic=topic,
+        difficulty=difficulty,
+        num_questions=num_questions
+    )
+    prefetch.schedule(
+        prefetch.prefetch_key(user_id, topic, difficulty, num_questions),
+        partial(query_huggingface, prompt, priority='batch', queue_timeout=settings.QUIZ_PREFETCH_QUEUE_TIMEOUT),
+    )
+
+
+def refund_credits(request, user_id, amount, reason):
+    """Give back the credits charged for a request whose AI call failed"""
+    with transaction.atomic():
+        User.objects.select_for_update().get(id=user_id).add_credits(amount)
+    metrics.CREDIT_REFUNDS.inc(request.resolver_match.view_name, reason)
+
+
+def upstream_busy_response(error):
+    """503 response telling the client when to retry"""
+    response = JsonResponse(
+        {'error': f'AI service is busy. Credits refunded. Please retry in {error.retry_after} seconds.'},
+        status=503
+    )
+    response['Retry-After'] = error.retry_after
+    return response
+
+
 @login_required
 @require_http_methods(["POST"])
-@ratelimit(key='user', rate='10/m', method='POST')
+@idempotent
 def ai_tutor(request):
     """AI tutoring endpoint with prompt engineering"""
     try:
@@ -99,51 +199,118 @@ def ai_tutor(request):
     if request.user.credits < 1:
         return JsonResponse({'error': 'Insufficient credits. Please purchase more credits.'}, status=402)
     
+    # "conversation": true starts a conversation and "conversation_id" continues one
+    conversation, turns = None, []
+    if data.get('conversation_id') is not None:
+        try:
+            conversation = Conversation.objects.get(pk=int(data['conversation_id']), user=request.user)
+        except (TypeError, ValueError, Conversation.DoesNotExist):
+            return JsonResponse({'error': 'Conversation not found'}, status=404)
+        turns = recent_turns(conversation)
+    in_conversation = conversation is not None or bool(data.get('conversation'))
+    
+    # A paraphrase of an answered question gets the stored answer unless "fresh" is asked for.
+    # Follow-up questions in a conversation depend on what came before, so they are never reused.
+    fresh = bool(data.get('fresh')) or in_conversation
+    match = find_similar(question) if settings.NEAR_DUPLICATE_ENABLE and not fresh else None
+    
+    # Credits are deducted and the answer saved in two short transactions; the user's row
+    # is not locked while the request waits for an upstream slot and the model
     try:
         with transaction.atomic():
-            # Deduct credits
             user = User.objects.select_for_update().get(id=request.user.id)
             if not user.deduct_credits(1):
                 return JsonResponse({'error': 'Insufficient credits'}, status=402)
             
-            # Construct educational prompt
-            educational_prompt = f"""{PromptTemplates.TUTOR_SYSTEM}
-
-Student Question: {question}
-
-Please provide a helpful, educational response that promotes understanding and learning."""
-            
-            # Query AI
-            try:
-                ai_response = query_huggingface(educational_prompt)
-                
-                # Save interaction
+            if match is not None:
+                source, similarity = match
                 interaction = AIInteraction.objects.create(
                     user=user,
                     prompt=question,
-                    response=ai_response,
-                    model_used=settings.HUGGINGFACE_MODEL,
+                    response=source.response,
+                    model_used=source.model_used,
                     credits_used=1
                 )
-                
+                metrics.NEAR_DUPLICATES.inc('reused')
                 return JsonResponse({
-                    'response': ai_response,
+                    'response': source.response,
                     'credits_remaining': user.credits,
-                    'interaction_id': interaction.id
+                    'interaction_id': interaction.id,
+                    'reused': True,
+                    'similarity': round(similarity, 2)
                 })
-                
-            except Exception as e:
-                # Refund credits on AI failure
-                user.add_credits(1)
-                return JsonResponse({'error': 'AI service error. Credits refunded.'}, status=500)
-                
     except Exception as e:
         return JsonResponse({'error': 'Internal server error'}, status=500)
+    
+    if in_conversation:
+        # Older turns reach the model through the rolling summary, within the token budget
+        summary, exchanges = build_context(conversation.summary if conversation else '', turns)
+        metrics.CONVERSATION_CONTEXT_TOKENS.observe(estimate_tokens(summary) + estimate_tokens(exchanges))
+        educational_prompt = PromptTemplates.TUTOR_CONVERSATION.format(
+            system=PromptTemplates.TUTOR_SYSTEM,
+            summary=summary or 'None yet',
+            exchanges=exchanges or 'None yet',
+            question=question
+        )
+    else:
+        # Construct educational prompt
+        educational_prompt = f"""{PromptTemplates.TUTOR_SYSTEM}
+
+Student Question: {question}
+
+Please provide a helpful, educational response that promotes understanding and learning."""
+    
+    # Query AI
+    try:
+        ai_response = query_huggingface(educational_prompt, priority=user.get_plan())
+    except UpstreamBusy as e:
+        refund_credits(request, user.id, 1, 'upstream_busy')
+        return upstream_busy_response(e)
+    except Exception as e:
+        # Refund credits on AI failure
+        refund_credits(request, user.id, 1, 'upstream_error')
+        return JsonResponse({'error': 'AI service error. Credits refunded.'}, status=500)
+    
+    try:
+        with transaction.atomic():
+            if in_conversation and conversation is None:
+                conversation = Conversation.objects.create(user=user, title=question[:200])
+            
+            # Save interaction
+            interaction = AIInteraction.objects.create(
+                user=user,
+                prompt=question,
+                response=ai_response,
+                model_used=settings.HUGGINGFACE_MODEL,
+                credits_used=1,
+                conversation=conversation
+            )
+            if settings.NEAR_DUPLICATE_ENABLE and not fresh:
+                metrics.NEAR_DUPLICATES.inc('miss')
+                if ai_response != NO_ANSWER:
+                    index_interaction(interaction)
+            
+            result = {
+                'response': ai_response,
+                'credits_remaining': user.credits,
+                'interaction_id': interaction.id
+            }
+            if conversation is not None:
+                result['conversation_id'] = conversation.id
+                # The window is full with this turn: fold the oldest ones into the summary
+                if len(turns) >= settings.CONVERSATION_RECENT_TURNS:
+                    transaction.on_commit(
+                        partial(background.submit, fold, conversation.id, summarize_conversation)
+                    )
+            return JsonResponse(result)
+    except Exception as e:
+        refund_credits(request, user.id, 1, 'save_error')
+        return JsonResponse({'error': 'Internal server error'}, status=500)
 
 
 @login_required
 @require_http_methods(["POST"])
-@ratelimit(key='user', rate='5/m', method='POST')
+@idempotent
 def explain_concept(request):
     """Explain educational concepts with structured prompts"""
     try:
@@ -158,48 +325,87 @@ def explain_concept(request):
     if request.user.credits < 2:  # Explanations cost 2 credits
         return JsonResponse({'error': 'Insufficient credits (2 required)'}, status=402)
     
+    # "prefetch_quiz": true (or the quiz's difficulty and num_questions) prepares the follow-up quiz
+    quiz_prefetch = data.get('prefetch_quiz') if settings.QUIZ_PREFETCH_ENABLE else None
+    if quiz_prefetch:
+        try:
+            quiz_prefetch = prefetch.quiz_options(quiz_prefetch if isinstance(quiz_prefetch, dict) else {})
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'prefetch_quiz num_questions must be a number'}, status=400)
+    
+    # Core syllabus topics are pre-generated by the pregenerate_explanations command
+    context = data.get('context') or DEFAULT_CONTEXT
+    stored = find_explanation(str(data['topic']), str(data['level']), context)
+    metrics.PREGENERATED_EXPLANATIONS.inc('hit' if stored else 'miss')
+    
     try:
         with transaction.atomic():
             user = User.objects.select_for_update().get(id=request.user.id)
             if not user.deduct_credits(2):
                 return JsonResponse({'error': 'Insufficient credits'}, status=402)
             
-            # Use structured prompt template
-            prompt = PromptTemplates.EXPLAIN_CONCEPT.format(
-                topic=data['topic'],
-                level=data.get('level', 'beginner'),
-                context=data.get('context', 'general education')
-            )
-            
-            try:
-                ai_response = query_huggingface(prompt)
-                
-                interaction = AIInteraction.objects.create(
+            if stored is not None:
+                AIInteraction.objects.create(
                     user=user,
                     prompt=f"Explain: {data['topic']} ({data['level']} level)",
-                    response=ai_response,
-                    model_used=settings.HUGGINGFACE_MODEL,
+                    response=stored.explanation,
+                    model_used=stored.model_used,
                     credits_used=2
                 )
-                
+                if quiz_prefetch:
+                    transaction.on_commit(partial(prefetch_quiz, user.id, str(data['topic']), *quiz_prefetch))
                 return JsonResponse({
-                    'explanation': ai_response,
+                    'explanation': stored.explanation,
                     'credits_remaining': user.credits,
                     'topic': data['topic'],
-                    'level': data['level']
+                    'level': data['level'],
+                    'pregenerated': True
                 })
-                
-            except Exception as e:
-                user.add_credits(2)  # Refund
-                return JsonResponse({'error': 'AI service error. Credits refunded.'}, status=500)
-                
     except Exception as e:
         return JsonResponse({'error': 'Internal server error'}, status=500)
+    
+    # Use structured prompt template
+    prompt = PromptTemplates.EXPLAIN_CONCEPT.format(
+        topic=data['topic'],
+        level=data.get('level', 'beginner'),
+        context=context
+    )
+    
+    try:
+        ai_response = query_huggingface(prompt, priority=user.get_plan())
+    except UpstreamBusy as e:
+        refund_credits(request, user.id, 2, 'upstream_busy')
+        return upstream_busy_response(e)
+    except Exception as e:
+        refund_credits(request, user.id, 2, 'upstream_error')
+        return JsonResponse({'error': 'AI service error. Credits refunded.'}, status=500)
+    
+    try:
+        with transaction.atomic():
+            interaction = AIInteraction.objects.create(
+                user=user,
+                prompt=f"Explain: {data['topic']} ({data['level']} level)",
+                response=ai_response,
+                model_used=settings.HUGGINGFACE_MODEL,
+                credits_used=2
+            )
+            if quiz_prefetch:
+                transaction.on_commit(partial(prefetch_quiz, user.id, str(data['topic']), *quiz_prefetch))
+    except Exception as e:
+        refund_credits(request, user.id, 2, 'save_error')
+        return JsonResponse({'error': 'Internal server error'}, status=500)
+    
+    return JsonResponse({
+        'explanation': ai_response,
+        'credits_remaining': user.credits,
+        'topic': data['topic'],
+        'level': data['level']
+    })
 
 
 @login_required
 @require_http_methods(["POST"])
-@ratelimit(key='user', rate='3/m', method='POST')
+@idempotent
 def generate_quiz(request):
     """Generate educational quizzes"""
     try:
@@ -213,39 +419,109 @@ def generate_quiz(request):
     if request.user.credits < 3:  # Quiz generation costs 3 credits
         return JsonResponse({'error': 'Insufficient credits (3 required)'}, status=402)
     
+    try:
+        difficulty, num_questions = prefetch.quiz_options(data)  # Max 10 questions
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'num_questions must be a number'}, status=400)
+    
     try:
         with transaction.atomic():
             user = User.objects.select_for_update().get(id=request.user.id)
             if not user.deduct_credits(3):
                 return JsonResponse({'error': 'Insufficient credits'}, status=402)
-            
-            prompt = PromptTemplates.QUIZ_GENERATOR.format(
-                topic=data['topic'],
-                difficulty=data.get('difficulty', 'medium'),
-                num_questions=min(int(data.get('num_questions', 5)), 10)  # Max 10 questions
-            )
-            
+    except Exception as e:
+        return JsonResponse({'error': 'Internal server error'}, status=500)
+    
+    # A quiz prefetched after an explanation of the same topic is billed now, on use. It is
+    # claimed only once the credits are deducted, so a failed charge leaves it for later.
+    if settings.QUIZ_PREFETCH_ENABLE:
+        key = prefetch.prefetch_key(user.id, str(data['topic']), difficulty, num_questions)
+        prefetched = prefetch.claim(key)
+        if prefetched is not None:
             try:
-                ai_response = query_huggingface(prompt)
-                
-                interaction = AIInteraction.objects.create(
+                AIInteraction.objects.create(
                     user=user,
-                    prompt=f"Quiz: {data['topic']} ({data.get('difficulty', 'medium')})",
-                    response=ai_response,
-                    model_used=settings.HUGGINGFACE_MODEL,
+                    prompt=f"Quiz: {data['topic']} ({difficulty})",
+                    response=prefetched['quiz'],
+                    model_used=prefetched['model'],
                     credits_used=3
                 )
-                
-                return JsonResponse({
-                    'quiz_content': ai_response,
-                    'credits_remaining': user.credits,
-                    'topic': data['topic']
-                })
-                
             except Exception as e:
-                user.add_credits(3)  # Refund
-                return JsonResponse({'error': 'Quiz generation failed. Credits refunded.'}, status=500)
-                
+                prefetch.restore(key, prefetched)
+                refund_credits(request, user.id, 3, 'save_error')
+                return JsonResponse({'error': 'Internal server error'}, status=500)
+            return JsonResponse({
+                'quiz_content': prefetched['quiz'],
+                'credits_remaining': user.credits,
+                'topic': data['topic'],
+                'prefetched': True
+            })
+    
+    prompt = PromptTemplates.QUIZ_GENERATOR.format(
+        topic=data['topic'],
+        difficulty=difficulty,
+        num_questions=num_questions
+    )
+    
+    try:
+        ai_response = query_huggingface(prompt, priority=user.get_plan())
+    except UpstreamBusy as e:
+        refund_credits(request, user.id, 3, 'upstream_busy')
+        return upstream_busy_response(e)
+    except Exception as e:
+        refund_credits(request, user.id, 3, 'upstream_error')
+        return JsonResponse({'error': 'Quiz generation failed. Credits refunded.'}, status=500)
+    
+    try:
+        AIInteraction.objects.create(
+            user=user,
+            prompt=f"Quiz: {data['topic']} ({difficulty})",
+            response=ai_response,
+            model_used=settings.HUGGINGFACE_MODEL,
+            credits_used=3
+        )
     except Exception as e:
+        refund_credits(request, user.id, 3, 'save_error')
         return JsonResponse({'error': 'Internal server error'}, status=500)
+    
+    return JsonResponse({
+        'quiz_content': ai_response,
+        'credits_remaining': user.credits,
+        'topic': data['topic']
+    })
+
 
+@staff_member_required
+@require_http_methods(["GET"])
+def queue_stats(request):
+    """Per-plan admission queue depth and wait times for the inference backend"""
+    return JsonResponse({'classes': governor.queue_stats()})
+
+
+@login_required
+@require_http_methods(["GET"])
+def search_history(request):
+    """Full-text search over the user's own questions and answers, best match first"""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'Query parameter "q" is required'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), settings.SEARCH_MAX_RESULTS)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+    
+    results = search_interactions(query, user_id=request.user.id, limit=limit)
+    return JsonResponse({
+        'query': query,
+        'backend': get_backend().name,
+        'results': [
+            {
+                'interaction_id': interaction.id,
+                'prompt': interaction.prompt,
+                'response': interaction.response[:300],
+                'created_at': interaction.created_at.isoformat(),
+                'score': interaction.search_score,
+            }
+            for interaction in results
+        ],
+    })
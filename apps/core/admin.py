@@ -0,0 +1,65 @@
+from django.contrib import admin
+from django.db.models import Avg, Count, Max
+from django.utils.html import format_html, format_html_join
+
+from .models import RequestProfile
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('endpoint', 'method', 'status_code', 'duration_ms', 'sql_count', 'sql_time_ms',
+                    'duplicate_queries', 'trigger', 'profiler', 'created_at')
+    list_filter = ('trigger', 'profiler', 'method', 'endpoint')
+    search_fields = ('endpoint', 'path')
+    date_hierarchy = 'created_at'
+    fields = readonly_fields = (
+        'endpoint', 'method', 'path', 'status_code', 'user_id', 'trigger', 'profiler', 'duration_ms',
+        'sql_count', 'sql_time_ms', 'duplicate_queries', 'created_at', 'similar_queries_table', 'hot_frames_table',
+    )
+    change_list_template = 'admin/core/requestprofile/change_list.html'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def changelist_view(self, request, extra_context=None):
+        # Slowest endpoints across the profiles matching the current filters
+        response = super().changelist_view(request, extra_context)
+        if hasattr(response, 'context_data') and 'cl' in response.context_data:
+            response.context_data['slowest_endpoints'] = (
+                response.context_data['cl'].queryset.order_by()
+                .values('endpoint')
+                .annotate(
+                    requests=Count('id'),
+                    avg_ms=Avg('duration_ms'),
+                    max_ms=Max('duration_ms'),
+                    avg_sql=Avg('sql_count'),
+                    max_duplicates=Max('duplicate_queries'),
+                )
+                .order_by('-avg_ms')[:10]
+            )
+        return response
+    
+    def similar_queries_table(self, obj):
+        if not obj.similar_queries:
+            return '-'
+        rows = format_html_join(
+            '', '<tr><td>{}</td><td>{}</td><td><code>{}</code></td></tr>',
+            ((q['count'], q['time_ms'], q['sql']) for q in obj.similar_queries),
+        )
+        return format_html('<table><tr><th>Count</th><th>ms</th><th>SQL</th></tr>{}</table>', rows)
+    similar_queries_table.short_description = 'Repeated queries'
+    
+    def hot_frames_table(self, obj):
+        if not obj.hot_frames:
+            return '-'
+        columns = [key for key in obj.hot_frames[0] if key != 'frame']
+        header = format_html_join('', '<th>{}</th>', ((column.replace('_', ' '),) for column in columns))
+        rows = format_html_join(
+            '', '<tr><td><code>{}</code></td>{}</tr>',
+            ((frame['frame'], format_html_join('', '<td>{}</td>', ((frame[c],) for c in columns))) for frame in obj.hot_frames),
+        )
+        return format_html('<table><tr><th>Frame</th>{}</tr>{}</table>', header, rows)
+    hot_frames_table.short_description = 'Hot frames'
@@ -0,0 +1,13 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.core'
+
+    def ready(self):
+        from django.core.signals import request_finished
+
+        from .log import clear_request_context
+
+        request_finished.connect(clear_request_context, dispatch_uid='core.clear_request_context')
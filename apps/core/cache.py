@@ -0,0 +1,261 @@
+import os
+import pickle
+import sqlite3
+import time
+from collections import Counter
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+from .tracing import traced
+
+# Key prefix -> use label on cache_requests_total, so the hit ratio of the
+# page, fragment and user caches is not diluted by locks and counters
+KEY_USES = (
+    ('page:', 'page'),
+    ('template.cache.', 'fragment'),
+    ('auth:user:', 'user'),
+    ('user:', 'user'),
+    ('django.contrib.sessions.', 'session'),
+    ('governor:', 'governor'),
+    ('ratelimit:', 'ratelimit'),
+    ('idempotency:', 'idempotency'),
+    ('quiz_prefetch:', 'prefetch'),
+    ('db:pin:', 'replica_pin'),
+)
+
+
+def key_use(key):
+    for prefix, use in KEY_USES:
+        if key.startswith(prefix):
+            return use
+    return 'other'
+
+
+def delete_if(cache, key, value):
+    """Delete ``key`` only while it holds ``value``, so an expired lease taken over by someone else survives.
+
+    Atomic on SQLiteCache; other backends fall back to a get and a delete.
+    """
+    compare_and_delete = getattr(cache, 'delete_if', None)
+    if compare_and_delete is not None:
+        return compare_and_delete(key, value)
+    return cache.get(key) == value and cache.delete(key)
+
+
+class SQLiteCache(BaseCache):
+    """Cache backend shared by every worker process through one SQLite file.
+
+    Integers are stored as native SQLite integers so ``incr`` is a single
+    atomic UPDATE; everything else is pickled. Expired rows are ignored on
+    read and purged periodically, which also enforces MAX_ENTRIES.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = str(location)
+        self._busy_timeout = options.get('BUSY_TIMEOUT', 5.0)
+        self._purge_interval = options.get('PURGE_INTERVAL', 60)
+        self._conn = None
+        self._pid = None
+        self._last_purge = 0.0
+
+    def _connection(self):
+        """Return this process's connection, reopening it after a fork"""
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=self._busy_timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries '
+                '(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_entries_expires ON cache_entries (expires)')
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _encode(self, value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        return pickle.dumps(value, self.pickle_protocol)
+
+    def _decode(self, value):
+        if isinstance(value, (int, float)):
+            return value
+        return pickle.loads(value)
+
+    def _maybe_purge(self, conn, now):
+        """Delete expired rows and cull down to MAX_ENTRIES every PURGE_INTERVAL seconds"""
+        if now - self._last_purge < self._purge_interval:
+            return
+        self._last_purge = now
+        conn.execute('DELETE FROM cache_entries WHERE expires IS NOT NULL AND expires <= ?', (now,))
+        count = conn.execute('SELECT COUNT(*) FROM cache_entries').fetchone()[0]
+        if count > self._max_entries:
+            excess = count - self._max_entries + count // self._cull_frequency
+            conn.execute(
+                'DELETE FROM cache_entries WHERE key IN ('
+                'SELECT key FROM cache_entries ORDER BY expires IS NULL, expires LIMIT ?)',
+                (excess,),
+            )
+
+    @traced('cache.add')
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        conn = self._connection()
+        cursor = conn.execute(
+            'INSERT INTO cache_entries (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache_entries.expires IS NOT NULL AND cache_entries.expires <= ?',
+            (key, self._encode(value), self.get_backend_timeout(timeout), now),
+        )
+        self._maybe_purge(conn, now)
+        return cursor.rowcount == 1
+
+    @traced('cache.get')
+    def get(self, key, default=None, version=None):
+        use = key_use(key)
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT value FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        if row is None:
+            metrics.CACHE_REQUESTS.inc(use, 'miss')
+            return default
+        metrics.CACHE_REQUESTS.inc(use, 'hit')
+        return self._decode(row[0])
+
+    @traced('cache.set')
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)',
+            (key, self._encode(value), self.get_backend_timeout(timeout)),
+        )
+        self._maybe_purge(conn, time.time())
+
+    @traced('cache.touch')
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'UPDATE cache_entries SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    @traced('cache.delete')
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+        return cursor.rowcount == 1
+
+    @traced('cache.delete_if')
+    def delete_if(self, key, value, version=None):
+        """Delete ``key`` only while it still holds ``value``; True if it was deleted"""
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._connection().execute(
+            'DELETE FROM cache_entries WHERE key = ? AND value = ?', (key, self._encode(value)),
+        )
+        return cursor.rowcount == 1
+
+    @traced('cache.has_key')
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'SELECT 1 FROM cache_entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, time.time()),
+        ).fetchone()
+        return row is not None
+
+    @traced('cache.incr')
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute(
+            'UPDATE cache_entries SET value = value + ? '
+            'WHERE key = ? AND typeof(value) = \'integer\' AND (expires IS NULL OR expires > ?) '
+            'RETURNING value',
+            (delta, key, time.time()),
+        ).fetchone()
+        if row is None:
+            raise ValueError("Key '%s' not found" % key)
+        return row[0]
+
+    @traced('cache.rate_limit')
+    def rate_limit(self, key, now, increment, limit, version=None):
+        """Atomically apply one GCRA (token bucket) step to ``key``.
+
+        The row stores the bucket's theoretical arrival time. A request is
+        admitted when pushing it forward by ``increment`` keeps it within
+        ``limit`` seconds of ``now``. Returns ``(allowed, tat)``.
+        """
+        key = self.make_and_validate_key(key, version=version)
+        conn = self._connection()
+        row = conn.execute(
+            'INSERT INTO cache_entries (key, value, expires) VALUES (?1, ?2 + ?3, ?2 + ?3) '
+            'ON CONFLICT(key) DO UPDATE SET value = MAX(value, ?2) + ?3, expires = MAX(value, ?2) + ?3 '
+            'WHERE MAX(value, ?2) + ?3 - ?2 <= ?4 '
+            'RETURNING value',
+            (key, now, increment, limit),
+        ).fetchone()
+        if row is not None:
+            return True, row[0]
+        row = conn.execute('SELECT value FROM cache_entries WHERE key = ?', (key,)).fetchone()
+        return False, row[0] if row else now
+
+    @traced('cache.get_many')
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        placeholders = ', '.join('?' * len(key_map))
+        rows = self._connection().execute(
+            'SELECT key, value FROM cache_entries '
+            'WHERE key IN (%s) AND (expires IS NULL OR expires > ?)' % placeholders,
+            (*key_map, time.time()),
+        ).fetchall()
+        found = {key for key, _ in rows}
+        lookups = Counter((key_use(original), 'hit' if key in found else 'miss') for key, original in key_map.items())
+        for labels, count in lookups.items():
+            metrics.CACHE_REQUESTS.inc(*labels, amount=count)
+        return {key_map[key]: self._decode(value) for key, value in rows}
+
+    @traced('cache.set_many')
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), self._encode(value), expires)
+            for key, value in data.items()
+        ]
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT OR REPLACE INTO cache_entries (key, value, expires) VALUES (?, ?, ?)', rows)
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        self._maybe_purge(conn, time.time())
+        return []
+
+    @traced('cache.delete_many')
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        if keys:
+            self._connection().execute(
+                'DELETE FROM cache_entries WHERE key IN (%s)' % ', '.join('?' * len(keys)), keys
+            )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entries')
+
+    def close(self, **kwargs):
+        # The connection is kept open for the life of the worker; SQLite
+        # connections are cheap to hold and expensive to reopen.
+        pass
@@ -0,0 +1,79 @@
+"""
+MySQL backend (PyMySQL) that keeps physical connections in a per-process pool.
+
+Configure it with ``'ENGINE': 'apps.core.db.backends.mysql_pooled'`` and an
+optional ``POOL`` dict in the database settings::
+
+    'POOL': {
+        'ENABLED': True,
+        'MAX_SIZE': 10,        # connections per process
+        'MAX_LIFETIME': 1800,  # seconds before a connection is recycled
+        'TIMEOUT': 10,         # seconds to wait for a free connection
+    }
+
+Leave ``CONN_MAX_AGE`` at 0: Django "closes" the connection at the end of
+each request, which here returns it to the pool instead of disconnecting.
+Reused connections skip the TCP handshake, authentication and the
+``init_command``/session setup queries.
+"""
+
+from django.db.backends.mysql import base as mysql_base
+from django.db.backends.mysql.base import Database
+
+from apps.core.db.pool import ConnectionPool, get_pool
+
+POOL_DEFAULTS = {
+    'ENABLED': True,
+    'MAX_SIZE': 10,
+    'MAX_LIFETIME': 1800,
+    'TIMEOUT': 10,
+}
+
+
+def _is_alive(connection):
+    try:
+        connection.ping(reconnect=False)
+    except Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(mysql_base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = None
+        self._reused_connection = False
+
+    def pool_options(self):
+        return {**POOL_DEFAULTS, **self.settings_dict.get('POOL', {})}
+
+    def get_new_connection(self, conn_params):
+        options = self.pool_options()
+        if not options['ENABLED']:
+            self._pool, self._reused_connection = None, False
+            return super().get_new_connection(conn_params)
+
+        connect = super().get_new_connection
+        self._pool = get_pool(self.alias, lambda: ConnectionPool(
+            lambda: connect(conn_params),
+            _is_alive,
+            max_size=options['MAX_SIZE'],
+            max_lifetime=options['MAX_LIFETIME'],
+            timeout=options['TIMEOUT'],
+        ))
+        connection, self._reused_connection = self._pool.checkout()
+        return connection
+
+    def init_connection_state(self):
+        # Session variables survive on a pooled connection, so only new
+        # physical connections need them set.
+        if not self._reused_connection:
+            super().init_connection_state()
+
+    def _close(self):
+        if self._pool is None:
+            return super()._close()
+        if self.connection is not None:
+            discard = self.errors_occurred or self.in_atomic_block or not self.get_autocommit()
+            self._pool.checkin(self.connection, discard=discard)
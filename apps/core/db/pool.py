@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection became free within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Bounded per-process pool of DB-API connections.
+
+    Checkout takes the most recently used idle connection (so surplus ones
+    age out), drops it if it has outlived ``max_lifetime`` or fails the
+    ``is_alive`` check, and opens a new one when none are idle. At most
+    ``max_size`` connections exist at once; further checkouts wait up to
+    ``timeout`` seconds.
+    """
+
+    def __init__(self, connect, is_alive, max_size=10, max_lifetime=1800, timeout=10):
+        self._connect = connect
+        self._is_alive = is_alive
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = deque()
+        self._created_at = {}
+        self.stats = {
+            'checkouts': 0,
+            'created': 0,
+            'reused': 0,
+            'recycled': 0,
+            'failed_checks': 0,
+            'discarded': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0,
+            'in_use': 0,
+            'max_in_use': 0,
+        }
+
+    def checkout(self):
+        """Return ``(connection, reused)``"""
+        started = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats['waits'] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                raise PoolTimeout(f'No database connection free after {self.timeout}s')
+            with self._lock:
+                self.stats['wait_seconds'] += time.monotonic() - started
+
+        try:
+            connection, reused = self._take_idle(), True
+            if connection is None:
+                connection, reused = self._connect(), False
+                with self._lock:
+                    self._created_at[id(connection)] = time.monotonic()
+                    self.stats['created'] += 1
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.stats['checkouts'] += 1
+            self.stats['reused'] += reused
+            self.stats['in_use'] += 1
+            self.stats['max_in_use'] = max(self.stats['max_in_use'], self.stats['in_use'])
+        return connection, reused
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection = self._idle.pop()
+            if self._expired(connection):
+                self._discard(connection, 'recycled')
+            elif not self._is_alive(connection):
+                self._discard(connection, 'failed_checks')
+            else:
+                return connection
+
+    def _expired(self, connection):
+        created_at = self._created_at.get(id(connection), 0)
+        return time.monotonic() - created_at > self.max_lifetime
+
+    def _discard(self, connection, reason=None):
+        with self._lock:
+            self._created_at.pop(id(connection), None)
+            if reason:
+                self.stats[reason] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def checkin(self, connection, discard=False):
+        """Return a connection to the pool, closing it if broken or too old"""
+        try:
+            if discard or self._expired(connection):
+                self._discard(connection, 'discarded' if discard else 'recycled')
+            else:
+                with self._lock:
+                    self._idle.append(connection)
+        finally:
+            with self._lock:
+                self.stats['in_use'] -= 1
+            self._slots.release()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, idle=len(self._idle), max_size=self.max_size)
+
+
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, factory):
+    """Return this process's pool for ``alias``, creating it with ``factory``"""
+    global _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            # Connections must never be shared with a forked parent.
+            _pools.clear()
+            _pools_pid = os.getpid()
+        if alias not in _pools:
+            _pools[alias] = factory()
+        return _pools[alias]
+
+
+def pool_stats():
+    """Snapshot of every pool in this process, keyed by database alias"""
+    with _pools_lock:
+        pools = dict(_pools) if _pools_pid == os.getpid() else {}
+    return {alias: pool.snapshot() for alias, pool in pools.items()}
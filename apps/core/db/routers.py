@@ -0,0 +1,54 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+REPLICA_ALIAS = 'replica'
+PIN_CACHE_KEY = 'db:pin:{}'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_enabled():
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def use_replica(enabled=True):
+    """Route reads in the current context to the replica; returns a reset token"""
+    return _use_replica.set(enabled)
+
+
+def reset_replica(token):
+    _use_replica.reset(token)
+
+
+def pin_to_primary(user_id):
+    """Keep ``user_id``'s reads on the primary so they see their own writes"""
+    if user_id and replica_enabled():
+        cache.set(PIN_CACHE_KEY.format(user_id), 1, settings.DATABASE_REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(PIN_CACHE_KEY.format(user_id)) is not None
+
+
+class ReplicaRouter:
+    """Send reads to the replica only inside views marked read-only.
+
+    Everything else, including all writes, ``select_for_update`` in the
+    credit transactions and session lookups, stays on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and model._meta.app_label != 'sessions':
+            return REPLICA_ALIAS
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == 'default'
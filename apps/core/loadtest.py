@@ -0,0 +1,332 @@
+import hashlib
+import hmac
+import itertools
+import json
+import math
+import queue
+import random
+import secrets
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import requests
+from django.urls import reverse
+
+DEFAULT_MIX = {
+    'dashboard': 30,
+    'tutor': 25,
+    'explain': 15,
+    'quiz': 10,
+    'checkout': 8,
+    'login': 8,
+    'register': 4,
+}
+
+TOPICS = [
+    'photosynthesis', 'fractions', 'the water cycle', 'climate change', 'supply and demand',
+    'the French Revolution', 'plate tectonics', 'probability', 'cell division', 'renewable energy',
+]
+LEVELS = ['beginner', 'intermediate', 'advanced']
+CREDIT_PACKAGES = [50, 100, 500]
+
+STUB_QUIZ = json.dumps({'questions': [
+    {'question': 'Stub question?', 'options': ['A', 'B', 'C', 'D'], 'correct': 'A', 'explanation': 'Stub.'},
+]})
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Thread-safe latencies and status codes per endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, endpoint, elapsed, status):
+        with self.lock:
+            self.latencies[endpoint].append(elapsed)
+            self.statuses[endpoint][str(status)] += 1
+
+    def summary(self, elapsed):
+        """Throughput, latency percentiles (ms) and status counts, per endpoint and in total"""
+        with self.lock:
+            latencies = {endpoint: sorted(values) for endpoint, values in self.latencies.items()}
+            statuses = {endpoint: dict(counts) for endpoint, counts in self.statuses.items()}
+        endpoints = {
+            endpoint: _stats(values, statuses[endpoint], elapsed) for endpoint, values in sorted(latencies.items())
+        }
+        total_statuses = Counter()
+        for counts in statuses.values():
+            total_statuses.update(counts)
+        total = _stats(sorted(itertools.chain(*latencies.values())), dict(total_statuses), elapsed)
+        return {'total': total, 'endpoints': endpoints}
+
+
+def _stats(values, statuses, elapsed):
+    errors = sum(count for status, count in statuses.items() if status == 'error' or status.startswith('5'))
+    return {
+        'requests': len(values),
+        'throughput': round(len(values) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+        'max_ms': round(values[-1] * 1000, 2) if values else 0.0,
+        'errors': errors,
+        'statuses': dict(sorted(statuses.items())),
+    }
+
+
+class _InferenceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        with stub.lock:
+            stub.requests += 1
+            stub.in_flight += 1
+            stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+        try:
+            time.sleep(random.lognormvariate(math.log(stub.latency), 0.5) if stub.latency > 0 else 0)
+            if random.random() < stub.error_rate:
+                self._send(503, b'{"error": "Model is currently loading"}', {'Retry-After': '1'})
+                return
+            prompt = body.get('inputs', '')
+            text = STUB_QUIZ if prompt.startswith('Create a') else f'Stub answer ({len(prompt)} prompt chars).'
+            self._send(200, json.dumps([{'generated_text': text}]).encode())
+        finally:
+            with stub.lock:
+                stub.in_flight -= 1
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubInferenceServer:
+    """Local stand-in for the Hugging Face Inference API.
+
+    Answers every model with canned text after a log-normal delay around
+    ``latency`` seconds, and returns 503 with ``Retry-After`` for
+    ``error_rate`` of calls.
+    """
+
+    def __init__(self, latency=0.2, error_rate=0.0, port=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.requests = self.in_flight = self.max_in_flight = 0
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), _InferenceHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='stub-inference', daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_port}/models'
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class IntaSendStub:
+    """Plays the payment provider: delivers signed ``payment.completed`` webhooks.
+
+    Each checkout is confirmed after ``delay`` seconds; ``duplicate_rate`` of
+    webhooks are delivered a second time, as providers retry.
+    """
+
+    def __init__(self, base_url, secret, recorder, delay=0.5, duplicate_rate=0.0, workers=2):
+        self.url = base_url + reverse('payments:webhook')
+        self.secret = secret.encode('utf-8')
+        self.recorder = recorder
+        self.delay = delay
+        self.duplicate_rate = duplicate_rate
+        self.pending = queue.Queue()
+        self.workers = [
+            threading.Thread(target=self._run, name=f'stub-intasend-{n}', daemon=True) for n in range(workers)
+        ]
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        """Deliver everything still pending, then stop the workers"""
+        for _ in self.workers:
+            self.pending.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def payment_created(self, payment_id):
+        # The delay is fixed, so the FIFO queue is also in due order
+        self.pending.put((time.monotonic() + self.delay, payment_id))
+
+    def _run(self):
+        session = requests.Session()
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            due, payment_id = item
+            time.sleep(max(0.0, due - time.monotonic()))
+            self._deliver(session, payment_id)
+            if random.random() < self.duplicate_rate:
+                self._deliver(session, payment_id)
+
+    def _deliver(self, session, payment_id):
+        payload = json.dumps({
+            'event': 'payment.completed',
+            'data': {'id': f'stub_{secrets.token_hex(8)}', 'api_ref': str(payment_id), 'state': 'COMPLETE'},
+        }).encode('utf-8')
+        signature = 'sha256=' + hmac.new(self.secret, payload, hashlib.sha256).hexdigest()
+        started = time.perf_counter()
+        try:
+            status = session.post(
+                self.url, data=payload, timeout=30,
+                headers={'Content-Type': 'application/json', 'X-Intasend-Signature': signature},
+            ).status_code
+        except requests.RequestException:
+            status = 'error'
+        self.recorder.record('webhook', time.perf_counter() - started, status)
+
+
+class VirtualUser(threading.Thread):
+    """One simulated student: registers, then performs weighted actions until ``deadline``"""
+
+    def __init__(self, harness, index):
+        super().__init__(name=f'vu-{index}', daemon=True)
+        self.harness = harness
+        self.index = index
+        self.random = random.Random(f'{harness.seed}-{index}')
+        self.accounts = itertools.count()
+        self.password = f'Lt-{secrets.token_urlsafe(12)}'
+        self.email = None
+        self.session = None
+
+    def run(self):
+        harness = self.harness
+        actions, weights = zip(*harness.mix.items())
+        self.register()
+        while time.monotonic() < harness.deadline:
+            getattr(self, self.random.choices(actions, weights)[0])()
+            if harness.think_time:
+                time.sleep(self.random.expovariate(1 / harness.think_time))
+
+    def new_session(self):
+        # A client-chosen CSRF secret is valid double-submit; the app has no form to fetch one from
+        session = requests.Session()
+        session.cookies.set('csrftoken', secrets.token_hex(16), domain=self.harness.host, path='/')
+        return session
+
+    def request(self, endpoint, method, url_name, **kwargs):
+        # Login rotates the CSRF cookie, so the header follows the jar
+        headers = {'X-CSRFToken': self.session.cookies.get('csrftoken', domain=self.harness.host)}
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, self.harness.base_url + reverse(url_name), allow_redirects=False,
+                headers=headers, timeout=self.harness.timeout, **kwargs
+            )
+        except requests.RequestException:
+            response = None
+        self.harness.recorder.record(
+            endpoint, time.perf_counter() - started, response.status_code if response is not None else 'error'
+        )
+        return response
+
+    def register(self):
+        self.session = self.new_session()
+        self.email = f'{self.harness.email_prefix}{self.index}-{next(self.accounts)}@example.com'
+        self.request('register', 'POST', 'register', data={
+            'username': self.email.split('@')[0],
+            'email': self.email,
+            'password1': self.password,
+            'password2': self.password,
+        })
+
+    def login(self):
+        self.session = self.new_session()
+        self.request('login', 'POST', 'login', data={'username': self.email, 'password': self.password})
+
+    def dashboard(self):
+        self.request('dashboard', 'GET', 'dashboard')
+
+    def tutor(self):
+        self.ai('tutor', 'ai_tutor:tutor', {'question': f'Can you help me understand {self.random.choice(TOPICS)}?'})
+
+    def explain(self):
+        self.ai('explain', 'ai_tutor:explain', {
+            'topic': self.random.choice(TOPICS), 'level': self.random.choice(LEVELS),
+        })
+
+    def quiz(self):
+        self.ai('quiz', 'ai_tutor:generate_quiz', {'topic': self.random.choice(TOPICS), 'num_questions': 5})
+
+    def ai(self, endpoint, url_name, payload):
+        response = self.request(endpoint, 'POST', url_name, json=payload)
+        if response is not None and response.status_code == 402:
+            self.checkout()
+
+    def checkout(self):
+        response = self.request(
+            'checkout', 'POST', 'payments:create_checkout', json={'credits': self.random.choice(CREDIT_PACKAGES)}
+        )
+        if response is not None and response.status_code == 200:
+            self.harness.intasend.payment_created(response.json()['payment_id'])
+
+
+class LoadTest:
+    """Drive ``users`` virtual users against ``base_url`` for ``duration`` seconds"""
+
+    def __init__(self, base_url, webhook_secret, users=10, duration=30.0, mix=None, think_time=0.0,
+                 timeout=60.0, webhook_delay=0.5, webhook_duplicate_rate=0.0, seed=0):
+        self.base_url = base_url.rstrip('/')
+        self.host = urlsplit(self.base_url).hostname
+        self.users = users
+        self.duration = duration
+        self.mix = mix or DEFAULT_MIX
+        self.think_time = think_time
+        self.timeout = timeout
+        self.seed = seed
+        self.email_prefix = f'loadtest-{secrets.token_hex(4)}-'
+        self.recorder = Recorder()
+        self.intasend = IntaSendStub(
+            self.base_url, webhook_secret, self.recorder, webhook_delay, webhook_duplicate_rate
+        )
+        self.deadline = None
+
+    def run(self):
+        self.intasend.start()
+        started = time.monotonic()
+        self.deadline = started + self.duration
+        virtual_users = [VirtualUser(self, index) for index in range(self.users)]
+        for virtual_user in virtual_users:
+            virtual_user.start()
+        for virtual_user in virtual_users:
+            virtual_user.join()
+        self.intasend.stop()
+        return self.recorder.summary(time.monotonic() - started)
@@ -0,0 +1,143 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import zlib
+from datetime import datetime, timezone
+
+# request_id, user_id, endpoint and trace_id (when traced) of the request being handled on this thread
+request_context = contextvars.ContextVar('request_context', default={})
+
+RESERVED_ATTRS = frozenset(vars(logging.makeLogRecord({}))) | {
+    'message', 'asctime', 'request_id', 'user_id', 'endpoint', 'trace_id',
+}
+
+
+def clear_request_context(**kwargs):
+    """Drop the finished request's context so it cannot leak into later records"""
+    request_context.set({})
+
+
+class RequestContextFilter(logging.Filter):
+    """Copy the current request's id, user, endpoint and trace id onto each record"""
+
+    def filter(self, record):
+        context = request_context.get()
+        record.request_id = context.get('request_id')
+        record.user_id = context.get('user_id')
+        record.endpoint = context.get('endpoint')
+        record.trace_id = context.get('trace_id')
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep ``rate`` of records at INFO and below; warnings and errors always pass.
+
+    Inside a request the decision is made once per request id, so a sampled
+    request keeps all of its log lines.
+    """
+
+    def __init__(self, rate=1.0, name=''):
+        super().__init__(name)
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or self.rate >= 1:
+            return True
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            return zlib.crc32(request_id.encode()) / 0xFFFFFFFF < self.rate
+        return random.random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, including any ``extra={...}`` fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'user_id': getattr(record, 'user_id', None),
+            'endpoint': getattr(record, 'endpoint', None),
+            'trace_id': getattr(record, 'trace_id', None),
+            'process': record.process,
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in RESERVED_ATTRS and not key.startswith('_')
+        )
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class QueuedRotatingFileHandler(logging.handlers.QueueHandler):
+    """Size-rotated file logging that never touches the disk on the caller's thread.
+
+    Records are put on a bounded in-memory queue and a ``QueueListener``
+    thread formats and writes them through a ``RotatingFileHandler``. When
+    the queue is full, records are dropped and counted rather than blocking
+    the request. The listener is restarted in forked worker processes.
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding='utf-8', queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.handlers.RotatingFileHandler(
+            filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=True
+        )
+        self.dropped = 0
+        self.listener = None
+        self._start()
+        atexit.register(self._stop)
+        os.register_at_fork(after_in_child=self._restart)
+
+    def _start(self):
+        self.listener = logging.handlers.QueueListener(self.queue, self.target, respect_handler_level=False)
+        self.listener.start()
+
+    def _stop(self):
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+
+    def _restart(self):
+        # The listener thread does not survive fork; anything queued belonged to the parent
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.dropped = 0
+        self._start()
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """Freeze the record so the listener can format it later on another thread"""
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self._stop()
+        self.target.close()
+        super().close()
@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.core.management.commands.createcachetable import Command as CreateCacheTableCommand
+from django.db import connections
+
+from apps.core.cache import SQLiteCache
+
+BENCHMARK_TABLE = 'cache_benchmark_entries'
+
+
+def _incr_worker(path, iterations):
+    """Increment a shared counter from a separate process"""
+    cache = SQLiteCache(path, {})
+    for _ in range(iterations):
+        cache.incr('benchmark:counter')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the shared SQLite cache against LocMemCache and DatabaseCache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5000)
+        parser.add_argument('--processes', type=int, default=4,
+                            help='Worker processes for the cross-process incr check')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            sqlite_path = os.path.join(tmpdir, 'cache.sqlite3')
+            create_table = CreateCacheTableCommand()
+            create_table.verbosity = 0
+            create_table.create_table('default', BENCHMARK_TABLE, dry_run=False)
+            backends = [
+                ('locmem', LocMemCache('benchmark', {})),
+                ('database', DatabaseCache(BENCHMARK_TABLE, {})),
+                ('sqlite', SQLiteCache(sqlite_path, {})),
+            ]
+            try:
+                self.stdout.write(f"{'backend':<10} {'set/s':>10} {'get/s':>10} {'incr/s':>10}")
+                for name, cache in backends:
+                    cache.clear()
+                    results = self.run_backend(cache, iterations)
+                    self.stdout.write(
+                        f"{name:<10} {results['set']:>10.0f} {results['get']:>10.0f} {results['incr']:>10.0f}"
+                    )
+                self.check_cross_process(sqlite_path, options['processes'], iterations // 10 or 1)
+            finally:
+                with connections['default'].cursor() as cursor:
+                    cursor.execute('DROP TABLE %s' % connections['default'].ops.quote_name(BENCHMARK_TABLE))
+
+    def run_backend(self, cache, iterations):
+        """Return operations per second for set, get and incr"""
+        results = {}
+
+        start = time.perf_counter()
+        for i in range(iterations):
+            cache.set(f'benchmark:{i % 100}', {'value': i}, 60)
+        results['set'] = iterations / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for i in range(iterations):
+            cache.get(f'benchmark:{i % 100}')
+        results['get'] = iterations / (time.perf_counter() - start)
+
+        cache.set('benchmark:counter', 0, 60)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            cache.incr('benchmark:counter')
+        results['incr'] = iterations / (time.perf_counter() - start)
+
+        return results
+
+    def check_cross_process(self, path, processes, iterations):
+        """Verify increments from several processes are never lost"""
+        cache = SQLiteCache(path, {})
+        cache.set('benchmark:counter', 0, None)
+
+        start = time.perf_counter()
+        workers = [
+            multiprocessing.Process(target=_incr_worker, args=(path, iterations))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+
+        expected = processes * iterations
+        total = cache.get('benchmark:counter')
+        status = self.style.SUCCESS('OK') if total == expected else self.style.ERROR('LOST UPDATES')
+        self.stdout.write(
+            f"\nCross-process incr: {total}/{expected} from {processes} processes "
+            f"in {elapsed:.2f}s ({expected / elapsed:.0f}/s) {status}"
+        )
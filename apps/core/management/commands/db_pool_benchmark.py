@@ -0,0 +1,61 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+from apps.accounts.models import User
+from apps.core.db.pool import pool_stats
+
+
+class Command(BaseCommand):
+    help = 'Measure simulated requests per second with and without the MySQL connection pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per run')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent request threads')
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        settings_dict = connections[alias].settings_dict
+        if settings_dict['ENGINE'] != 'apps.core.db.backends.mysql_pooled':
+            raise CommandError(f"Database '{alias}' does not use the pooled MySQL backend")
+
+        original = settings_dict.get('POOL', {}).copy()
+        try:
+            for enabled in (False, True):
+                settings_dict['POOL'] = {**original, 'ENABLED': enabled}
+                connections[alias].close()
+                rate = self.run(alias, options['requests'], options['threads'])
+                label = 'pooled' if enabled else 'unpooled'
+                self.stdout.write(f'{label:<10} {rate:>10.0f} req/s')
+        finally:
+            settings_dict['POOL'] = original
+
+        for pool_alias, stats in pool_stats().items():
+            self.stdout.write(f'\nPool {pool_alias!r}:')
+            for name, value in stats.items():
+                self.stdout.write(f'  {name:<15} {value}')
+
+    def run(self, alias, total, threads):
+        """Run ``total`` request cycles across ``threads`` and return requests per second"""
+        per_thread = total // threads
+
+        def worker():
+            for _ in range(per_thread):
+                # Mirrors the request cycle: Django closes the connection on
+                # request_finished because CONN_MAX_AGE is 0.
+                request_started.send(sender=self.__class__)
+                User.objects.using(alias).filter(pk=0).exists()
+                request_finished.send(sender=self.__class__)
+            connections.close_all()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return per_thread * threads / (time.perf_counter() - start)
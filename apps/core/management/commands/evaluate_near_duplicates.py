@@ -0,0 +1,116 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.accounts.models import QuestionBand
+from apps.ai_tutor.near_duplicates import MemoryIndex, band_keys, question_terms, similarity, tutor_questions
+from apps.ai_tutor.views import NO_ANSWER
+
+# Questions that share their words but not their answer; none may reach a threshold in use
+DIFFERENT_QUESTIONS = [
+    ('what is 10 divided by 2', 'what is 2 divided by 10'),
+    ('what is 2-5', 'what is 5-2'),
+    ('convert 5 km to miles', 'convert 5 miles to km'),
+    ('what is 2^10', 'what is 10^2'),
+    ('why do plants need sunlight', 'how do plants need sunlight'),
+    ('is 7 greater than 3', 'is 3 greater than 7'),
+]
+
+
+def _thresholds(value):
+    try:
+        thresholds = [float(part) for part in value.split(',')]
+    except ValueError:
+        raise CommandError(f'Bad threshold list {value!r}; use e.g. 0.6,0.8')
+    if not all(0 < threshold <= 1 for threshold in thresholds):
+        raise CommandError('Thresholds must be between 0 and 1')
+    return thresholds
+
+
+class Command(BaseCommand):
+    help = ('Replay past tutor questions through the near-duplicate index and report how many would have been '
+            'answered from an earlier response, per similarity threshold')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--thresholds', type=_thresholds, default=[0.6, 0.7, 0.8, 0.9],
+                            help='Comma-separated Jaccard thresholds to compare')
+        parser.add_argument('--limit', type=int, help='Replay only the most recent N questions')
+        parser.add_argument('--show', type=int, default=5,
+                            help='Print this many matched pairs per threshold, to judge whether reuse is safe')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Replace the stored index with one built from the whole history at '
+                                 'NEAR_DUPLICATE_THRESHOLD')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            self.rebuild()
+            return
+
+        questions = self.load(options['limit'])
+        self.stdout.write(f'{len(questions):,} tutor questions')
+        self.stdout.write(f"{'threshold':>10}{'reused':>12}{'hit rate':>10}{'index size':>12}{'seconds':>9}")
+        examples = {}
+        for threshold in options['thresholds']:
+            index, reused, pairs = MemoryIndex(threshold), 0, []
+            prompts = {}
+            started = time.perf_counter()
+            for pk, prompt in questions:
+                terms = question_terms(prompt)
+                keys = band_keys(terms)
+                match = index.find(terms, keys)
+                if match:
+                    reused += 1
+                    earlier = prompts[match[0]]
+                    # Paraphrases say more about the threshold than verbatim repeats
+                    if len(pairs) < options['show'] and earlier.strip().lower() != prompt.strip().lower():
+                        pairs.append((prompt, earlier, match[1]))
+                elif keys:
+                    index.add(pk, terms, keys)
+                    prompts[pk] = prompt
+            elapsed = time.perf_counter() - started
+            rate = reused / len(questions) * 100 if questions else 0
+            self.stdout.write(f'{threshold:>10.2f}{reused:>12,}{rate:>9.1f}%{len(index):>12,}{elapsed:>9.1f}')
+            examples[threshold] = pairs
+
+        for threshold, pairs in examples.items():
+            if pairs:
+                self.stdout.write(f'\nMatches at {threshold:.2f}:')
+            for question, earlier, score in pairs:
+                self.stdout.write(f'  {score:.2f}  {question[:60]!r}  ->  {earlier[:60]!r}')
+
+        lowest = min(options['thresholds'])
+        self.stdout.write('\nDifferent questions with the same words:')
+        for question, other in DIFFERENT_QUESTIONS:
+            score = similarity(question_terms(question), question_terms(other))
+            line = f'  {score:.2f}  {question!r}  vs  {other!r}'
+            self.stdout.write(self.style.ERROR(line + '  would be reused') if score >= lowest else line)
+
+    def load(self, limit):
+        questions = tutor_questions().order_by('-pk') if limit else tutor_questions().order_by('pk')
+        if limit:
+            return list(questions.values_list('pk', 'prompt')[:limit])[::-1]
+        return list(questions.values_list('pk', 'prompt').iterator(chunk_size=5000))
+
+    def rebuild(self):
+        """Keep the first of each group of near-duplicate questions, as live traffic would have"""
+        index, batch, stored = MemoryIndex(settings.NEAR_DUPLICATE_THRESHOLD), [], 0
+        started = time.perf_counter()
+        with transaction.atomic():
+            QuestionBand.objects.all().delete()
+            questions = tutor_questions().exclude(response=NO_ANSWER).order_by('pk').values_list('pk', 'prompt')
+            for pk, prompt in questions.iterator(chunk_size=5000):
+                terms = question_terms(prompt)
+                keys = band_keys(terms)
+                if not keys or index.find(terms, keys):
+                    continue
+                index.add(pk, terms, keys)
+                batch.extend(QuestionBand(interaction_id=pk, key=key) for key in keys)
+                if len(batch) >= 5000:
+                    stored += len(QuestionBand.objects.bulk_create(batch))
+                    batch = []
+            stored += len(QuestionBand.objects.bulk_create(batch))
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(index):,} distinct questions ({stored:,} bands) in {time.perf_counter() - started:.1f}s'
+        ))
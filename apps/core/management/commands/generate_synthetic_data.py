@@ -0,0 +1,292 @@
+import math
+import multiprocessing
+import random
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Max
+
+from apps.accounts.models import AIInteraction, Payment, Subscription, User
+
+TOPICS = [
+    'photosynthesis', 'fractions', 'the water cycle', 'climate change', 'algebra', 'the solar system',
+    'supply and demand', 'the French Revolution', 'plate tectonics', 'probability', 'cell division',
+    'renewable energy', 'grammar', 'world war II', 'electric circuits', 'the human heart', 'poetry',
+    'statistics', 'chemical bonding', 'ecosystems', 'geometry', 'coding basics', 'human rights',
+    'the industrial revolution', 'newton\'s laws', 'genetics', 'percentages', 'map reading',
+]
+QUESTION_STARTS = [
+    'Can you explain', 'How does', 'Why is', 'What is the difference in', 'Give me an example of',
+    'Help me understand', 'What are the main ideas of',
+]
+WORDS = (
+    'learning students understand example important concept because therefore energy process system '
+    'change growth community knowledge practice question answer idea simple model result evidence '
+    'teacher lesson explain different common mistake remember step first next finally together world'
+).split()
+MODELS = [('meta-llama/Llama-3.1-8B-Instruct', 80), ('mistralai/Mistral-7B-Instruct-v0.3', 15),
+          ('google/gemma-2-9b-it', 5)]
+KINDS = [('tutor', 1, 60), ('explain', 2, 25), ('quiz', 3, 15)]  # name, credits, weight
+LEVELS = ['beginner', 'intermediate', 'advanced']
+DIFFICULTIES = ['easy', 'medium', 'hard']
+PACKAGES = [(50, Decimal('5.00'), 60), (100, Decimal('9.00'), 30), (500, Decimal('40.00'), 10)]
+PAYMENT_STATUSES = [('completed', 85), ('pending', 8), ('failed', 5), ('refunded', 2)]
+PLANS = [('basic', 200, Decimal('15.00'), 70), ('premium', 600, Decimal('39.00'), 25),
+         ('institutional', 5000, Decimal('249.00'), 5)]
+SUBSCRIPTION_STATUSES = [('active', 80), ('cancelled', 12), ('expired', 8)]
+
+# Per-process state set by _init_worker, so the password hash and Zipf table
+# are built once and shared by every batch the process runs.
+_config = {}
+_cache = {}
+
+
+def _init_worker(config):
+    connections.close_all()
+    _config.clear()
+    _config.update(config)
+    _cache.clear()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            # Ids are generated consistently, so skip per-row checks during the load
+            cursor.execute('SET SESSION unique_checks = 0, foreign_key_checks = 0')
+        elif connection.vendor == 'sqlite':
+            cursor.execute('PRAGMA synchronous = OFF')
+
+
+def _zipf_cum_weights():
+    """Cumulative weights of rank ** -exponent over all generated users"""
+    if 'zipf' not in _cache:
+        exponent, total, weights = _config['zipf'], 0.0, []
+        for rank in range(1, _config['users'] + 1):
+            total += rank ** -exponent
+            weights.append(total)
+        _cache['zipf'] = weights
+    return _cache['zipf']
+
+
+def _corpus():
+    """A few hundred KB of filler text that responses are sliced from"""
+    if 'corpus' not in _cache:
+        rng = random.Random(_config['seed'])
+        _cache['corpus'] = ' '.join(rng.choice(WORDS) for _ in range(60000))
+    return _cache['corpus']
+
+
+def _joined_fraction(user_id):
+    """How far back in the window a user joined, as a cheap deterministic hash of the id"""
+    return ((user_id * 2654435761) % 2 ** 32) / 2 ** 32
+
+
+def _active_users(rng, count):
+    """Ids of ``count`` users drawn with Zipf-skewed activity.
+
+    Ranks are scattered over the id range by a fixed stride, so the heaviest
+    users are not simply the oldest accounts.
+    """
+    users, start, stride = _config['users'], _config['user_start'], _config['stride']
+    ranks = rng.choices(range(users), cum_weights=_zipf_cum_weights(), k=count)
+    return [start + (rank * stride) % users for rank in ranks]
+
+
+def _timestamp(user_id, rng):
+    """A time after ``user_id`` joined, skewed towards the recent end of the window"""
+    age = _joined_fraction(user_id) * rng.betavariate(1, 2)
+    return _config['end'] - timedelta(seconds=age * _config['window'])
+
+
+def _weighted(rng, choices):
+    return rng.choices(choices, weights=[choice[-1] for choice in choices])[0]
+
+
+def _users_batch(rng, first, count):
+    config = _config
+    users, subscriptions = [], []
+    for offset in range(first, first + count):
+        user_id = config['user_start'] + offset
+        joined = config['end'] - timedelta(seconds=_joined_fraction(user_id) * config['window'])
+        users.append(User(
+            id=user_id,
+            username=f'synthetic{user_id}',
+            email=f"synthetic{user_id}@{config['domain']}",
+            password=config['password'],
+            credits=rng.choice((0, 1, 3, 5, 10, 10, 10, 25, 60, 150)),
+            created_at=joined,
+            date_joined=joined,
+        ))
+        if rng.random() < config['subscription_rate']:
+            plan, monthly_credits, price, _ = _weighted(rng, PLANS)
+            started = joined + timedelta(days=rng.uniform(0, 60))
+            subscriptions.append(Subscription(
+                user_id=user_id,
+                plan_type=plan,
+                status=_weighted(rng, SUBSCRIPTION_STATUSES)[0],
+                monthly_credits=monthly_credits,
+                price=price,
+                created_at=started,
+                expires_at=started + timedelta(days=30 * rng.randint(1, 12)),
+            ))
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=config['batch_size'])
+        Subscription.objects.bulk_create(subscriptions, batch_size=config['batch_size'])
+    return len(users) + len(subscriptions)
+
+
+def _interactions_batch(rng, first, count):
+    config, corpus = _config, _corpus()
+    median = config['response_chars']
+    interactions = []
+    for user_id in _active_users(rng, count):
+        kind, credits, _ = _weighted(rng, KINDS)
+        topic = TOPICS[min(int(rng.paretovariate(1.2)) - 1, len(TOPICS) - 1)]
+        if kind == 'tutor':
+            prompt = f'{rng.choice(QUESTION_STARTS)} {topic}?'
+        elif kind == 'explain':
+            prompt = f'Explain: {topic} ({rng.choice(LEVELS)} level)'
+        else:
+            prompt = f'Quiz: {topic} ({rng.choice(DIFFICULTIES)})'
+        length = min(int(rng.lognormvariate(math.log(median), 0.6)), 20000)
+        start = rng.randrange(len(corpus) - length)
+        interactions.append(AIInteraction(
+            user_id=user_id,
+            prompt=prompt,
+            response=corpus[start:start + length],
+            model_used=_weighted(rng, MODELS)[0],
+            credits_used=credits,
+            created_at=_timestamp(user_id, rng),
+        ))
+    AIInteraction.objects.bulk_create(interactions, batch_size=config['batch_size'])
+    return len(interactions)
+
+
+def _payments_batch(rng, first, count):
+    config = _config
+    payments = []
+    for offset, user_id in zip(range(first, first + count), _active_users(rng, count)):
+        payment_id = config['payment_start'] + offset
+        credits, amount, _ = _weighted(rng, PACKAGES)
+        status = _weighted(rng, PAYMENT_STATUSES)[0]
+        created = _timestamp(user_id, rng)
+        payments.append(Payment(
+            id=payment_id,
+            user_id=user_id,
+            intasend_payment_id=f'synthetic_{payment_id}',
+            amount=amount,
+            credits_purchased=credits,
+            status=status,
+            created_at=created,
+            completed_at=created + timedelta(seconds=rng.uniform(2, 120)) if status != 'pending' else None,
+        ))
+    Payment.objects.bulk_create(payments, batch_size=config['batch_size'])
+    return len(payments)
+
+
+BATCHES = {'users': _users_batch, 'interactions': _interactions_batch, 'payments': _payments_batch}
+
+
+def _run_batch(job):
+    """Generate and insert one batch; its RNG depends only on the seed, table and batch number"""
+    table, number, first, count = job
+    rng = random.Random(f"{_config['seed']}:{table}:{number}")
+    return BATCHES[table](rng, first, count)
+
+
+class Command(BaseCommand):
+    help = ('Bulk-generate synthetic users, subscriptions, payments and AI interactions with Zipf-skewed '
+            'activity for scale testing')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--interactions', type=int, help='Default: 20 per user')
+        parser.add_argument('--payments', type=int, help='Default: 1 per 4 users')
+        parser.add_argument('--subscription-rate', type=float, default=0.05,
+                            help='Fraction of users with a subscription')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Activity skew: user of rank r is picked with weight r ** -zipf')
+        parser.add_argument('--days', type=int, default=365, help='Window the activity is spread over')
+        parser.add_argument('--end', help='End of the window as YYYY-MM-DD (default: today); fix it for '
+                                          'identical timestamps across runs')
+        parser.add_argument('--response-chars', type=int, default=900, help='Median response length')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT and per job')
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                            help='Processes generating and inserting batches (1 on SQLite)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--password', default='synthetic-password',
+                            help='Password shared by every generated user; hashed once')
+        parser.add_argument('--domain', default='synthetic.example',
+                            help='Email domain of generated users')
+
+    def handle(self, *args, **options):
+        users = options['users']
+        if users < 1:
+            raise CommandError('--users must be at least 1; interactions and payments belong to the new users')
+        counts = {
+            'users': users,
+            'interactions': options['interactions'] if options['interactions'] is not None else users * 20,
+            'payments': options['payments'] if options['payments'] is not None else users // 4,
+        }
+        if options['end']:
+            end = datetime.strptime(options['end'], '%Y-%m-%d').replace(tzinfo=dt_timezone.utc)
+        else:
+            end = datetime.now(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        workers = options['workers']
+        if connection.vendor == 'sqlite' and workers > 1:
+            self.stdout.write('SQLite allows one writer at a time; using a single worker')
+            workers = 1
+
+        stride = 2654435761 % users or 1
+        while math.gcd(stride, users) != 1:
+            stride += 1
+        config = {
+            'seed': options['seed'],
+            'users': users,
+            'user_start': (User.objects.aggregate(Max('id'))['id__max'] or 0) + 1,
+            'payment_start': (Payment.objects.aggregate(Max('id'))['id__max'] or 0) + 1,
+            'stride': stride,
+            'zipf': options['zipf'],
+            'end': end,
+            'window': options['days'] * 86400,
+            'response_chars': options['response_chars'],
+            'subscription_rate': options['subscription_rate'],
+            'batch_size': options['batch_size'],
+            'domain': options['domain'],
+            'password': make_password(options['password']),
+        }
+
+        started = time.perf_counter()
+        if workers == 1:
+            _init_worker(config)
+            for table, count in counts.items():
+                self.run_phase(table, count, options['batch_size'], map)
+        else:
+            connections.close_all()  # never share a connection with forked workers
+            with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(config,)) as pool:
+                for table, count in counts.items():
+                    self.run_phase(table, count, options['batch_size'], pool.imap_unordered)
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {time.perf_counter() - started:.1f}s; users are {config['user_start']}.."
+            f"{config['user_start'] + users - 1} with password {options['password']!r}"
+        ))
+
+    def run_phase(self, table, count, batch_size, mapper):
+        """Insert ``count`` rows of ``table`` in batches; phases run in order so foreign keys exist"""
+        if not count:
+            return
+        jobs = [
+            (table, number, first, min(batch_size, count - first))
+            for number, first in enumerate(range(0, count, batch_size))
+        ]
+        started = time.perf_counter()
+        inserted = 0
+        for rows in mapper(_run_batch, jobs):
+            inserted += rows
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'\r{table:<13} {inserted:>12,} rows  {inserted / elapsed:>10,.0f} rows/s', ending='')
+            self.stdout.flush()
+        self.stdout.write('')
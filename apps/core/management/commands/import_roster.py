@@ -0,0 +1,66 @@
+import csv
+import sys
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.accounts.models import Subscription
+from apps.accounts.roster import REPORT_FIELDS, RosterImporter, read_roster
+
+
+class Command(BaseCommand):
+    help = ('Create students from a CSV roster (email, optional username and password) as members of an '
+            'institutional subscription')
+
+    def add_arguments(self, parser):
+        parser.add_argument('roster', help="CSV file, or '-' for stdin")
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument('--subscription', type=int, help='Subscription id')
+        target.add_argument('--institution', help="Email of the subscription's owner")
+        parser.add_argument('--report', help='Write every row with its outcome (and generated password) to this CSV')
+        parser.add_argument('--chunk-size', type=int)
+        parser.add_argument('--workers', type=int, help='Password hashing processes')
+
+    def handle(self, *args, **options):
+        lookup = ({'pk': options['subscription']} if options['subscription']
+                  else {'user__email': options['institution']})
+        try:
+            subscription = Subscription.objects.select_related('user').get(**lookup)
+            importer = RosterImporter(subscription, options['chunk_size'], options['workers'])
+        except Subscription.DoesNotExist:
+            raise CommandError('No such subscription')
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        source = sys.stdin if options['roster'] == '-' else open(options['roster'], newline='', encoding='utf-8-sig')
+        report = open(options['report'], 'w', newline='') if options['report'] else None
+        writer = csv.DictWriter(report, REPORT_FIELDS) if report else None
+        if writer:
+            writer.writeheader()
+        outcomes, generated = Counter(), 0
+        try:
+            for row in importer.run(read_roster(source)):
+                outcomes[row.status] += 1
+                generated += row.generated_password and row.status == 'created'
+                if writer:
+                    writer.writerow(row.report())
+                if row.status == 'error':
+                    self.stderr.write(f'line {row.line} ({row.email or "no email"}): {row.error}')
+                elif outcomes['created'] % 100 == 0:
+                    self.stdout.write(f"{outcomes['created']} created")
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if report:
+                report.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {outcomes['created']} members of {subscription.user.email}'s subscription; "
+            f"{outcomes['error']} rows failed"
+        ))
+        if generated and not report:
+            self.stdout.write(self.style.WARNING(
+                f'{generated} generated passwords were not saved (no --report); those students must reset theirs'
+            ))
@@ -0,0 +1,236 @@
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.accounts.models import User
+from apps.core.loadtest import DEFAULT_MIX, LoadTest, StubInferenceServer
+
+COLUMNS = ('requests', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms', 'errors')
+
+
+def _parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX or not weight.strip().isdigit():
+            raise CommandError(f"Bad mix entry {part!r}; use e.g. 'dashboard=50,tutor=50' with actions "
+                               f"{', '.join(DEFAULT_MIX)}")
+        mix[name] = int(weight)
+    if not any(mix.values()):
+        raise CommandError('The traffic mix needs at least one non-zero weight')
+    return mix
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+class Command(BaseCommand):
+    help = ('Drive a realistic traffic mix against a live local server with stubbed inference and IntaSend, '
+            'and report throughput and latency percentiles per endpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds of traffic')
+        parser.add_argument('--mix', type=_parse_mix, default=DEFAULT_MIX,
+                            help="Action weights, e.g. 'dashboard=30,tutor=25,explain=15,quiz=10,"
+                                 "checkout=8,login=8,register=4'")
+        parser.add_argument('--think-time', type=float, default=0.0,
+                            help='Mean seconds a user pauses between actions (0 = closed loop)')
+        parser.add_argument('--base-url',
+                            help='Use an already running server instead of starting runserver; it must have '
+                                 'HUGGINGFACE_API_URL pointing at the stub (see --stub-port) and the same '
+                                 'INTASEND_WEBHOOK_SECRET')
+        parser.add_argument('--stub-port', type=int, default=0, help='Port for the stub inference server')
+        parser.add_argument('--inference-latency', type=float, default=200.0,
+                            help='Median stub inference latency in ms')
+        parser.add_argument('--inference-error-rate', type=float, default=0.0,
+                            help='Fraction of inference calls answered with 503')
+        parser.add_argument('--webhook-delay', type=float, default=0.5,
+                            help='Seconds between a checkout and its payment webhook')
+        parser.add_argument('--webhook-duplicate-rate', type=float, default=0.05,
+                            help='Fraction of webhooks delivered twice')
+        parser.add_argument('--server-log', help='Append the started server\'s output to this file')
+        parser.add_argument('--allow-sqlite', action='store_true',
+                            help='Start the server on the SQLite database anyway, switched to WAL mode; '
+                                 'writers still queue on one lock, so results say little about MySQL')
+        parser.add_argument('--ratelimit', action='store_true',
+                            help='Keep rate limiting enabled on the started server')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='Results JSON from an earlier run to compare against')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the users this run created')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Cannot read {options['compare']}: {exc}")
+
+        if not options['base_url'] and connection.vendor == 'sqlite':
+            if not options['allow_sqlite']:
+                raise CommandError(
+                    'The server would run on SQLite, where concurrent writes fail with "database is locked" and '
+                    'results are not meaningful. Load test against MySQL (DB_ENGINE=mysql), or pass --allow-sqlite.'
+                )
+            self.use_wal()
+
+        stub = StubInferenceServer(
+            options['inference_latency'] / 1000, options['inference_error_rate'], options['stub_port']
+        )
+        stub.start()
+        server = None
+        webhook_secret = settings.INTASEND_WEBHOOK_SECRET
+        base_url = options['base_url']
+        try:
+            if not base_url:
+                webhook_secret = webhook_secret or secrets.token_hex(16)
+                base_url, server = self.start_server(stub, webhook_secret, options['ratelimit'], options['server_log'])
+            self.wait_until_ready(base_url)
+            self.stdout.write(
+                f"Running {options['users']} users for {options['duration']:.0f}s against {base_url} "
+                f"(stub inference at {stub.url})"
+            )
+            loadtest = LoadTest(
+                base_url, webhook_secret,
+                users=options['users'],
+                duration=options['duration'],
+                mix=options['mix'],
+                think_time=options['think_time'],
+                webhook_delay=options['webhook_delay'],
+                webhook_duplicate_rate=options['webhook_duplicate_rate'],
+                seed=options['seed'],
+            )
+            summary = loadtest.run()
+        finally:
+            stub.stop()
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=10)
+
+        results = {
+            'run': {
+                'commit': _git_commit(),
+                'finished_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'base_url': base_url,
+                'database': None if options['base_url'] else connection.vendor,
+                'users': options['users'],
+                'duration': options['duration'],
+                'mix': options['mix'],
+                'think_time': options['think_time'],
+                'inference_latency_ms': options['inference_latency'],
+                'inference_error_rate': options['inference_error_rate'],
+                'inference_calls': stub.requests,
+                'inference_max_concurrency': stub.max_in_flight,
+            },
+            **summary,
+        }
+        self.report(results, baseline)
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(f"\nResults written to {options['output']}")
+        if options['cleanup']:
+            deleted, _ = User.objects.filter(email__startswith=loadtest.email_prefix).delete()
+            self.stdout.write(f'Deleted {deleted} rows created by this run')
+
+    def use_wal(self):
+        """Let readers proceed while a write is in progress; the mode is stored in the database file"""
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            mode = cursor.fetchone()[0]
+        connection.close()  # the server must not wait on this process's connection
+        self.stdout.write(self.style.WARNING(
+            f'Load testing on SQLite (journal mode {mode}): writes are serialized and some still fail with '
+            '"database is locked", so throughput, latency and errors are far from what MySQL would give'
+        ))
+
+    def start_server(self, stub, webhook_secret, ratelimit, log_path=None):
+        """Start ``runserver`` on a free port, wired to the stubs"""
+        port = _free_port()
+        env = {
+            **os.environ,
+            'HUGGINGFACE_API_URL': stub.url,
+            'HUGGINGFACE_API_TOKEN': settings.HUGGINGFACE_API_TOKEN or 'loadtest',
+            'INTASEND_WEBHOOK_SECRET': webhook_secret,
+            'RATELIMIT_ENABLE': str(ratelimit),
+        }
+        output = open(log_path, 'a') if log_path else subprocess.DEVNULL
+        server = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'runserver', '--noreload', f'127.0.0.1:{port}'],
+            env=env, stdout=output, stderr=subprocess.STDOUT,
+        )
+        if log_path:
+            output.close()
+        return f'http://127.0.0.1:{port}', server
+
+    def wait_until_ready(self, base_url, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                response = requests.get(base_url + '/', allow_redirects=False, timeout=5)
+            except requests.RequestException:
+                time.sleep(0.2)
+                continue
+            if response.is_redirect and response.headers.get('Location', '').startswith('https:'):
+                raise CommandError('The server redirects to HTTPS (DEBUG is off); run the load test with DEBUG=True '
+                                   'or point --base-url at a server behind TLS')
+            return
+        raise CommandError(f'Server at {base_url} did not answer within {timeout}s')
+
+    def report(self, results, baseline):
+        run = results['run']
+        self.stdout.write(
+            f"\n{'endpoint':<12}" + ''.join(f'{column:>12}' for column in COLUMNS) + '    statuses'
+        )
+        rows = list(results['endpoints'].items()) + [('TOTAL', results['total'])]
+        for endpoint, stats in rows:
+            statuses = ' '.join(f'{status}:{count}' for status, count in stats['statuses'].items())
+            self.stdout.write(
+                f'{endpoint:<12}' + ''.join(f'{stats[column]:>12}' for column in COLUMNS) + f'    {statuses}'
+            )
+        self.stdout.write(
+            f"\nInference calls: {run['inference_calls']} (max {run['inference_max_concurrency']} concurrent)"
+        )
+        if baseline is None:
+            return
+
+        self.stdout.write(f"\nCompared with {baseline['run'].get('commit') or 'baseline'}:")
+        self.stdout.write(f"{'endpoint':<12}" + ''.join(f'{column:>32}' for column in ('throughput', 'p95_ms', 'p99_ms')))
+        before_rows = {**baseline.get('endpoints', {}), 'TOTAL': baseline.get('total', {})}
+        for endpoint, stats in rows:
+            before = before_rows.get(endpoint)
+            if not before:
+                continue
+            line = f'{endpoint:<12}'
+            for column in ('throughput', 'p95_ms', 'p99_ms'):
+                old, new = before[column], stats[column]
+                change = f'{(new - old) / old * 100:+.1f}%' if old else 'n/a'
+                line += f'{old:>14} -> {new:<10}{change:>8}'
+            self.stdout.write(line)
@@ -0,0 +1,155 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from apps.core.microbench import BENCHMARKS, WEBHOOK_SECRET, Fixture, compare, count_queries, measure
+
+DEFAULT_BASELINE = os.path.join(settings.BASE_DIR, 'benchmarks', 'microbench.json')
+
+
+class Command(BaseCommand):
+    help = ('Time hot helpers and views against a test database and fail if any is significantly slower, '
+            'or runs more queries, than the committed baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks to run (default: all); prefixes match')
+        parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+        parser.add_argument('--save', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--rounds', type=int, default=15, help='Timed rounds per benchmark')
+        parser.add_argument('--warmup', type=float, default=0.2, help='Seconds of untimed calls first')
+        parser.add_argument('--min-round-time', type=float, default=0.02,
+                            help='Calls per round are raised until a round takes this many seconds')
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed slowdown of the median, as a fraction')
+        parser.add_argument('--alpha', type=float, default=0.01,
+                            help='Significance level a slowdown must reach to count as a regression')
+        parser.add_argument('--query-threshold', type=int, default=0,
+                            help='Extra queries per call allowed over the baseline')
+        parser.add_argument('--reruns', type=int, default=1,
+                            help='Times a regression is re-measured in a fresh database; it fails the run only '
+                                 'if every rerun confirms it')
+
+    def handle(self, *args, **options):
+        names = [name for name in BENCHMARKS if not options['names']
+                 or any(name.startswith(prefix) for prefix in options['names'])]
+        if not names:
+            raise CommandError(f"No benchmark matches; available: {', '.join(BENCHMARKS)}")
+
+        baseline = {}
+        if os.path.exists(options['baseline']):
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)['benchmarks']
+
+        results = self.run(names, options)
+        regressions = self.regressions(results, baseline, options)
+        for _ in range(0 if options['save'] else options['reruns']):
+            if not regressions:
+                break
+            self.stdout.write(f'Re-running {len(regressions)} benchmark(s) that look slower: {", ".join(regressions)}')
+            rerun = self.run(list(regressions), options)
+            results.update(rerun)
+            regressions = self.regressions(rerun, baseline, options)
+
+        self.stdout.write(f"{'benchmark':<36}{'median':>12}{'spread':>9}{'baseline':>12}{'change':>9}{'queries':>9}")
+        for name in names:
+            current, before = results[name], baseline.get(name)
+            relative = statistics.median(current['rounds'])
+            spread = statistics.stdev(current['rounds']) / relative * 100
+            line = f"{name:<36}{_format(current['seconds']):>12}{spread:>8.1f}%"
+            if before:
+                change = (relative / statistics.median(before['rounds']) - 1) * 100
+                line += f"{_format(before['seconds']):>12}{change:>+8.1f}%{current['queries']:>5} ({before['queries']})"
+            else:
+                line += f"{'-':>12}{'new':>9}{current['queries']:>9}"
+            self.stdout.write(line)
+
+        if options['save']:
+            existing = {name: value for name, value in baseline.items() if name in BENCHMARKS}
+            os.makedirs(os.path.dirname(options['baseline']), exist_ok=True)
+            with open(options['baseline'], 'w') as handle:
+                json.dump({
+                    'meta': {
+                        'commit': _git_commit(),
+                        'python': platform.python_version(),
+                        'machine': platform.machine(),
+                        'database': settings.DATABASES['default']['ENGINE'],
+                    },
+                    'benchmarks': {**existing, **results},
+                }, handle, indent=2, sort_keys=True)
+                handle.write('\n')
+            self.stdout.write(f"\nBaseline written to {options['baseline']}")
+            return
+
+        if regressions:
+            for name, problems in regressions.items():
+                self.stderr.write(f"{name}: {'; '.join(problems)}")
+            raise CommandError(f'{len(regressions)} benchmark(s) regressed against {options["baseline"]}')
+        if baseline:
+            self.stdout.write(self.style.SUCCESS('\nNo regressions'))
+
+    def regressions(self, results, baseline, options):
+        """``{name: problems}`` for the benchmarks in ``results`` that regressed against ``baseline``"""
+        regressions = {}
+        for name, current in results.items():
+            if name in baseline:
+                problems = compare(
+                    current, baseline[name], options['threshold'], options['alpha'], options['query_threshold']
+                )
+                if problems:
+                    regressions[name] = problems
+        return regressions
+
+    def run(self, names, options):
+        """Time each benchmark in a throwaway test database with tracing, profiling and rate limits off"""
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir, override_settings(
+                CACHES={'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(tmpdir, 'cache.sqlite3')}},
+                METRICS_DIR=os.path.join(tmpdir, 'metrics'),
+                INTASEND_WEBHOOK_SECRET=WEBHOOK_SECRET,
+                RATELIMIT_ENABLE=False,
+                QUIZ_PREFETCH_ENABLE=True,
+                TRACE_SAMPLE_RATE=0,
+                PROFILE_SAMPLE_RATE=0,
+            ), Fixture() as fixture:
+                funcs, queries = {}, {}
+                for name in names:
+                    funcs[name] = BENCHMARKS[name](fixture)
+                    try:
+                        queries[name] = count_queries(funcs[name])
+                    except RuntimeError as exc:
+                        raise CommandError(f'{name}: {exc}')
+                measured = measure(funcs, options['rounds'], options['warmup'], options['min_round_time'])
+                results = {
+                    name: {'queries': queries[name], 'rounds': rounds, 'seconds': seconds}
+                    for name, (rounds, seconds) in measured.items()
+                }
+                return results
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+
+def _format(seconds):
+    if seconds >= 1e-3:
+        return f'{seconds * 1e3:.2f}ms'
+    return f'{seconds * 1e6:.2f}us'
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
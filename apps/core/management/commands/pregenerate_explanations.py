@@ -0,0 +1,129 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.accounts.models import CurriculumExplanation
+from apps.ai_tutor.curriculum import DEFAULT_CONTEXT, read_catalog
+from apps.ai_tutor.governor import UpstreamBusy
+from apps.ai_tutor.views import NO_ANSWER, PromptTemplates, query_huggingface
+
+DEFAULT_CATALOG = os.path.join(settings.BASE_DIR, 'curriculum', 'core_topics.csv')
+PRIORITY = 'batch'  # below every plan in AI_PRIORITY_WEIGHTS, so live requests go first
+
+
+def _generate(entry, retries):
+    prompt = PromptTemplates.EXPLAIN_CONCEPT.format(topic=entry.topic, level=entry.level, context=DEFAULT_CONTEXT)
+    for attempt in range(retries + 1):
+        try:
+            explanation = query_huggingface(prompt, priority=PRIORITY)
+        except UpstreamBusy as exc:
+            if attempt == retries:
+                raise
+            time.sleep(exc.retry_after)
+            continue
+        if explanation == NO_ANSWER:
+            raise ValueError('empty answer from the model')
+        return explanation
+
+
+class Command(BaseCommand):
+    help = ('Pre-generate explanations for every topic and level in a curriculum catalog, so explain requests '
+            'for them are served from the database. Each answer is saved as it arrives; rerun to resume.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalog', nargs='?', default=DEFAULT_CATALOG,
+                            help='CSV with a "topic" column and an optional "level" column (blank = every level)')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent model calls')
+        parser.add_argument('--retries', type=int, default=3, help='Retries per topic while upstream is busy')
+        parser.add_argument('--regenerate-before',
+                            help='Also regenerate explanations generated before this date (YYYY-MM-DD); '
+                                 'rerunning with the same date resumes')
+        parser.add_argument('--limit', type=int, help='Generate at most this many explanations')
+        parser.add_argument('--dry-run', action='store_true', help='List what would be generated')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['catalog'], newline='', encoding='utf-8-sig') as handle:
+                entries = read_catalog(handle)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {options['catalog']}: {exc}")
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        cutoff = None
+        if options['regenerate_before']:
+            try:
+                cutoff = datetime.strptime(options['regenerate_before'], '%Y-%m-%d').replace(tzinfo=dt_timezone.utc)
+            except ValueError:
+                raise CommandError('--regenerate-before must be YYYY-MM-DD')
+
+        generated_at = dict(
+            ((key, level), when) for key, level, when in
+            CurriculumExplanation.objects.values_list('topic_key', 'level', 'generated_at')
+        )
+        pending = [
+            entry for entry in entries
+            if entry.key not in generated_at or (cutoff is not None and generated_at[entry.key] < cutoff)
+        ][:options['limit']]
+        self.stdout.write(f'{len(entries)} catalog entries, {len(entries) - len(pending)} already generated, '
+                          f'{len(pending)} to generate')
+        if options['dry_run']:
+            for entry in pending:
+                self.stdout.write(f'  {entry.topic} ({entry.level})')
+            return
+        if not pending:
+            return
+        if not settings.HUGGINGFACE_API_TOKEN:
+            raise CommandError('HUGGINGFACE_API_TOKEN is not configured')
+
+        done = failed = 0
+        started = time.perf_counter()
+        queue = iter(pending)
+        with ThreadPoolExecutor(options['workers']) as pool:
+            # At most one queued topic per worker, so an interrupted run leaves little unfinished work
+            running = {}
+            try:
+                while True:
+                    while len(running) < options['workers'] * 2 and (entry := next(queue, None)) is not None:
+                        running[pool.submit(_generate, entry, options['retries'])] = entry
+                    if not running:
+                        break
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        entry = running.pop(future)
+                        try:
+                            explanation = future.result()
+                        except Exception as exc:
+                            failed += 1
+                            self.stderr.write(f'{entry.topic} ({entry.level}): {exc}')
+                            continue
+                        self.save(entry, explanation)
+                        done += 1
+                        self.stdout.write(f'[{done + failed}/{len(pending)}] {entry.topic} ({entry.level})')
+            except KeyboardInterrupt:
+                for future in running:
+                    future.cancel()
+                self.stderr.write(f'Interrupted after {done} explanations; rerun the same command to resume')
+                raise SystemExit(1)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Generated {done} explanations in {elapsed:.1f}s'))
+        if failed:
+            raise CommandError(f'{failed} failed; rerun the same command to retry them')
+
+    def save(self, entry, explanation):
+        topic_key, level = entry.key
+        CurriculumExplanation.objects.update_or_create(
+            topic_key=topic_key, level=level,
+            defaults={
+                'topic': entry.topic,
+                'explanation': explanation,
+                'model_used': settings.HUGGINGFACE_MODEL,
+                'generated_at': timezone.now(),
+            },
+        )
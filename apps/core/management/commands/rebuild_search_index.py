@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.ai_tutor.search import BACKENDS, get_backend, search_interactions
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the full-text search index over AI interaction prompts and responses, reinstalling the '
+            'triggers or index that keep it current')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--drop', action='store_true', help='Remove the index instead')
+        parser.add_argument('--query', help='Run this search afterwards and print the top results')
+
+    def handle(self, *args, **options):
+        backend = get_backend(options['database'])
+        if options['drop']:
+            backend.uninstall()
+            self.stdout.write(self.style.SUCCESS(f'Removed the {backend.name} search index'))
+            return
+
+        if backend.name == 'basic':
+            self.stdout.write(f"No full-text index on this database; searches scan prompts "
+                              f"(indexed backends: {', '.join(name for name in BACKENDS if name != 'basic')})")
+        else:
+            started = time.perf_counter()
+            backend.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt the {backend.name} search index in {time.perf_counter() - started:.1f}s'
+            ))
+
+        if options['query']:
+            started = time.perf_counter()
+            results = search_interactions(options['query'])
+            self.stdout.write(f'{len(results)} results in {(time.perf_counter() - started) * 1000:.1f}ms')
+            for interaction in results:
+                self.stdout.write(f'{interaction.pk:>10}  {interaction.search_score or 0:.4g}  {interaction.prompt[:70]}')
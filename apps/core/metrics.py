@@ -0,0 +1,292 @@
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from .db.pool import pool_stats
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry, self.name, self.documentation = registry, name, documentation
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, *labels, amount=1):
+        registry = self.registry
+        with registry.lock:
+            values = registry.counters.setdefault(self.name, {})
+            values[labels] = values.get(labels, 0) + amount
+        registry.maybe_flush()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.registry, self.name, self.documentation = registry, name, documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        registry = self.registry
+        with registry.lock:
+            series = registry.histograms.setdefault(self.name, {}).get(labels)
+            if series is None:
+                series = registry.histograms[self.name][labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+        registry.maybe_flush()
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Registry:
+    """Process-local metrics, shared with other workers through METRICS_DIR.
+
+    Observations only touch in-memory dicts. At most every
+    ``METRICS_FLUSH_INTERVAL`` seconds a background thread (and the scrape
+    itself) writes the process's totals to ``METRICS_DIR/<pid>.json``, so
+    requests never wait on the disk; the exposition sums the
+    files of every process. Totals of exited workers are kept, like any
+    counter, until the directory is cleared on deploy. Gauges are summed only
+    over live processes.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.gauge_collectors = []
+        self.fleet_collectors = []
+        self.lock = threading.Lock()
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.last_flush = time.monotonic()
+        # The flusher thread does not survive fork; the child starts its own
+        self.flush_requested = threading.Event()
+        self.flusher = None
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.metrics.setdefault(name, Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.metrics.setdefault(name, Histogram(self, name, documentation, labelnames, buckets))
+
+    def gauges(self, collector=None, fleet=False):
+        """Register ``collector() -> {name: (documentation, labelnames, {labels: value})}``.
+
+        Per-process collectors are saved with each flush and summed over live
+        workers; ``fleet=True`` collectors read shared state and are only
+        called at scrape time.
+        """
+        if collector is None:
+            return lambda collector: self.gauges(collector, fleet)
+        (self.fleet_collectors if fleet else self.gauge_collectors).append(collector)
+        return collector
+
+    def maybe_flush(self):
+        """Wake the flusher thread once the last flush is METRICS_FLUSH_INTERVAL old"""
+        if time.monotonic() - self.last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        with self.lock:
+            self.last_flush = time.monotonic()  # one wake-up per interval, however many threads observe
+            if self.flusher is None:
+                self.flusher = threading.Thread(
+                    target=self._flush_forever, args=(self.flush_requested,), name='metrics-flush', daemon=True
+                )
+                self.flusher.start()
+        self.flush_requested.set()
+
+    def _flush_forever(self, requested):
+        while True:
+            requested.wait()
+            requested.clear()
+            self.flush()
+
+    def flush(self):
+        directory = settings.METRICS_DIR
+        with self.lock:
+            self.last_flush = time.monotonic()
+            state = {
+                'counters': {name: [[list(labels), value] for labels, value in values.items()]
+                             for name, values in self.counters.items()},
+                'histograms': {name: [[list(labels), series[0], series[1]] for labels, series in values.items()]
+                               for name, values in self.histograms.items()},
+            }
+        gauges = {}
+        for collector in self.gauge_collectors:
+            for name, (documentation, labelnames, values) in collector().items():
+                gauges[name] = [documentation, labelnames, [[list(labels), value] for labels, value in values.items()]]
+        state['gauges'] = gauges
+        try:
+            os.makedirs(directory, exist_ok=True)
+            handle, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(handle, 'w') as output:
+                json.dump(state, output)
+            os.replace(path, os.path.join(directory, f'{os.getpid()}.json'))
+        except OSError:
+            pass
+
+    def collect(self):
+        """Merge every process's file into ``(counters, histograms, gauges)``"""
+        self.flush()
+        counters, histograms, gauges = {}, {}, {}
+        for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+            try:
+                with open(path) as handle:
+                    state = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            for name, values in state.get('counters', {}).items():
+                merged = counters.setdefault(name, {})
+                for labels, value in values:
+                    merged[tuple(labels)] = merged.get(tuple(labels), 0) + value
+            for name, values in state.get('histograms', {}).items():
+                merged = histograms.setdefault(name, {})
+                for labels, buckets, total in values:
+                    series = merged.setdefault(tuple(labels), [[0] * len(buckets), 0.0])
+                    series[0] = [a + b for a, b in zip(series[0], buckets)]
+                    series[1] += total
+            if _alive(os.path.basename(path)[:-5]):
+                for name, (documentation, labelnames, values) in state.get('gauges', {}).items():
+                    merged = gauges.setdefault(name, [documentation, tuple(labelnames), {}])[2]
+                    for labels, value in values:
+                        merged[tuple(labels)] = merged.get(tuple(labels), 0) + value
+        return counters, histograms, gauges
+
+    def exposition(self):
+        """Prometheus text format for all metrics"""
+        counters, histograms, gauges = self.collect()
+        for collector in self.fleet_collectors:
+            gauges.update(collector())
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {metric.documentation}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            if metric.kind == 'counter':
+                for labels, value in sorted(counters.get(name, {}).items()):
+                    lines.append(f'{name}{_labels(metric.labelnames, labels)} {value}')
+                continue
+            for labels, (buckets, total) in sorted(histograms.get(name, {}).items()):
+                cumulative = 0
+                for bound, count in zip(metric.buckets + ('+Inf',), buckets):
+                    cumulative += count
+                    le = _labels(metric.labelnames + ('le',), labels + (str(bound),))
+                    lines.append(f'{name}_bucket{le} {cumulative}')
+                lines.append(f'{name}_sum{_labels(metric.labelnames, labels)} {total}')
+                lines.append(f'{name}_count{_labels(metric.labelnames, labels)} {cumulative}')
+        for name, (documentation, labelnames, values) in sorted(gauges.items()):
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} gauge')
+            for labels, value in sorted(values.items()):
+                lines.append(f'{name}{_labels(labelnames, labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Time spent handling a request, by URL name', ('endpoint', 'method'),
+)
+RESPONSES = registry.counter('http_responses_total', 'Responses by URL name and status code', ('endpoint', 'status'))
+DB_TIME = registry.histogram(
+    'db_time_per_request_seconds', 'Time spent in SQL per request, by URL name', ('endpoint',), DB_BUCKETS,
+)
+DB_QUERIES = registry.counter('db_queries_total', 'SQL statements executed, by URL name', ('endpoint',))
+UPSTREAM_LATENCY = registry.histogram(
+    'ai_upstream_duration_seconds', 'Inference API call latency, by model and outcome', ('model', 'outcome'),
+)
+AI_QUEUE_WAIT = registry.histogram(
+    'ai_queue_wait_seconds', 'Time waited for an upstream slot, by plan and outcome (admitted/rejected)',
+    ('plan', 'outcome'),
+)
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', 'Cache lookups by use (page/fragment/user/session/...) and result (hit/miss)',
+    ('use', 'result'),
+)
+CREDIT_REFUNDS = registry.counter(
+    'ai_credit_refunds_total', 'Credits refunded after a failed AI call', ('endpoint', 'reason'),
+)
+INSUFFICIENT_CREDITS = registry.counter(
+    'ai_insufficient_credits_total', '402 responses for lack of credits', ('endpoint',),
+)
+NEAR_DUPLICATES = registry.counter(
+    'ai_near_duplicate_lookups_total', 'Tutor questions checked against past answers, by result (reused/miss)',
+    ('result',),
+)
+PREGENERATED_EXPLANATIONS = registry.counter(
+    'ai_pregenerated_explanations_total', 'Explain requests by whether a pre-generated answer existed (hit/miss)',
+    ('result',),
+)
+QUIZ_PREFETCHES = registry.counter(
+    'ai_quiz_prefetches_total',
+    'Speculative quiz prefetches by event (scheduled/skipped/failed/stored/used/missed)',
+    ('event',),
+)
+CONVERSATION_FOLDS = registry.counter(
+    'ai_conversation_folds_total', 'Older conversation turns folded into the rolling summary, by result',
+    ('result',),
+)
+CONVERSATION_CONTEXT_TOKENS = registry.histogram(
+    'ai_conversation_context_tokens', 'Estimated tokens of summary and recent turns sent with a conversation turn',
+    buckets=(100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000),
+)
+RATE_LIMITED = registry.counter('ratelimit_rejections_total', '429 responses from the rate limiter', ('endpoint',))
+
+
+@registry.gauges
+def _pool_gauges():
+    connections, events = {}, {}
+    for alias, stats in pool_stats().items():
+        for state in ('in_use', 'idle', 'max_size'):
+            connections[(alias, state)] = stats[state]
+        for event in ('checkouts', 'created', 'reused', 'recycled', 'waits', 'timeouts'):
+            events[(alias, event)] = stats[event]
+    return {
+        'db_pool_connections': ('Pooled database connections by state', ('alias', 'state'), connections),
+        'db_pool_events': ('Pool events since each live worker started', ('alias', 'event'), events),
+    }
@@ -0,0 +1,319 @@
+import gc
+import hashlib
+import hmac
+import itertools
+import json
+import math
+import statistics
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from apps.accounts.models import AIInteraction, Conversation, CurriculumExplanation, Payment, User
+from apps.ai_tutor.conversation import build_context, recent_turns
+from apps.ai_tutor.near_duplicates import find_similar
+from apps.ai_tutor.prefetch import prefetch_key
+from apps.ai_tutor.views import PromptTemplates
+from apps.payments.views import verify_intasend_signature
+
+WEBHOOK_SECRET = 'microbench-secret'
+STUB_ANSWER = 'Photosynthesis is how plants turn light, water and carbon dioxide into sugar and oxygen. ' * 8
+
+# name -> setup(fixture) returning the zero-argument callable to time
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return decorator
+
+
+class Fixture:
+    """A user with plenty of credits, a logged-in client and the inference backend mocked out"""
+
+    def __init__(self):
+        self.user = User.objects.create_user(
+            username='microbench', email='microbench@example.com', password='microbench-pw', credits=10 ** 9
+        )
+        self.client = Client()
+        self.client.force_login(self.user)
+        self._stack = ExitStack()
+
+    def __enter__(self):
+        self._stack.enter_context(mock.patch('apps.ai_tutor.views.query_huggingface', return_value=STUB_ANSWER))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def post_json(self, url_name, payload, **extra):
+        url, body = reverse(url_name), json.dumps(payload)
+        return lambda: self.client.post(url, body, content_type='application/json', **extra)
+
+
+@benchmark('payments.verify_intasend_signature')
+def _verify_signature(fixture):
+    payload = json.dumps({'event': 'payment.completed', 'data': {'api_ref': '1', 'id': 'x' * 32}}).encode()
+    signature = 'sha256=' + hmac.new(WEBHOOK_SECRET.encode(), payload, hashlib.sha256).hexdigest()
+    return lambda: verify_intasend_signature(payload, signature, WEBHOOK_SECRET)
+
+
+@benchmark('ai.prompt.tutor')
+def _tutor_prompt(fixture):
+    question = 'Why do the seasons change over the course of a year?'
+    return lambda: (
+        f"{PromptTemplates.TUTOR_SYSTEM}\n\nStudent Question: {question}\n\n"
+        "Please provide a helpful, educational response that promotes understanding and learning."
+    )
+
+
+@benchmark('ai.prompt.explain')
+def _explain_prompt(fixture):
+    return lambda: PromptTemplates.EXPLAIN_CONCEPT.format(
+        topic='photosynthesis', level='beginner', context='general education'
+    )
+
+
+@benchmark('ai.prompt.quiz')
+def _quiz_prompt(fixture):
+    return lambda: PromptTemplates.QUIZ_GENERATOR.format(topic='fractions', difficulty='medium', num_questions=5)
+
+
+@benchmark('request.json_decode')
+def _json_decode(fixture):
+    body = json.dumps({'topic': 'photosynthesis', 'level': 'beginner', 'context': 'x' * 400}).encode()
+    return lambda: json.loads(body)
+
+
+@benchmark('accounts.deduct_credits')
+def _deduct_credits(fixture):
+    return lambda: fixture.user.deduct_credits(1)
+
+
+@benchmark('view.dashboard')
+def _dashboard(fixture):
+    url = reverse('dashboard')
+    return lambda: fixture.client.get(url)
+
+
+@benchmark('view.ai_tutor')
+def _ai_tutor(fixture):
+    # A new question every call, so each one misses the near-duplicate index and goes upstream
+    url, numbers = reverse('ai_tutor:tutor'), itertools.count()
+    return lambda: fixture.client.post(
+        url, json.dumps({'question': f'What is the prime factorisation of {next(numbers)}?'}),
+        content_type='application/json',
+    )
+
+
+@benchmark('view.ai_tutor_reused')
+def _ai_tutor_reused(fixture):
+    fixture.post_json('ai_tutor:tutor', {'question': 'What is a prime number?'})()
+    return fixture.post_json('ai_tutor:tutor', {'question': 'what are prime numbers, please?'})
+
+
+@benchmark('ai.near_duplicates.find')
+def _near_duplicates_find(fixture):
+    fixture.post_json('ai_tutor:tutor', {'question': 'Why do the seasons change?'})()
+    return lambda: find_similar('why do seasons change')
+
+
+@benchmark('view.ai_tutor_conversation')
+def _ai_tutor_conversation(fixture):
+    # Summaries are folded on a background thread, outside the request being timed
+    fixture._stack.enter_context(mock.patch('apps.ai_tutor.views.background.submit'))
+    conversation = Conversation.objects.create(user=fixture.user, title='Forces')
+    AIInteraction.objects.bulk_create([
+        AIInteraction(user=fixture.user, conversation=conversation, prompt=f'Follow-up {turn}?',
+                      response=STUB_ANSWER, model_used='microbench')
+        for turn in range(20)
+    ])
+    return fixture.post_json(
+        'ai_tutor:tutor', {'question': 'And what about friction?', 'conversation_id': conversation.id}
+    )
+
+
+@benchmark('ai.conversation.context')
+def _conversation_context(fixture):
+    conversation = Conversation.objects.create(user=fixture.user, title='Fractions', summary=STUB_ANSWER)
+    AIInteraction.objects.bulk_create([
+        AIInteraction(user=fixture.user, conversation=conversation, prompt=f'Follow-up {turn}?',
+                      response=STUB_ANSWER * 2, model_used='microbench')
+        for turn in range(10)
+    ])
+    return lambda: build_context(conversation.summary, recent_turns(conversation))
+
+
+@benchmark('view.explain_concept')
+def _explain_concept(fixture):
+    return fixture.post_json('ai_tutor:explain', {'topic': 'photosynthesis', 'level': 'beginner'})
+
+
+@benchmark('view.explain_concept_pregenerated')
+def _explain_concept_pregenerated(fixture):
+    CurriculumExplanation.objects.create(
+        topic='Fractions', topic_key='fractions', level='beginner', explanation=STUB_ANSWER, model_used='microbench'
+    )
+    return fixture.post_json('ai_tutor:explain', {'topic': 'fractions', 'level': 'beginner'})
+
+
+@benchmark('view.generate_quiz')
+def _generate_quiz(fixture):
+    return fixture.post_json('ai_tutor:generate_quiz', {'topic': 'fractions', 'num_questions': 5})
+
+
+@benchmark('view.generate_quiz_prefetched')
+def _generate_quiz_prefetched(fixture):
+    # Storing the prefetched quiz is part of every timed call
+    key = prefetch_key(fixture.user.id, 'fractions', 'medium', 5)
+    post = fixture.post_json('ai_tutor:generate_quiz', {'topic': 'fractions', 'num_questions': 5})
+
+    def run():
+        cache.set(key, {'quiz': STUB_ANSWER, 'model': 'microbench'}, 60)
+        return post()
+    return run
+
+
+@benchmark('view.create_checkout')
+def _create_checkout(fixture):
+    return fixture.post_json('payments:create_checkout', {'credits': 100})
+
+
+@benchmark('view.webhook_duplicate')
+def _webhook_duplicate(fixture):
+    payment = Payment.objects.create(
+        user=fixture.user, intasend_payment_id='microbench', amount=9, credits_purchased=100, status='completed'
+    )
+    payload = {'event': 'payment.completed', 'data': {'api_ref': str(payment.id), 'id': 'microbench'}}
+    body = json.dumps(payload).encode()
+    signature = 'sha256=' + hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return fixture.post_json('payments:webhook', payload, HTTP_X_INTASEND_SIGNATURE=signature)
+
+
+def count_queries(func):
+    """How many SQL statements a warm call of ``func`` executes on any database.
+
+    The first call fills caches that the timed calls then hit, and what it
+    finds there depends on the benchmarks set up before it, so only the
+    second call is counted.
+    """
+    func()
+    executed = []
+
+    def wrapper(execute, sql, params, many, context):
+        executed.append(sql)
+        return execute(sql, params, many, context)
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(wrapper))
+        result = func()
+    status = getattr(result, 'status_code', 200)
+    if status >= 400:
+        raise RuntimeError(f'benchmark returned HTTP {status}')
+    return len(executed)
+
+
+def reference_loop():
+    """Fixed pure-Python work timed alongside every round to factor out machine speed"""
+    total = 0
+    for i in range(2000):
+        total += i * i
+    return total
+
+
+def calibrate(func, warmup, min_round_time):
+    """Run ``func`` untimed for ``warmup`` seconds, then return how many calls make a round.
+
+    Calls are doubled until a round takes ``min_round_time``, so fast
+    functions are not dominated by timer resolution.
+    """
+    deadline = time.perf_counter() + warmup
+    while time.perf_counter() < deadline:
+        func()
+    number = 1
+    while _time_round(func, number) < min_round_time and number < 1 << 20:
+        number *= 2
+    return number
+
+
+def measure(funcs, rounds, warmup, min_round_time):
+    """Per-call seconds of each function for each round, relative to ``reference_loop``.
+
+    Rounds are interleaved across all functions and the reference, so drift
+    in CPU frequency or load during the run shifts them all alike and
+    cancels out in the ratio. Returns ``{name: (relative_rounds, median_seconds)}``.
+    """
+    funcs = {'reference': reference_loop, **funcs}
+    numbers = {name: calibrate(func, warmup, min_round_time) for name, func in funcs.items()}
+    samples = {name: [] for name in funcs}
+    for _ in range(rounds):
+        for name, func in funcs.items():
+            samples[name].append(_time_round(func, numbers[name]) / numbers[name])
+    reference = samples.pop('reference')
+    return {
+        name: ([value / base for value, base in zip(values, reference)], statistics.median(values))
+        for name, values in samples.items()
+    }
+
+
+def _time_round(func, number):
+    # GC is off while timing, as with timeit
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - started
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def mann_whitney_greater(current, baseline):
+    """One-sided Mann-Whitney U p-value that ``current`` samples are larger than ``baseline``"""
+    n1, n2 = len(current), len(baseline)
+    if not n1 or not n2:
+        return 1.0
+    pooled = sorted([(value, True) for value in current] + [(value, False) for value in baseline])
+    rank_sum, ties, index = 0.0, 0.0, 0
+    while index < len(pooled):
+        end = index
+        while end + 1 < len(pooled) and pooled[end + 1][0] == pooled[index][0]:
+            end += 1
+        group = end - index + 1
+        average_rank = (index + end) / 2 + 1
+        rank_sum += average_rank * sum(1 for _, is_current in pooled[index:end + 1] if is_current)
+        ties += group ** 3 - group
+        index = end + 1
+    u = rank_sum - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def compare(current, baseline, threshold, alpha, query_threshold):
+    """Regression messages for one benchmark; empty if it is within the thresholds.
+
+    Timings are compared as multiples of the reference loop, so a baseline
+    recorded on a faster or slower machine still compares fairly.
+    """
+    problems = []
+    ratio = statistics.median(current['rounds']) / statistics.median(baseline['rounds'])
+    p_value = mann_whitney_greater(current['rounds'], baseline['rounds'])
+    if ratio > 1 + threshold and p_value < alpha:
+        problems.append(f'{(ratio - 1) * 100:+.0f}% slower (p={p_value:.4f})')
+    if current['queries'] > baseline['queries'] + query_threshold:
+        problems.append(f"{current['queries']} queries, baseline {baseline['queries']}")
+    return problems
@@ -0,0 +1,470 @@
+import hashlib
+import json
+import mimetypes
+import os
+import random
+import re
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from django.utils.cache import cc_delim_re, patch_vary_headers
+
+from . import metrics, ratelimit, tracing
+from .db import routers
+from .log import request_context
+from .models import RequestProfile
+from .profiling import CProfileRunner, QueryRecorder, StackSampler
+
+
+class RequestContextMiddleware:
+    """Tag each request with an id and expose it, the user and the endpoint to logging.
+
+    An incoming ``X-Request-ID`` is reused when it looks sane so ids can be
+    followed through a proxy; otherwise a new one is generated. The id is
+    echoed back in the response.
+    """
+
+    VALID_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = request.headers.get('X-Request-ID', '')
+        if not self.VALID_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.id = request_id
+        # Cleared on request_finished rather than here: the handler logs 4xx/5xx
+        # responses after the middleware chain has returned.
+        request_context.set({'request_id': request_id})
+        response = self.get_response(request)
+        response['X-Request-ID'] = request_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        context = request_context.get()
+        context['endpoint'] = request.resolver_match.view_name
+        if hasattr(request, 'session'):
+            context['user_id'] = request.session.get(SESSION_KEY)
+        return None
+
+
+class TracingMiddleware:
+    """Open a root span per sampled request and trace its SQL statements.
+
+    Continues an incoming W3C ``traceparent``; the trace id is added to the
+    log context and returned as ``X-Trace-Id`` so a slow response can be
+    looked up in the trace file.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        root = tracing.start_trace(
+            f'{request.method} {request.path_info}',
+            request.headers.get('traceparent'),
+            **{'http.method': request.method, 'http.target': request.path[:200]},
+        )
+        if root is None:
+            return self.get_response(request)
+
+        request_context.get()['trace_id'] = root.trace_id
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(tracing.QuerySpans(connection)))
+                response = self.get_response(request)
+            match = getattr(request, 'resolver_match', None)
+            if match is not None:
+                root.name = f'{request.method} {match.view_name}'
+                root.set('http.route', match.view_name)
+            root.set('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                root.status = tracing.STATUS_ERROR
+            response['X-Trace-Id'] = root.trace_id
+            return response
+        finally:
+            tracing.finish_trace()
+
+
+class _QueryTimer:
+    """``execute_wrapper`` that adds up SQL time and statement count"""
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.elapsed += time.perf_counter() - started
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """Record latency, status and SQL time for every request.
+
+    Requests are labelled by URL name. Static files, page-cache hits and
+    unresolved paths get the fixed labels 'static', 'page_cache' and
+    'unmatched' so label cardinality stays bounded.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.static_prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+
+    def _endpoint(self, request, response):
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            return match.view_name
+        if request.path_info.startswith(self.static_prefix):
+            return 'static'
+        if response.get('X-Page-Cache') == 'hit':
+            return 'page_cache'
+        return 'unmatched'
+
+    def __call__(self, request):
+        timer = _QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        endpoint = self._endpoint(request, response)
+        metrics.REQUEST_LATENCY.observe(elapsed, endpoint, request.method)
+        metrics.RESPONSES.inc(endpoint, str(response.status_code))
+        if timer.count:
+            metrics.DB_TIME.observe(timer.elapsed, endpoint)
+            metrics.DB_QUERIES.inc(endpoint, amount=timer.count)
+        if response.status_code == 402:
+            metrics.INSUFFICIENT_CREDITS.inc(endpoint)
+        return response
+
+
+class ProfilingMiddleware:
+    """Profile a sample of requests, or any request from staff with ``X-Profile``.
+
+    A request is profiled when it is sampled (``PROFILE_SAMPLE_RATE``) or when
+    a staff user sends ``X-Profile: 1`` (stack sampling) or
+    ``X-Profile: cprofile``. SQL count, time, exact duplicates and repeated
+    statement shapes are always recorded; sampled requests use
+    ``PROFILE_SAMPLE_MODE`` for frames. Results are saved as
+    ``RequestProfile`` rows for the admin. Unprofiled requests only pay for a
+    random draw and a header lookup.
+    """
+
+    PROFILERS = {'stack', 'cprofile'}
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _profiler_for(self, request):
+        requested = request.headers.get('X-Profile')
+        if requested and request.user.is_staff:
+            return 'header', requested if requested in self.PROFILERS else 'stack'
+        if random.random() < settings.PROFILE_SAMPLE_RATE:
+            return 'sampled', settings.PROFILE_SAMPLE_MODE
+        return None, None
+
+    def __call__(self, request):
+        trigger, mode = self._profiler_for(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        if mode == 'cprofile':
+            profiler = CProfileRunner()
+        elif mode == 'stack':
+            profiler = StackSampler(settings.PROFILE_STACK_INTERVAL)
+        else:
+            profiler = None
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            if profiler is not None:
+                profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.stop()
+        duration = time.perf_counter() - started
+
+        self._save(request, response, trigger, mode if profiler else '', duration, recorder, profiler)
+        if trigger == 'header':
+            response['X-Profile-Summary'] = (
+                f'{duration * 1000:.1f}ms; sql={len(recorder.queries)}; '
+                f'sql_ms={recorder.total_time * 1000:.1f}; duplicates={recorder.duplicates()}'
+            )
+        return response
+
+    def _save(self, request, response, trigger, mode, duration, recorder, profiler):
+        match = getattr(request, 'resolver_match', None)
+        RequestProfile.objects.create(
+            endpoint=match.view_name if match else 'unmatched',
+            method=request.method,
+            path=request.path[:500],
+            status_code=response.status_code,
+            user_id=request.user.pk if request.user.is_authenticated else None,
+            trigger=trigger,
+            profiler=mode,
+            duration_ms=duration * 1000,
+            sql_count=len(recorder.queries),
+            sql_time_ms=recorder.total_time * 1000,
+            duplicate_queries=recorder.duplicates(),
+            similar_queries=recorder.similar(),
+            hot_frames=profiler.hot_frames(settings.PROFILE_HOT_FRAMES) if profiler else [],
+        )
+        if random.random() < 0.01:
+            cutoff = timezone.now() - timedelta(days=settings.PROFILE_RETENTION_DAYS)
+            RequestProfile.objects.filter(created_at__lt=cutoff).delete()
+
+
+class RateLimitMiddleware:
+    """Token-bucket rate limiting per endpoint and subscription plan.
+
+    Limits come from ``settings.RATELIMIT_PLANS``, keyed by URL name and then
+    by plan. Limited responses carry ``X-RateLimit-*`` headers, and rejected
+    requests get a 429 with ``Retry-After``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        result = getattr(request, 'ratelimit', None)
+        if result is not None:
+            response['X-RateLimit-Limit'] = result.limit
+            response['X-RateLimit-Remaining'] = result.remaining
+            response['X-RateLimit-Reset'] = result.reset
+            if not result.allowed:
+                response['Retry-After'] = result.retry_after
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.RATELIMIT_ENABLE or request.method != 'POST':
+            return None
+
+        plans = settings.RATELIMIT_PLANS.get(request.resolver_match.view_name)
+        if plans is None:
+            return None
+
+        if request.user.is_authenticated:
+            plan = request.user.get_plan()
+            identity = f'user:{request.user.pk}'
+        else:
+            plan = 'free'
+            identity = f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+        rate, burst = plans.get(plan, plans['free'])
+        request.ratelimit = ratelimit.consume(
+            f'ratelimit:{request.resolver_match.view_name}:{identity}', rate, burst
+        )
+        if not request.ratelimit.allowed:
+            metrics.RATE_LIMITED.inc(request.resolver_match.view_name)
+            return JsonResponse({'error': 'Rate limit exceeded. Please slow down.'}, status=429)
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Serve read-only views from the read replica.
+
+    Views listed in ``settings.DATABASE_REPLICA_VIEWS`` and admin changelists
+    read from the replica, unless the user wrote something within the last
+    ``DATABASE_REPLICA_PIN_SECONDS``; a successful POST (or any other unsafe
+    method) pins its user to the primary for that window.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.replica_views = frozenset(settings.DATABASE_REPLICA_VIEWS)
+
+    def __call__(self, request):
+        request.replica_token = None
+        try:
+            response = self.get_response(request)
+        finally:
+            if request.replica_token is not None:
+                routers.reset_replica(request.replica_token)
+
+        if request.method not in self.SAFE_METHODS and response.status_code < 400 and hasattr(request, 'session'):
+            routers.pin_to_primary(request.session.get(SESSION_KEY))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not routers.replica_enabled() or request.method not in self.SAFE_METHODS:
+            return None
+
+        match = request.resolver_match
+        is_changelist = match.namespace == 'admin' and (match.url_name or '').endswith('_changelist')
+        if match.view_name not in self.replica_views and not is_changelist:
+            return None
+
+        user_id = request.session.get(SESSION_KEY)
+        if user_id and routers.is_pinned(user_id):
+            return None
+        request.replica_token = routers.use_replica()
+        return None
+
+
+class AnonymousPageCacheMiddleware:
+    """Serve whole pages from the cache to anonymous visitors.
+
+    Only GET requests for ``settings.PAGE_CACHE_PATHS`` that carry no session
+    or messages cookie are served from the cache, so nobody who could see
+    personalised content is affected. Only 200 responses that set no cookies
+    are stored. Entries are keyed by path, by the request values of every
+    header the response varies on (other than Cookie), and by
+    ``settings.DEPLOY_VERSION``, so a deploy starts with a cold cache. Query
+    strings are ignored because these pages don't read them, which keeps
+    campaign links (``?utm_source=...``) on the cached copy.
+
+    Sits just below SecurityMiddleware so a hit skips the session, CSRF, auth
+    and template work entirely.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.paths = frozenset(settings.PAGE_CACHE_PATHS)
+        self.bypass_cookies = (settings.SESSION_COOKIE_NAME, CookieStorage.cookie_name)
+
+    def _key(self, *parts):
+        return ':'.join(('page', settings.DEPLOY_VERSION) + parts)
+
+    def _variant_key(self, request, path, headers):
+        values = '\n'.join(request.META.get('HTTP_' + header.upper().replace('-', '_'), '') for header in headers)
+        return self._key('response', path, hashlib.md5(values.encode(), usedforsecurity=False).hexdigest())
+
+    def __call__(self, request):
+        if (
+            request.method != 'GET'
+            or request.path_info not in self.paths
+            or any(name in request.COOKIES for name in self.bypass_cookies)
+        ):
+            return self.get_response(request)
+
+        path = request.path_info
+        headers = cache.get(self._key('headers', path))
+        if headers is not None:
+            response = cache.get(self._variant_key(request, path, headers))
+            if response is not None:
+                response['X-Page-Cache'] = 'hit'
+                return response
+
+        response = self.get_response(request)
+        if response.status_code != 200 or response.cookies or response.streaming:
+            return response
+        if getattr(request, 'user', None) is not None and request.user.is_authenticated:
+            return response
+
+        headers = sorted(
+            header.lower()
+            for header in cc_delim_re.split(response.get('Vary', ''))
+            if header and header.lower() != 'cookie'
+        )
+        if '*' in headers:
+            return response
+        cache.set(self._key('headers', path), headers, settings.PAGE_CACHE_TIMEOUT)
+        cache.set(self._variant_key(request, path, headers), response, settings.PAGE_CACHE_TIMEOUT)
+        response['X-Page-Cache'] = 'miss'
+        return response
+
+
+class StaticFilesMiddleware:
+    """Serve collected static files from STATIC_ROOT without a front-end server.
+
+    The file list is read once at startup, so only files that exist in
+    STATIC_ROOT can be served. Clients that accept brotli or gzip get the
+    precompressed ``.br`` / ``.gz`` variant written by
+    ``CompressedManifestStaticFilesStorage``. Fingerprinted names (values in
+    the staticfiles manifest) are cached for a year as ``immutable``; other
+    names get ``STATIC_MAX_AGE`` so they pick up the next deploy.
+    """
+
+    ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+    IMMUTABLE = 'public, max-age=31536000, immutable'
+
+    def __init__(self, get_response):
+        if not settings.STATIC_SERVE or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL if settings.STATIC_URL.startswith('/') else '/' + settings.STATIC_URL
+        self.files = self._scan(settings.STATIC_ROOT)
+        self.immutable = self._hashed_names(settings.STATIC_ROOT)
+
+    def _scan(self, root):
+        files = {}
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                files[os.path.relpath(path, root).replace(os.sep, '/')] = path
+        return files
+
+    def _hashed_names(self, root):
+        try:
+            with open(os.path.join(root, 'staticfiles.json')) as handle:
+                return frozenset(json.load(handle).get('paths', {}).values())
+        except (OSError, ValueError):
+            return frozenset()
+
+    def _accepted(self, request):
+        accepted = set()
+        for item in request.headers.get('Accept-Encoding', '').split(','):
+            coding, _, params = item.strip().partition(';')
+            quality = params.strip().partition('=')[2] if params.strip().startswith('q=') else '1'
+            try:
+                if float(quality) > 0:
+                    accepted.add(coding.strip().lower())
+            except ValueError:
+                pass
+        return accepted
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD') or not request.path_info.startswith(self.prefix):
+            return self.get_response(request)
+        name = request.path_info[len(self.prefix):]
+        if name not in self.files or name.endswith(('.gz', '.br')):
+            return self.get_response(request)
+
+        path, encoding = self.files[name], None
+        accepted = self._accepted(request)
+        for coding, suffix in self.ENCODINGS:
+            if coding in accepted and name + suffix in self.files:
+                path, encoding = self.files[name + suffix], coding
+                break
+
+        stat = os.stat(path)
+        etag = '"%x-%x%s"' % (int(stat.st_mtime), stat.st_size, '-' + encoding if encoding else '')
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+            del response['Content-Disposition']
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Cache-Control'] = self.IMMUTABLE if name in self.immutable else f'public, max-age={settings.STATIC_MAX_AGE}'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
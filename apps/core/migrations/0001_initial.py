@@ -0,0 +1,38 @@
+# Generated by Django 5.0.7 on 2026-10-19 19:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(db_index=True, max_length=200)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('trigger', models.CharField(choices=[('sampled', 'Sampled'), ('header', 'X-Profile header')], max_length=10)),
+                ('profiler', models.CharField(blank=True, max_length=10)),
+                ('duration_ms', models.FloatField()),
+                ('sql_count', models.PositiveIntegerField(default=0)),
+                ('sql_time_ms', models.FloatField(default=0)),
+                ('duplicate_queries', models.PositiveIntegerField(default=0)),
+                ('similar_queries', models.JSONField(default=list)),
+                ('hot_frames', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-duration_ms'],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import models
+from django.utils import timezone
+
+
+class RequestProfile(models.Model):
+    """SQL accounting and hot frames for one profiled request"""
+    TRIGGER_CHOICES = [
+        ('sampled', 'Sampled'),
+        ('header', 'X-Profile header'),
+    ]
+    
+    endpoint = models.CharField(max_length=200, db_index=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField()
+    user_id = models.BigIntegerField(null=True, blank=True)
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    profiler = models.CharField(max_length=10, blank=True)  # '', 'stack' or 'cprofile'
+    duration_ms = models.FloatField()
+    sql_count = models.PositiveIntegerField(default=0)
+    sql_time_ms = models.FloatField(default=0)
+    duplicate_queries = models.PositiveIntegerField(default=0)  # identical SQL and params
+    similar_queries = models.JSONField(default=list)  # repeated SQL shapes (N+1 candidates)
+    hot_frames = models.JSONField(default=list)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        ordering = ['-duration_ms']
+    
+    def __str__(self):
+        return f"{self.method} {self.endpoint}: {self.duration_ms:.0f} ms, {self.sql_count} queries"
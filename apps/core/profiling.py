@@ -0,0 +1,134 @@
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+
+def _frame_label(filename, lineno, name):
+    base = str(settings.BASE_DIR) + os.sep
+    if filename.startswith(base):
+        filename = filename[len(base):]
+    elif 'site-packages' + os.sep in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    return f'{filename}:{lineno}({name})'
+
+
+class QueryRecorder:
+    """``execute_wrapper`` collecting every statement's SQL, params and time"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, repr(params), time.perf_counter() - started))
+
+    @property
+    def total_time(self):
+        return sum(elapsed for _, _, elapsed in self.queries)
+
+    def duplicates(self):
+        """Number of statements that repeated an earlier one exactly"""
+        return len(self.queries) - len({(sql, params) for sql, params, _ in self.queries})
+
+    def similar(self, limit=10):
+        """SQL shapes run more than once with any params, most frequent first"""
+        groups = defaultdict(lambda: [0, 0.0])
+        for sql, _, elapsed in self.queries:
+            groups[sql][0] += 1
+            groups[sql][1] += elapsed
+        repeated = sorted(
+            ((count, elapsed, sql) for sql, (count, elapsed) in groups.items() if count > 1), reverse=True
+        )
+        return [
+            {'sql': sql[:1000], 'count': count, 'time_ms': round(elapsed * 1000, 2)}
+            for count, elapsed, sql in repeated[:limit]
+        ]
+
+
+class StackSampler:
+    """Sample the calling thread's stack every ``interval`` seconds from a helper thread.
+
+    Much cheaper than cProfile because the profiled code runs untraced; the
+    result counts how many samples each frame appeared in.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.inclusive = Counter()
+        self.leaf = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            code = frame.f_code
+            self.leaf[(code.co_filename, code.co_firstlineno, code.co_name)] += 1
+            seen = set()
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_filename, code.co_firstlineno, code.co_name)
+                if key not in seen:
+                    seen.add(key)
+                    self.inclusive[key] += 1
+                frame = frame.f_back
+
+    def hot_frames(self, limit):
+        if not self.samples:
+            return []
+        return [
+            {
+                'frame': _frame_label(*key),
+                'samples': count,
+                'self_samples': self.leaf[key],
+                'percent': round(100 * count / self.samples, 1),
+            }
+            for key, count in self.inclusive.most_common(limit)
+        ]
+
+
+class CProfileRunner:
+    """Deterministic profile of the request; use on demand, not for sampled traffic"""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def hot_frames(self, limit):
+        stats = pstats.Stats(self.profile).stats
+        ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)
+        return [
+            {
+                'frame': _frame_label(*key),
+                'calls': calls,
+                'self_ms': round(tottime * 1000, 2),
+                'cumulative_ms': round(cumtime * 1000, 2),
+            }
+            for key, (_, calls, tottime, cumtime, _) in ranked[:limit]
+        ]
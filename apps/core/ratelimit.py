@@ -0,0 +1,47 @@
+import math
+import time
+from collections import namedtuple
+
+from django.core.cache import cache
+
+RateLimitResult = namedtuple('RateLimitResult', 'allowed limit remaining reset retry_after')
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """Parse '10/m' or '100/5m' into (count, seconds)"""
+    count, period = rate.split('/')
+    multiplier = int(period[:-1]) if len(period) > 1 else 1
+    return int(count), multiplier * PERIODS[period[-1]]
+
+
+def consume(key, rate, burst, cost=1):
+    """Take ``cost`` tokens from the bucket at ``key``.
+
+    Tokens refill continuously at ``rate`` up to ``burst``, so there are no
+    window edges to exploit. Backends that provide ``rate_limit`` (the shared
+    SQLite cache) do this in one atomic operation; other backends fall back
+    to a best-effort get/set.
+    """
+    count, period = parse_rate(rate)
+    interval = period / count
+    limit = interval * burst
+    increment = interval * cost
+    now = time.time()
+
+    if increment > limit:
+        allowed, tat = False, now
+    elif hasattr(cache, 'rate_limit'):
+        allowed, tat = cache.rate_limit(key, now, increment, limit)
+    else:
+        tat = max(cache.get(key, now), now) + increment
+        allowed = tat - now <= limit
+        if allowed:
+            cache.set(key, tat, math.ceil(tat - now))
+        else:
+            tat -= increment
+
+    remaining = max(int((limit - (tat - now)) // interval), 0)
+    retry_after = 0 if allowed else max(tat + increment - limit - now, 0)
+    return RateLimitResult(allowed, burst, remaining, math.ceil(max(tat - now, 0)), math.ceil(retry_after))
@@ -0,0 +1,191 @@
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import InvalidPage, Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+
+
+def table_row_estimate(model, using):
+    """Row count of ``model``'s table from the database's statistics, without scanning it"""
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute(
+                    'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() '
+                    'AND TABLE_NAME = %s', [table],
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            elif connection.vendor == 'sqlite':
+                # Filled in by ANALYZE; the first number of the stat is the row count
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            else:
+                cursor.execute('SELECT NULL')
+            row = cursor.fetchone()
+    except DatabaseError:
+        row = None
+    if row and row[0] is not None:
+        estimate = int(str(row[0]).split()[0])
+        if estimate > 0:
+            return estimate
+    # No statistics yet: the highest id is a cheap upper bound read from the index
+    return model._default_manager.using(using).aggregate(Max('pk'))['pk__max'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never counts more than ``ADMIN_EXACT_COUNT_LIMIT`` rows.
+
+    Unfiltered lists of big tables use the table statistics; anything else
+    is counted up to the limit, so a broad filter costs a bounded scan.
+    """
+
+    @cached_property
+    def count(self):
+        queryset, limit = self.object_list, settings.ADMIN_EXACT_COUNT_LIMIT
+        self.is_estimate = False
+        if not queryset.query.where:
+            estimate = table_row_estimate(queryset.model, queryset.db)
+            if estimate > limit:
+                self.is_estimate = True
+                return estimate
+        count = queryset.order_by()[:limit + 1].count()
+        if count > limit:
+            self.is_estimate = True
+            return limit
+        return count
+
+
+class ScaleChangeList(ChangeList):
+    """Changelist for tables too big for OFFSET pagination.
+
+    In the default newest-first order, pages are fetched by id relative to
+    the previous page (``?after=<id>`` / ``?before=<id>``), which costs the
+    same on the last page as on the first. Sorting by a column falls back
+    to numbered pages over the capped count.
+    """
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(AFTER_VAR, None)
+        params.pop(BEFORE_VAR, None)
+        return params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Sorting, filtering or searching starts again from the first page
+        new_params = new_params or {}
+        cursors = [var for var in (AFTER_VAR, BEFORE_VAR) if var not in new_params]
+        return super().get_query_string(new_params, [*(remove or []), *cursors])
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.model_admin.changelist_defer:
+            queryset = queryset.defer(*self.model_admin.changelist_defer)
+        return queryset
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.paginator = paginator
+        self.result_count = paginator.count
+        self.count_is_estimate = paginator.is_estimate
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.keyset = paginator.is_estimate and ORDER_VAR not in self.params
+        if not self.keyset:
+            self.multi_page = self.result_count > self.list_per_page
+            if not self.multi_page:
+                self.result_list = self.queryset._clone()
+                return
+            try:
+                self.result_list = paginator.page(self.page_num).object_list
+            except InvalidPage:
+                raise IncorrectLookupParameters
+            return
+
+        after, before = request.GET.get(AFTER_VAR, ''), request.GET.get(BEFORE_VAR, '')
+        page_size = self.list_per_page
+        if before.isdigit():
+            rows = list(self.queryset.filter(pk__gt=before).order_by('pk')[:page_size + 1])
+            has_newer, has_older = len(rows) > page_size, True
+            rows = rows[:page_size][::-1]
+        else:
+            queryset = self.queryset.filter(pk__lt=after) if after.isdigit() else self.queryset
+            rows = list(queryset[:page_size + 1])
+            has_newer, has_older = after.isdigit(), len(rows) > page_size
+            rows = rows[:page_size]
+
+        self.result_list = rows
+        self.multi_page = has_newer or has_older
+        self.newer_url = self.get_query_string({BEFORE_VAR: rows[0].pk}) if has_newer and rows else None
+        self.older_url = self.get_query_string({AFTER_VAR: rows[-1].pk}) if has_older and rows else None
+
+
+class RecentValuesListFilter(admin.SimpleListFilter):
+    """Filter on a plain column whose choices come from the newest rows only.
+
+    The stock filter for a field without choices runs ``SELECT DISTINCT``
+    over the whole table on every changelist load.
+    """
+    field_name = None
+
+    def lookups(self, request, model_admin):
+        recent = (
+            model_admin.get_queryset(request).order_by('-pk')
+            .values_list(self.field_name, flat=True)[:settings.ADMIN_FILTER_SAMPLE_ROWS]
+        )
+        return [(str(value), str(value)) for value in sorted(set(recent))]
+
+    def queryset(self, request, queryset):
+        if self.value() is not None:
+            return queryset.filter(**{self.field_name: self.value()})
+        return queryset
+
+
+def recent_values_filter(field_name, title):
+    return type(f"{field_name.title().replace('_', '')}RecentValuesFilter", (RecentValuesListFilter,), {
+        'field_name': field_name, 'parameter_name': field_name, 'title': title,
+    })
+
+
+class ScaleModeAdminMixin:
+    """ModelAdmin options for changelists over millions of rows.
+
+    Newest first by id with keyset pagination, counts that are estimated or
+    capped, no "show all" link, large text columns left out of the list
+    query, and (with ``search_user_field``) search by the owner's exact email
+    or username prefix instead of a LIKE scan of the whole table.
+    """
+    ordering = ('-pk',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_max_show_all = 0
+    change_list_template = 'admin/scale_change_list.html'
+    changelist_defer = ()
+    search_user_field = None
+
+    def get_changelist(self, request, **kwargs):
+        return ScaleChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        if self.search_user_field is None:
+            return super().get_search_results(request, queryset, search_term)
+        from apps.accounts.models import User
+
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        lookup = {'email__iexact': term} if '@' in term else {'username__istartswith': term}
+        user_ids = list(
+            User.objects.using(queryset.db).filter(**lookup)
+            .values_list('pk', flat=True)[:settings.ADMIN_SEARCH_MAX_USERS]
+        )
+        return queryset.filter(**{f'{self.search_user_field}__in': user_ids}), False
@@ -0,0 +1,89 @@
+import gzip
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always written
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.xml', '.html')
+MIN_COMPRESS_SIZE = 256
+
+CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/''', re.S)
+
+
+def minify_css(source):
+    """Drop comments and collapse whitespace outside strings"""
+    parts = []
+    for index, chunk in enumerate(CSS_TOKENS.split(source)):
+        if index % 2:
+            # A string is kept verbatim; a comment matches with no group and is dropped
+            parts.append(chunk or '')
+        else:
+            chunk = re.sub(r'\s+', ' ', chunk)
+            parts.append(re.sub(r'\s*([{};,>])\s*', r'\1', chunk))
+    return ''.join(parts).strip()
+
+
+def minify_js(source):
+    """Strip indentation, blank lines and whole-line ``//`` comments.
+
+    Line breaks are kept so automatic semicolon insertion is unaffected, and
+    lines inside template literals are left exactly as written.
+    """
+    lines = []
+    in_template = False
+    for line in source.splitlines():
+        stripped = line if in_template else line.strip()
+        if not in_template and (not stripped or stripped.startswith('//')):
+            continue
+        lines.append(stripped)
+        if len(re.findall(r'(?<!\\)`', line)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that minifies CSS/JS and writes .gz/.br variants.
+
+    Minification happens as files are copied in, before hashing, so the
+    fingerprint covers the bytes that are actually served. After the
+    manifest pass every compressible file (original and hashed) gets a gzip
+    sibling, plus a brotli one when the ``brotli`` package is installed.
+    Variants that don't save at least 5% are not written.
+    """
+
+    minifiers = {'.css': minify_css, '.js': minify_js}
+
+    def _save(self, name, content):
+        minify = self.minifiers.get(name[name.rfind('.'):])
+        if minify is not None and settings.STATIC_MINIFY and '.min.' not in name:
+            content.seek(0)
+            content = ContentFile(minify(content.read().decode('utf-8')).encode('utf-8'))
+        return super()._save(name, content)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self._write_compressed(name)
+
+    def _write_compressed(self, name):
+        with self.open(name) as handle:
+            data = handle.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data)
+        for suffix, compressed in variants.items():
+            if len(compressed) < len(data) * 0.95:
+                self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
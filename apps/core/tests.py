@@ -0,0 +1,55 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from apps.accounts.models import User
+
+from . import ratelimit
+
+
+class RateLimitTests(TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        isolated = override_settings(
+            CACHES={'default': {**settings.CACHES['default'], 'LOCATION': os.path.join(tmpdir.name, 'cache.sqlite3')}},
+            METRICS_DIR=os.path.join(tmpdir.name, 'metrics'),
+        )
+        isolated.enable()
+        self.addCleanup(isolated.disable)
+
+    def test_denies_the_request_after_the_burst(self):
+        results = [ratelimit.consume('ratelimit:test', '3/m', 3) for _ in range(4)]
+
+        self.assertEqual([result.allowed for result in results], [True, True, True, False])
+        self.assertEqual(results[2].remaining, 0)
+        self.assertGreaterEqual(results[3].retry_after, 1)
+
+    def test_buckets_are_separate_per_key(self):
+        for _ in range(3):
+            ratelimit.consume('ratelimit:test:a', '3/m', 3)
+
+        self.assertFalse(ratelimit.consume('ratelimit:test:a', '3/m', 3).allowed)
+        self.assertTrue(ratelimit.consume('ratelimit:test:b', '3/m', 3).allowed)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_fallback_backend_denies_the_request_after_the_burst(self):
+        results = [ratelimit.consume('ratelimit:test', '3/m', 3) for _ in range(4)]
+
+        self.assertEqual([result.allowed for result in results], [True, True, True, False])
+
+    @override_settings(RATELIMIT_ENABLE=True, RATELIMIT_PLANS={'ai_tutor:tutor': {'free': ('3/m', 3)}})
+    def test_middleware_returns_429_with_retry_after(self):
+        user = User.objects.create_user(username='student', email='student@example.com', password='student-pw')
+        self.client.force_login(user)
+        url = reverse('ai_tutor:tutor')
+
+        responses = [self.client.post(url, '{}', content_type='application/json') for _ in range(4)]
+
+        self.assertEqual([response.status_code for response in responses], [400, 400, 400, 429])
+        self.assertEqual(responses[2]['X-RateLimit-Remaining'], '0')
+        self.assertGreaterEqual(int(responses[3]['Retry-After']), 1)
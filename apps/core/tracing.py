@@ -0,0 +1,204 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import re
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('sdg4.traces')
+
+# OTLP span kinds
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+_trace = contextvars.ContextVar('trace', default=None)
+_span = contextvars.ContextVar('span', default=None)
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'start', 'end', 'attributes', 'status', 'error')
+
+    def __init__(self, trace_id, parent_id, name, kind, attributes):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes
+        self.status = STATUS_OK
+        self.error = ''
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def record_error(self, exc):
+        self.status = STATUS_ERROR
+        self.error = f'{type(exc).__name__}: {exc}'
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start),
+            'endTimeUnixNano': str(self.end or time.time_ns()),
+            'attributes': [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            'status': {'code': self.status, 'message': self.error} if self.error else {'code': self.status},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+class Trace:
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+        self.dropped = 0
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def start_trace(name, traceparent=None, kind=SERVER, **attributes):
+    """Begin a trace for the current context and return its root span, or None if not sampled.
+
+    A valid W3C ``traceparent`` continues the caller's trace and follows its
+    sampled flag; otherwise the trace is sampled at ``TRACE_SAMPLE_RATE``.
+    """
+    match = TRACEPARENT.match(traceparent or '')
+    if match:
+        trace_id, parent_id, flags = match.groups()
+        sampled = int(flags, 16) & 1
+    else:
+        trace_id, parent_id = os.urandom(16).hex(), None
+        sampled = random.random() < settings.TRACE_SAMPLE_RATE
+    if not sampled:
+        return None
+    trace = Trace(trace_id)
+    _trace.set(trace)
+    root = Span(trace_id, parent_id, name, kind, attributes)
+    trace.spans.append(root)
+    _span.set(root)
+    return root
+
+
+def finish_trace():
+    """Close the root span and export the trace as one OTLP JSON line"""
+    trace = _trace.get()
+    if trace is None:
+        return
+    _trace.set(None)
+    _span.set(None)
+    trace.spans[0].end = time.time_ns()
+    if trace.dropped:
+        trace.spans[0].set('trace.dropped_spans', trace.dropped)
+    logger.info(json.dumps({
+        'resourceSpans': [{
+            'resource': {'attributes': [_otlp_attribute('service.name', settings.TRACE_SERVICE_NAME)]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [span.to_otlp() for span in trace.spans],
+            }],
+        }],
+    }))
+
+
+def current_traceparent():
+    """``traceparent`` header value for an outgoing call, or None when not tracing"""
+    span = _span.get()
+    if span is None:
+        return None
+    return f'00-{span.trace_id}-{span.span_id}-01'
+
+
+def current_trace_id():
+    trace = _trace.get()
+    return trace.trace_id if trace else None
+
+
+@contextmanager
+def span(name, kind=INTERNAL, **attributes):
+    """Time a block as a child of the current span; a no-op outside a sampled trace"""
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+    if len(trace.spans) >= settings.TRACE_MAX_SPANS:
+        trace.dropped += 1
+        yield None
+        return
+    parent = _span.get()
+    current = Span(trace.trace_id, parent.span_id if parent else None, name, kind, attributes)
+    trace.spans.append(current)
+    token = _span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.record_error(exc)
+        raise
+    finally:
+        current.end = time.time_ns()
+        _span.reset(token)
+
+
+def traced(name, **attributes):
+    """Decorator form of ``span``; costs one context lookup when not tracing"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _trace.get() is None:
+                return func(*args, **kwargs)
+            with span(name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class QuerySpans:
+    """``execute_wrapper`` adding a span per SQL statement"""
+
+    def __init__(self, connection):
+        self.alias = connection.alias
+        self.vendor = connection.vendor
+
+    def __call__(self, execute, sql, params, many, context):
+        with span('db.query', CLIENT, **{
+            'db.system': self.vendor, 'db.alias': self.alias, 'db.statement': sql[:500],
+        }):
+            return execute(sql, params, many, context)
+
+
+class TracedTemplate(Template):
+    def render(self, context=None, request=None):
+        with span('template.render', template=self.template.origin.template_name or self.template.origin.name):
+            return super().render(context, request)
+
+
+class TracedDjangoTemplates(DjangoTemplates):
+    """Django template backend that puts a span around every top-level render"""
+
+    def from_string(self, template_code):
+        return TracedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TracedTemplate(template.template, self)
@@ -0,0 +1,20 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_http_methods
+
+from .metrics import registry
+
+
+@require_http_methods(["GET"])
+def metrics_view(request):
+    """Prometheus scrape endpoint"""
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'.encode()
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+            return HttpResponseForbidden()
+    # Behind a same-host proxy every request comes from localhost, so that is trusted only in development
+    elif not settings.DEBUG or request.META.get('REMOTE_ADDR') not in ('127.0.0.1', '::1'):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
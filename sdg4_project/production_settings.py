@@ -18,6 +18,15 @@ CSRF_COOKIE_SECURE = True
 # Production Hosts
 ALLOWED_HOSTS = ['yourdomain.com', 'www.yourdomain.com']
 
+# Compile each template once per worker and reuse it
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
 # Production Database (if different)
 # DATABASES = {
 #     'default': {
@@ -43,25 +52,20 @@ EMAIL_HOST_USER = env('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD', default='')
 
 # Production Static Files
+# collectstatic minifies, fingerprints and precompresses (gzip, plus brotli if
+# installed); StaticFilesMiddleware then serves them with immutable caching.
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-
-# Production Logging
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'handlers': {
-        'file': {
-            'level': 'ERROR',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'django.log',
-        },
-        'console': {
-            'level': 'ERROR',
-            'class': 'logging.StreamHandler',
-        },
+STATIC_SERVE = True
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
     },
-    'root': {
-        'handlers': ['console', 'file'],
-        'level': 'ERROR',
+    'staticfiles': {
+        'BACKEND': 'apps.core.storage.CompressedManifestStaticFilesStorage',
     },
 }
+
+# Production Logging
+LOGGING['handlers']['file']['level'] = 'ERROR'
+LOGGING['handlers']['console']['level'] = 'ERROR'
+LOGGING['root']['level'] = 'ERROR'
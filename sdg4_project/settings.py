@@ -40,16 +40,25 @@ LOCAL_APPS = [
     'apps.accounts',
     'apps.ai_tutor',
     'apps.payments',
+    'apps.core',
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'apps.core.middleware.RequestContextMiddleware',
+    'apps.core.middleware.TracingMiddleware',
+    'apps.core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'apps.core.middleware.StaticFilesMiddleware',
+    'apps.core.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.core.middleware.ProfilingMiddleware',
+    'apps.core.middleware.RateLimitMiddleware',
+    'apps.core.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'csp.middleware.CSPMiddleware',
@@ -59,7 +68,7 @@ ROOT_URLCONF = 'sdg4_project.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'apps.core.tracing.TracedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -76,24 +85,85 @@ TEMPLATES = [
 WSGI_APPLICATION = 'sdg4_project.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': env('DB_NAME', default='agroflow_db'),
-        'USER': env('DB_USER', default='root'),
-        'PASSWORD': env('DB_PASSWORD', default='password'),
-        'HOST': env('DB_HOST', default='localhost'),
-        'PORT': env('DB_PORT', default='3306'),
-        'OPTIONS': {
-            'charset': 'utf8mb4',
-            'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
-        },
+# DB_ENGINE=sqlite runs locally against SQLite files instead of MySQL.
+# Connections are kept in a bounded per-process pool (apps.core.db.backends.mysql_pooled);
+# CONN_MAX_AGE stays 0 so each request hands its connection back to the pool.
+DB_ENGINE = env('DB_ENGINE', default='mysql')
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / env('DB_NAME', default='db.sqlite3'),
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'apps.core.db.backends.mysql_pooled',
+            'NAME': env('DB_NAME', default='agroflow_db'),
+            'USER': env('DB_USER', default='root'),
+            'PASSWORD': env('DB_PASSWORD', default='password'),
+            'HOST': env('DB_HOST', default='localhost'),
+            'PORT': env('DB_PORT', default='3306'),
+            'OPTIONS': {
+                'charset': 'utf8mb4',
+                'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+            },
+            'POOL': {
+                'ENABLED': env.bool('DB_POOL_ENABLED', default=True),
+                'MAX_SIZE': env.int('DB_POOL_MAX_SIZE', default=10),
+                'MAX_LIFETIME': env.int('DB_POOL_MAX_LIFETIME', default=1800),
+                'TIMEOUT': env.float('DB_POOL_TIMEOUT', default=10),
+            },
+        }
+    }
+
+# Read replica: read-only views (DATABASE_REPLICA_VIEWS and admin changelists)
+# read from it, except for users who wrote within DATABASE_REPLICA_PIN_SECONDS.
+# Set DB_REPLICA_HOST (MySQL) or DB_REPLICA_NAME (SQLite file) to enable.
+DB_REPLICA_HOST = env('DB_REPLICA_HOST', default='')
+DB_REPLICA_NAME = env('DB_REPLICA_NAME', default='')
+
+if DB_REPLICA_HOST or DB_REPLICA_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    if DB_ENGINE == 'sqlite':
+        DATABASES['replica']['NAME'] = BASE_DIR / DB_REPLICA_NAME
+    else:
+        DATABASES['replica'].update({
+            'NAME': DB_REPLICA_NAME or DATABASES['default']['NAME'],
+            'HOST': DB_REPLICA_HOST,
+            'PORT': env('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+            'USER': env('DB_REPLICA_USER', default=DATABASES['default']['USER']),
+            'PASSWORD': env('DB_REPLICA_PASSWORD', default=DATABASES['default']['PASSWORD']),
+        })
+    DATABASE_ROUTERS = ['apps.core.db.routers.ReplicaRouter']
+
+DATABASE_REPLICA_VIEWS = (
+    'dashboard',
+    'user_stats_api',
+    'payments:history',
+    'ai_tutor:search',
+)
+DATABASE_REPLICA_PIN_SECONDS = env.int('DB_REPLICA_PIN_SECONDS', default=15)
 
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# The authenticated user is cached between requests for AUTH_USER_CACHE_TIMEOUT
+# seconds; any save to the user invalidates it (see apps.accounts.signals).
+AUTHENTICATION_BACKENDS = ['apps.accounts.backends.CachedModelBackend']
+AUTH_USER_CACHE_TIMEOUT = env.int('AUTH_USER_CACHE_TIMEOUT', default=60)
+
+# Per-user dashboard fragments; saving the user or an AIInteraction re-renders them
+DASHBOARD_FRAGMENT_TIMEOUT = env.int('DASHBOARD_FRAGMENT_TIMEOUT', default=3600)
+
+# Sessions are read from the shared cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -124,6 +194,12 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Serve STATIC_ROOT from the app itself (apps.core.middleware.StaticFilesMiddleware).
+# Off under DEBUG, where runserver serves files straight from STATICFILES_DIRS.
+STATIC_SERVE = env.bool('STATIC_SERVE', default=not DEBUG)
+STATIC_MAX_AGE = 300  # for names without a content hash
+STATIC_MINIFY = True
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
@@ -138,6 +214,81 @@ LOGOUT_REDIRECT_URL = '/'
 # Hugging Face Configuration
 HUGGINGFACE_API_TOKEN = env('HUGGINGFACE_API_TOKEN', default='')
 HUGGINGFACE_MODEL = env('HUGGINGFACE_MODEL', default='meta-llama/Llama-3.1-8B-Instruct')
+HUGGINGFACE_API_URL = env('HUGGINGFACE_API_URL', default='https://api-inference.huggingface.co/models')
+
+# Upstream inference governor (fleet-wide, shared through the cache)
+AI_UPSTREAM_MAX_CONCURRENCY = env.int('AI_UPSTREAM_MAX_CONCURRENCY', default=8)
+AI_UPSTREAM_REQUESTS_PER_MINUTE = env.int('AI_UPSTREAM_REQUESTS_PER_MINUTE', default=120)
+AI_UPSTREAM_QUEUE_TIMEOUT = env.float('AI_UPSTREAM_QUEUE_TIMEOUT', default=5.0)
+AI_UPSTREAM_SLOT_LEASE = 45  # seconds; longer than the 30s request timeout
+AI_UPSTREAM_BACKOFF_MAX = 60  # seconds
+
+# Admission priority by subscription plan when upstream capacity is saturated.
+# Waiting requests gain AI_PRIORITY_AGING points per second so none starve.
+AI_PRIORITY_WEIGHTS = {
+    'free': 1,
+    'basic': 2,
+    'premium': 3,
+    'institutional': 4,
+    'batch': 0,  # pre-generation and speculative prefetch; yields to every plan
+}
+AI_PRIORITY_AGING = 1.0
+
+# Idempotency-Key handling on the AI endpoints
+IDEMPOTENCY_TTL = 24 * 60 * 60  # how long completed responses are replayed
+IDEMPOTENCY_LOCK_TIMEOUT = 60  # longer than queue wait plus the upstream timeout
+IDEMPOTENCY_WAIT_TIMEOUT = 45  # how long an in-flight duplicate waits for the original
+
+# Admin scale mode (users, AI interactions, payments): lists never count past
+# ADMIN_EXACT_COUNT_LIMIT rows; bigger tables show an estimate from the table
+# statistics and page by id instead of OFFSET.
+ADMIN_EXACT_COUNT_LIMIT = env.int('ADMIN_EXACT_COUNT_LIMIT', default=10000)
+ADMIN_SEARCH_MAX_USERS = 500  # users a search by email or username prefix may match
+ADMIN_FILTER_SAMPLE_ROWS = 5000  # newest rows the filter choices for plain columns come from
+
+# Full-text search over AI interactions (GET /ai/search/?q=...). 'auto' picks the
+# FULLTEXT index on MySQL and FTS5 on SQLite, and falls back to an unindexed scan
+# elsewhere. Rebuild with python manage.py rebuild_search_index.
+SEARCH_BACKEND = env('SEARCH_BACKEND', default='auto')  # 'auto', 'mysql', 'sqlite' or 'basic'
+SEARCH_MAX_RESULTS = 50
+SEARCH_RANK_CANDIDATES = 2000  # FTS5 ranks only the newest matches of very common words
+
+# Near-duplicate tutor questions are answered from a past response when the
+# questions' meaningful words and word pairs overlap by at least
+# NEAR_DUPLICATE_THRESHOLD (Jaccard); clients can send "fresh": true to always ask the model.
+NEAR_DUPLICATE_ENABLE = env.bool('NEAR_DUPLICATE_ENABLE', default=True)
+NEAR_DUPLICATE_THRESHOLD = env.float('NEAR_DUPLICATE_THRESHOLD', default=0.8)
+
+# Background work after a response (quiz prefetch, conversation summaries) runs on
+# AI_BACKGROUND_WORKERS threads per process; beyond AI_BACKGROUND_MAX_PENDING queued
+# tasks, new ones are skipped.
+AI_BACKGROUND_WORKERS = 2
+AI_BACKGROUND_MAX_PENDING = 8
+
+# Speculative quiz prefetch (opt-in): an explain request with "prefetch_quiz": true
+# starts generating the matching quiz in a background thread at the 'batch'
+# priority. Each prefetch costs an inference call, so it is off unless enabled, and
+# the dashboard then asks for one only when the student ticks the box.
+# It is kept for QUIZ_PREFETCH_TTL seconds and billed only if the quiz is requested.
+QUIZ_PREFETCH_ENABLE = env.bool('QUIZ_PREFETCH_ENABLE', default=False)
+QUIZ_PREFETCH_TTL = env.int('QUIZ_PREFETCH_TTL', default=600)
+QUIZ_PREFETCH_QUEUE_TIMEOUT = 1.0  # seconds; a prefetch gives up rather than queue behind live requests
+QUIZ_PREFETCH_WAIT = 10  # seconds a quiz request waits for a prefetch still in flight
+
+# Multi-turn tutoring ("conversation": true or "conversation_id" on /ai/tutor/). Each turn
+# is sent with a rolling summary and the newest turns, within CONVERSATION_CONTEXT_TOKENS
+# (estimated at 4 characters a token). Turns beyond CONVERSATION_RECENT_TURNS are folded
+# into the summary in the background.
+CONVERSATION_CONTEXT_TOKENS = env.int('CONVERSATION_CONTEXT_TOKENS', default=1500)
+CONVERSATION_SUMMARY_TOKENS = 300
+CONVERSATION_RECENT_TURNS = 6
+
+# Institutional roster import (python manage.py import_roster, or the Subscription admin action).
+# Password hashing runs in ROSTER_HASH_WORKERS processes; the admin action handles
+# at most ROSTER_ADMIN_MAX_ROWS rows so it finishes within a request.
+ROSTER_CHUNK_SIZE = 500
+ROSTER_HASH_WORKERS = env.int('ROSTER_HASH_WORKERS', default=os.cpu_count() or 1)
+ROSTER_ADMIN_MAX_ROWS = env.int('ROSTER_ADMIN_MAX_ROWS', default=500)
 
 # IntaSend Configuration
 INTASEND_PUBLIC_KEY = env('INTASEND_PUBLIC_KEY', default='')
@@ -192,36 +343,136 @@ CSP_CONNECT_SRC = (
 )
 
 # Rate Limiting
-RATELIMIT_ENABLE = True
-RATELIMIT_USE_CACHE = 'default'
+# Token buckets per URL name and subscription plan, as (rate, burst).
+# Users without an active subscription use the 'free' entry.
+RATELIMIT_ENABLE = env.bool('RATELIMIT_ENABLE', default=True)
+RATELIMIT_PLANS = {
+    'ai_tutor:tutor': {
+        'free': ('10/m', 10),
+        'basic': ('20/m', 20),
+        'premium': ('60/m', 30),
+        'institutional': ('120/m', 60),
+    },
+    'ai_tutor:explain': {
+        'free': ('5/m', 5),
+        'basic': ('10/m', 10),
+        'premium': ('30/m', 15),
+        'institutional': ('60/m', 30),
+    },
+    'ai_tutor:generate_quiz': {
+        'free': ('3/m', 3),
+        'basic': ('6/m', 6),
+        'premium': ('20/m', 10),
+        'institutional': ('40/m', 20),
+    },
+}
 
-# Cache
+# Cache (shared by all worker processes so rate limits apply fleet-wide)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'apps.core.cache.SQLiteCache',
+        'LOCATION': env('CACHE_LOCATION', default=str(BASE_DIR / 'cache.sqlite3')),
+        'OPTIONS': {
+            'MAX_ENTRIES': env.int('CACHE_MAX_ENTRIES', default=100000),
+        },
     }
 }
 
+# Full-page cache for anonymous visitors to the marketing pages.
+# Set DEPLOY_VERSION (e.g. the git SHA) on each deploy to start from a cold cache.
+PAGE_CACHE_PATHS = ('/', '/about/', '/pricing/')
+PAGE_CACHE_TIMEOUT = env.int('PAGE_CACHE_TIMEOUT', default=600)
+DEPLOY_VERSION = env('DEPLOY_VERSION', default='dev')
+
+# Metrics: each worker writes its totals to METRICS_DIR, and /metrics sums them.
+# Clear the directory on deploy. When METRICS_TOKEN is set, scrapers must send
+# "Authorization: Bearer <token>"; otherwise only localhost may scrape, and only
+# with DEBUG on, since behind a local proxy every request comes from localhost.
+METRICS_DIR = env('METRICS_DIR', default=str(BASE_DIR / 'metrics'))
+METRICS_FLUSH_INTERVAL = env.float('METRICS_FLUSH_INTERVAL', default=5.0)
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
+# Request profiling (results in the admin under Request profiles). Staff can
+# profile any request with "X-Profile: 1" (stack sampling) or "X-Profile: cprofile".
+PROFILE_SAMPLE_RATE = env.float('PROFILE_SAMPLE_RATE', default=0.0)
+PROFILE_SAMPLE_MODE = env('PROFILE_SAMPLE_MODE', default='stack')  # 'sql', 'stack' or 'cprofile'
+PROFILE_STACK_INTERVAL = 0.005
+PROFILE_HOT_FRAMES = 25
+PROFILE_RETENTION_DAYS = 14
+
 # Email (for production)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # Logging
+# Records go onto an in-memory queue and a background thread writes them as JSON
+# lines to a size-rotated file, so a slow disk never stalls a request.
+# LOG_INFO_SAMPLE_RATE keeps that share of INFO-and-below records (per request);
+# warnings and errors are always kept.
+LOG_FILE = env('LOG_FILE', default=str(BASE_DIR / 'django.log'))
+LOG_MAX_BYTES = env.int('LOG_MAX_BYTES', default=10 * 1024 * 1024)
+LOG_BACKUP_COUNT = env.int('LOG_BACKUP_COUNT', default=5)
+LOG_INFO_SAMPLE_RATE = env.float('LOG_INFO_SAMPLE_RATE', default=1.0)
+
+# Tracing: TRACE_SAMPLE_RATE of requests (or any request with a sampled W3C
+# traceparent) get spans for SQL, cache, templates and inference calls,
+# written as OTLP JSON lines to TRACE_FILE through the same queued handler.
+TRACE_SAMPLE_RATE = env.float('TRACE_SAMPLE_RATE', default=0.01)
+TRACE_FILE = env('TRACE_FILE', default=str(BASE_DIR / 'traces.jsonl'))
+TRACE_SERVICE_NAME = 'sdg4-education-platform'
+TRACE_MAX_SPANS = 1000
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'request_context': {
+            '()': 'apps.core.log.RequestContextFilter',
+        },
+        'sample_info': {
+            '()': 'apps.core.log.SamplingFilter',
+            'rate': LOG_INFO_SAMPLE_RATE,
+        },
+    },
+    'formatters': {
+        'json': {
+            '()': 'apps.core.log.JSONFormatter',
+        },
+        'raw': {
+            'format': '%(message)s',
+        },
+    },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'django.log',
+            'class': 'apps.core.log.QueuedRotatingFileHandler',
+            'filename': LOG_FILE,
+            'maxBytes': LOG_MAX_BYTES,
+            'backupCount': LOG_BACKUP_COUNT,
+            'filters': ['request_context', 'sample_info'],
+            'formatter': 'json',
         },
         'console': {
-            'level': 'INFO',
+            'level': 'INFO' if DEBUG else 'WARNING',
             'class': 'logging.StreamHandler',
         },
+        'traces': {
+            'level': 'INFO',
+            'class': 'apps.core.log.QueuedRotatingFileHandler',
+            'filename': TRACE_FILE,
+            'maxBytes': LOG_MAX_BYTES,
+            'backupCount': LOG_BACKUP_COUNT,
+            'formatter': 'raw',
+        },
+    },
+    'loggers': {
+        'sdg4.traces': {
+            'handlers': ['traces'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
     'root': {
         'handlers': ['console', 'file'],
         'level': 'INFO',
     },
-}
\ No newline at end of file
+}
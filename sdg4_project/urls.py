@@ -2,6 +2,8 @@ from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import TemplateView
 
+from apps.core.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', TemplateView.as_view(template_name='index.html'), name='home'),
@@ -11,5 +13,6 @@ urlpatterns = [
     path('ai/', include('apps.ai_tutor.urls')),
     path('payments/', include('apps.payments.urls')),
     path('dashboard/', include('apps.accounts.urls')),  # Dashboard in accounts app
+    path('metrics', metrics_view, name='metrics'),
 ]
 
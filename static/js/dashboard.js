@@ -28,14 +28,7 @@ document.getElementById('tutor-form').addEventListener('submit', function(e) {
     const originalContent = showLoading(askBtn, 'Thinking...');
     
     // Send to AI
-    fetch('/ai/tutor/', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': getCSRFToken()
-        },
-        body: JSON.stringify({ question: question })
-    })
+    postAIRequest('/ai/tutor/', { question: question })
     .then(response => response.json())
     .then(data => {
         hideLoading(askBtn, originalContent);
@@ -125,18 +118,17 @@ document.getElementById('explain-form').addEventListener('submit', function(e) {
     const submitBtn = this.querySelector('button[type="submit"]');
     const originalContent = showLoading(submitBtn, 'Generating...');
     
-    fetch('/ai/explain/', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': getCSRFToken()
-        },
-        body: JSON.stringify({
-            topic: topic,
-            level: level,
-            context: context
-        })
-    })
+    const payload = {topic: topic, level: level, context: context};
+    // Prepare the quiz with the quiz form's current settings, only when the student asks for it
+    const prefetchQuiz = document.getElementById('prefetch-quiz');
+    if (prefetchQuiz && prefetchQuiz.checked) {
+        payload.prefetch_quiz = {
+            difficulty: document.getElementById('difficulty').value,
+            num_questions: parseInt(document.getElementById('num-questions').value)
+        };
+    }
+    
+    postAIRequest('/ai/explain/', payload)
     .then(response => response.json())
     .then(data => {
         hideLoading(submitBtn, originalContent);
@@ -154,9 +146,10 @@ document.getElementById('explain-form').addEventListener('submit', function(e) {
         currentCredits = data.credits_remaining;
         updateCreditsDisplay(currentCredits);
         
-        // Close modal and reset form
+        // Close modal and reset form; the quiz form is ready for the same topic
         bootstrap.Modal.getInstance(document.getElementById('explainModal')).hide();
         this.reset();
+        document.getElementById('quiz-topic').value = topic;
         
         showToast('Explanation generated successfully!', 'success');
     })
@@ -192,17 +185,10 @@ document.getElementById('quiz-form').addEventListener('submit', function(e) {
     const submitBtn = this.querySelector('button[type="submit"]');
     const originalContent = showLoading(submitBtn, 'Creating Quiz...');
     
-    fetch('/ai/generate-quiz/', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-            'X-CSRFToken': getCSRFToken()
-        },
-        body: JSON.stringify({
-            topic: topic,
-            difficulty: difficulty,
-            num_questions: parseInt(numQuestions)
-        })
+    postAIRequest('/ai/generate-quiz/', {
+        topic: topic,
+        difficulty: difficulty,
+        num_questions: parseInt(numQuestions)
     })
     .then(response => response.json())
     .then(data => {
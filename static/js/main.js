@@ -82,6 +82,35 @@ function handleAPIError(error, defaultMessage = 'An error occurred') {
     }
 }
 
+// Idempotency key so a retried AI request is never charged twice
+function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
+// POST JSON to an AI endpoint, retrying network failures with the same key
+function postAIRequest(url, body, retries = 1) {
+    const options = {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCSRFToken(),
+            'Idempotency-Key': newIdempotencyKey()
+        },
+        body: JSON.stringify(body)
+    };
+    
+    const attempt = (remaining) => fetch(url, options).catch(error => {
+        if (remaining > 0) {
+            return attempt(remaining - 1);
+        }
+        throw error;
+    });
+    return attempt(retries);
+}
+
 // Initialize page
 document.addEventListener('DOMContentLoaded', function() {
     // Initialize tooltips